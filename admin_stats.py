@@ -0,0 +1,79 @@
+"""
+Set-based queries behind the admin analytics endpoints.
+
+/api/admin/stats and /api/admin/audit-logs/summary used to issue one COUNT per day
+of the chart and one COUNT per distinct username. Each section here is a single
+GROUP BY over the whole range instead; main.py serves the results through a
+short-TTL cache (ADMIN_STATS_CACHE_TTL_SECONDS).
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import emotion_rollups
+from models import AuditLog
+
+
+def emotion_stats(db: Session, days: int = 7, top: int = 10) -> Dict[str, Any]:
+    """Emotion distribution, samples per UTC day and the most active users."""
+    emotion_dist = emotion_rollups.emotion_totals(db)
+
+    today = datetime.now(timezone.utc).date()
+    range_start = datetime.combine(today - timedelta(days=days - 1), datetime.min.time(), tzinfo=timezone.utc)
+    counts_by_day = emotion_rollups.daily_counts(db, range_start)
+
+    return {
+        "emotion_distribution": {e: int(t['count']) for e, t in emotion_dist.items()},
+        "daily_activity": [
+            {"date": day.isoformat(), "sessions": counts_by_day.get(day, 0)}
+            for day in (today - timedelta(days=i) for i in range(days))
+        ],
+        "top_users": [
+            {"username": u['username'], "session_count": u['count']}
+            for u in emotion_rollups.top_users(db, limit=top)
+        ],
+    }
+
+
+def audit_counts(db: Session, days: int = 7) -> Dict[str, Any]:
+    """
+    Action / status breakdowns and totals from one GROUP BY action, status, plus
+    events per UTC day from one GROUP BY date over the range.
+    """
+    action_counts: Dict[str, int] = {}
+    status_counts: Dict[str, int] = {}
+    total = 0
+    rows = db.query(
+        AuditLog.action, AuditLog.status, func.count(AuditLog.id)
+    ).group_by(AuditLog.action, AuditLog.status).all()
+    for action, status, count in rows:
+        action_counts[action] = action_counts.get(action, 0) + count
+        status_counts[status] = status_counts.get(status, 0) + count
+        total += count
+
+    today = datetime.now(timezone.utc).date()
+    range_start = datetime.combine(today - timedelta(days=days - 1), datetime.min.time(), tzinfo=timezone.utc)
+    created_at = AuditLog.created_at
+    if db.get_bind().dialect.name == 'postgresql':
+        # Bucket by UTC day, not the session time zone
+        created_at = func.timezone('UTC', created_at)
+    day_column = func.date(created_at)
+    per_day = {
+        # Postgres returns date objects, SQLite 'YYYY-MM-DD' strings
+        str(day): count
+        for day, count in db.query(day_column, func.count(AuditLog.id)).filter(
+            AuditLog.created_at >= range_start
+        ).group_by(day_column).all()
+    }
+
+    return {
+        "total_events": total,
+        "action_breakdown": action_counts,
+        "status_breakdown": status_counts,
+        "daily_activity": [
+            {"date": day.isoformat(), "count": per_day.get(day.isoformat(), 0)}
+            for day in (today - timedelta(days=i) for i in range(days))
+        ],
+    }
@@ -3,14 +3,41 @@ from typing import Optional
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import inspect
 from sqlalchemy.orm import Session
 from database import get_db
 from models import User
 from encryption import EncryptionService
 from config import settings
+from cache import TTLCache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
+# Authenticated users' column values, keyed ("user", id); ("username_hash", hash) maps
+# old tokens without a user_id to an id. Saves the users lookup on nearly every request.
+user_cache = TTLCache(
+    maxsize=settings.AUTH_USER_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.AUTH_USER_CACHE_TTL_SECONDS,
+    name="auth-users"
+)
+_USER_COLUMNS = [attr.key for attr in inspect(User).column_attrs]
+
+
+def invalidate_user(user_id: int) -> None:
+    """Forget a cached user. Call after changing their profile, password, email or is_active."""
+    user_cache.invalidate(("user", user_id))
+    # Old-token mappings don't record whose they are; they are rare, so drop them all
+    user_cache.invalidate_where(lambda key: key[0] == "username_hash")
+
+
+def _snapshot(user: User) -> dict:
+    return {key: getattr(user, key) for key in _USER_COLUMNS}
+
+
+def _from_snapshot(snapshot: dict) -> User:
+    """A detached User built from cached values (a fresh instance per request)."""
+    return User(**snapshot)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -23,7 +50,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def get_user_from_token(token: str, db: Session):
+    """Resolve a JWT to its User (transient for guests). Raises 401 on invalid tokens."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -73,6 +101,16 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
     
+    username_hash = None
+    if not user_id:
+        username_hash = EncryptionService.hash_username(username)
+        user_id = user_cache.get(("username_hash", username_hash))
+    
+    if user_id:
+        cached = user_cache.get(("user", user_id))
+        if cached is not None:
+            return _from_snapshot(cached)
+    
     # Try to find user by ID first (works even after username change)
     user = None
     if user_id:
@@ -80,10 +118,26 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     
     # Fallback to username hash for old tokens
     if user is None:
-        username_hash = EncryptionService.hash_username(username)
+        username_hash = username_hash or EncryptionService.hash_username(username)
         user = db.query(User).filter(User.username_hash == username_hash).first()
+        if user is not None:
+            user_cache.set(("username_hash", username_hash), user.id)
     
     if user is None:
         raise credentials_exception
     
-    return user
\ No newline at end of file
+    user_cache.set(("user", user.id), _snapshot(user))
+    return user
+
+
+def token_expires_at(token: str) -> Optional[float]:
+    """The token's exp claim as a Unix timestamp (unverified; None if absent or unreadable)."""
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+        return float(exp) if exp is not None else None
+    except (JWTError, TypeError, ValueError):
+        return None
+
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    return get_user_from_token(token, db)
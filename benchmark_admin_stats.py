@@ -0,0 +1,163 @@
+"""
+Benchmark the admin analytics queries: the old per-day / per-user COUNT loops against
+the set-based rewrite in admin_stats.py (and its cached path), on seeded tables.
+
+Seeds its own database (never the one in DATABASE_URL) with --rows emotion logs (as
+one-frame-per-second recording sessions) and --audit-rows audit logs spread over the
+last --days days, compacts the emotion logs into rollups, then times each variant.
+
+Run: python benchmark_admin_stats.py [--rows 1000000] [--database-url sqlite:////tmp/neurolens_admin_bench.db]
+     (add --reuse to skip seeding when the database is already populated)
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, func, insert
+from sqlalchemy.orm import sessionmaker
+
+import admin_stats
+import emotion_rollups
+from cache import TTLCache
+from database import Base
+from models import AuditLog, EmotionLog
+
+EMOTIONS = emotion_rollups.EMOTIONS
+ACTIONS = ('LOGIN', 'LOGOUT', 'SIGNUP', 'START_RECORDING', 'STOP_RECORDING', 'PASSWORD_RESET')
+CHUNK = 50000
+
+
+def seed(Session, rows, audit_rows, users, days):
+    now = datetime.now(timezone.utc)
+    span = days * 86400
+    probabilities = json.dumps({e: round(1 / len(EMOTIONS), 4) for e in EMOTIONS})
+    db = Session()
+    try:
+        start = time.perf_counter()
+        # Recording sessions: one frame per second for 10-60 minutes, like live traffic
+        seeded = 0
+        while seeded < rows:
+            batch = []
+            while len(batch) < CHUNK and seeded + len(batch) < rows:
+                user = random.randint(1, users)
+                started = now - timedelta(seconds=random.randint(3600, span))
+                mood = random.choice(EMOTIONS)
+                for second in range(min(random.randint(600, 3600), rows - seeded - len(batch))):
+                    batch.append({
+                        'user_id': user, 'username': f"user{user}",
+                        'emotion': mood if random.random() < 0.7 else random.choice(EMOTIONS),
+                        'intensity': random.random(), 'content_type': 'CODING', 'content_confidence': 0.9,
+                        'probabilities': probabilities, 'is_guest': False,
+                        'created_at': started + timedelta(seconds=second),
+                    })
+            db.execute(insert(EmotionLog), batch)
+            db.commit()
+            seeded += len(batch)
+            print(f"   seeded {seeded:,} emotion logs", end="\r")
+        print()
+        for offset in range(0, audit_rows, CHUNK):
+            batch = [{
+                'user_id': random.randint(1, users), 'username': None, 'action': random.choice(ACTIONS),
+                'details': None, 'ip_address': '127.0.0.1', 'user_agent': 'bench',
+                'status': 'failed' if random.random() < 0.05 else 'success',
+                'created_at': now - timedelta(seconds=random.randint(60, span)),
+            } for _ in range(min(CHUNK, audit_rows - offset))]
+            db.execute(insert(AuditLog), batch)
+            db.commit()
+        print(f"✅ Seeded {rows:,} emotion logs and {audit_rows:,} audit logs in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        compacted = 0
+        while True:
+            count = emotion_rollups.compact(db, batch_size=CHUNK, settle_seconds=0)
+            db.commit()
+            compacted += count
+            if count < CHUNK:
+                break
+        print(f"✅ Compacted {compacted:,} emotion logs into rollups in {time.perf_counter() - start:.1f}s")
+    finally:
+        db.close()
+
+
+def legacy_emotion_stats(db):
+    """The pre-rewrite /api/admin/stats: 1 + 7 + 1 + N queries."""
+    emotion_dist = db.query(EmotionLog.emotion, func.count(EmotionLog.id)).group_by(EmotionLog.emotion).all()
+    today = date.today()
+    daily = []
+    for i in range(7):
+        day = today - timedelta(days=i)
+        daily.append({"date": day.isoformat(), "sessions": db.query(EmotionLog).filter(
+            func.date(EmotionLog.created_at) == day).count()})
+    top = [
+        {"username": log.username,
+         "session_count": db.query(EmotionLog).filter(EmotionLog.username == log.username).count()}
+        for log in db.query(EmotionLog.username).distinct().limit(10).all()
+    ]
+    return {"emotion_distribution": dict(emotion_dist), "daily_activity": daily, "top_users": top}
+
+
+def legacy_audit_counts(db):
+    """The pre-rewrite audit summary counts: 2 GROUP BYs + 7 daily COUNTs + total COUNT."""
+    actions = db.query(AuditLog.action, func.count(AuditLog.id)).group_by(AuditLog.action).all()
+    statuses = db.query(AuditLog.status, func.count(AuditLog.id)).group_by(AuditLog.status).all()
+    today = date.today()
+    daily = [
+        db.query(AuditLog).filter(func.date(AuditLog.created_at) == today - timedelta(days=i)).count()
+        for i in range(7)
+    ]
+    return actions, statuses, daily, db.query(AuditLog).count()
+
+
+def time_it(label, fn, repeat):
+    latencies_ms = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<38} mean {statistics.mean(latencies_ms):9.2f} ms   "
+          f"min {min(latencies_ms):9.2f} ms   max {max(latencies_ms):9.2f} ms")
+    return statistics.mean(latencies_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark admin analytics queries")
+    parser.add_argument("--database-url", default="sqlite:////tmp/neurolens_admin_bench.db")
+    parser.add_argument("--rows", type=int, default=1000000, help="Emotion log rows to seed")
+    parser.add_argument("--audit-rows", type=int, default=200000, help="Audit log rows to seed")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--days", type=int, default=30, help="Spread seeded rows over this many days")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--reuse", action="store_true", help="Skip seeding (database already populated)")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    Session = sessionmaker(bind=engine)
+    if not args.reuse:
+        Base.metadata.drop_all(engine, tables=[
+            Base.metadata.tables[t] for t in ('emotion_logs', 'audit_logs', 'emotion_rollups', 'rollup_watermarks')
+        ])
+        Base.metadata.create_all(engine)
+        seed(Session, args.rows, args.audit_rows, args.users, args.days)
+
+    db = Session()
+    try:
+        print(f"\n📊 {db.query(EmotionLog).count():,} emotion logs, {db.query(AuditLog).count():,} audit logs "
+              f"({engine.dialect.name}), {args.repeat} run(s) each\n")
+        legacy = time_it("admin stats (legacy N+1)", lambda: legacy_emotion_stats(db), args.repeat)
+        rewritten = time_it("admin stats (set-based)", lambda: admin_stats.emotion_stats(db), args.repeat)
+        cache = TTLCache(ttl_seconds=60)
+        cache.get_or_set("emotion_stats", lambda: admin_stats.emotion_stats(db))
+        time_it("admin stats (cached)", lambda: cache.get_or_set(
+            "emotion_stats", lambda: admin_stats.emotion_stats(db)), args.repeat)
+        audit_legacy = time_it("audit summary counts (legacy)", lambda: legacy_audit_counts(db), args.repeat)
+        audit_rewritten = time_it("audit summary counts (set-based)", lambda: admin_stats.audit_counts(db), args.repeat)
+        print(f"\n✅ admin stats {legacy / rewritten:.1f}x faster, audit summary {audit_legacy / audit_rewritten:.1f}x faster")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
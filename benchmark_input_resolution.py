@@ -0,0 +1,58 @@
+"""
+Benchmark emotion model latency and accuracy at several input resolutions.
+Uses the runtime configured in .env (EMOTION_MODEL_RUNTIME / EMOTION_MODEL_ARTIFACT).
+
+Run: python benchmark_input_resolution.py path/to/labelled_faces [--sizes 224 260 300 380]
+
+The folder needs one sub-folder of face crops per emotion label (see model_eval.py).
+Pick the cheapest size whose accuracy is acceptable and set EMOTION_INPUT_SIZE.
+"""
+import argparse
+import statistics
+import sys
+
+from emotion_model import emotion_detector
+from model_eval import evaluate_detector, load_labelled_faces
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark emotion model input resolutions")
+    parser.add_argument("folder", help="Labelled folder of face crops (one sub-folder per emotion)")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[224, 260, 300, 380])
+    args = parser.parse_args()
+
+    if emotion_detector.model is None:
+        print("❌ Emotion model not loaded, nothing to benchmark")
+        sys.exit(1)
+
+    samples = load_labelled_faces(args.folder, emotion_detector.emotions)
+    if not samples:
+        print(f"❌ No labelled samples found in {args.folder}")
+        sys.exit(1)
+
+    crop_sides = [min(crop.shape[:2]) for _, crop in samples]
+    configured = emotion_detector.input_size
+
+    print("=" * 70)
+    print(f"INPUT RESOLUTION BENCHMARK — {len(samples)} crops, runtime={emotion_detector.runtime}")
+    print(f"Source crop size: median {statistics.median(crop_sides):.0f}px, min {min(crop_sides)}px, max {max(crop_sides)}px")
+    print("=" * 70)
+    print(f"  {'size':>6} {'accuracy':>9} {'mean ms':>9} {'p95 ms':>9} {'vs 380':>8}")
+    print(f"  {'-'*6} {'-'*9} {'-'*9} {'-'*9} {'-'*8}")
+
+    results = {}
+    for size in args.sizes:
+        emotion_detector.input_size = size
+        results[size] = evaluate_detector(emotion_detector, samples)
+    emotion_detector.input_size = configured
+
+    baseline = results.get(380)
+    for size, r in results.items():
+        relative = f"{baseline['mean_ms'] / r['mean_ms']:.2f}x" if baseline and r['mean_ms'] else "-"
+        marker = " *" if size == configured else ""
+        print(f"  {size:>6} {r['accuracy']:>8.1%} {r['mean_ms']:>9.2f} {r['p95_ms']:>9.2f} {relative:>8}{marker}")
+    print("\n  * = current EMOTION_INPUT_SIZE")
+
+
+if __name__ == "__main__":
+    main()
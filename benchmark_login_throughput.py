@@ -0,0 +1,209 @@
+"""
+Benchmark login throughput and its effect on concurrent /api/analyze/frame latency,
+with Argon2 run inline in the request workers (PASSWORD_HASH_WORKERS=0, the old
+behaviour) against the dedicated password hash pool.
+
+For each mode the API is started under uvicorn against its own seeded SQLite
+database (never the one in DATABASE_URL). A guest client posts frames at a fixed
+rate, first alone and then while --login-clients threads log in as seeded accounts
+as fast as they can. The per-IP limit is switched off since every client shares
+127.0.0.1; each login thread uses its own account so the per-account limit holds.
+
+Run: python benchmark_login_throughput.py [--login-clients 16] [--duration 15] [--image face.jpg]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import cv2
+import numpy as np
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from encryption import EncryptionService
+from models import User
+
+PASSWORD = "BenchPassw0rd!"
+
+
+def seed(database_path, accounts):
+    if os.path.exists(database_path):
+        os.remove(database_path)
+    engine = create_engine(f"sqlite:///{database_path}")
+    Base.metadata.create_all(engine)
+    password_hash = EncryptionService.hash_password(PASSWORD)
+    rows = []
+    for i in range(accounts):
+        username = f"bench{i}"
+        email = f"bench{i}@example.com"
+        rows.append({
+            'name': f"Bench {i}",
+            'email_encrypted': EncryptionService.encrypt_data(email),
+            'email_hash': EncryptionService.hash_email(email),
+            'username_encrypted': EncryptionService.encrypt_data(username),
+            'username_hash': EncryptionService.hash_username(username),
+            'password_hash': password_hash,
+            'email_verified': True,
+            'is_active': True,
+        })
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    try:
+        db.execute(insert(User), rows)
+        db.commit()
+    finally:
+        db.close()
+    engine.dispose()
+
+
+def request(url, data=None, headers=None, content_type="application/json"):
+    """POST (or GET without data); returns (status, body, seconds)."""
+    req = urllib.request.Request(url, data=data, headers=dict(headers or {}))
+    if data is not None:
+        req.add_header("Content-Type", content_type)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            return resp.status, resp.read(), time.perf_counter() - start
+    except urllib.error.HTTPError as e:
+        return e.code, e.read(), time.perf_counter() - start
+    except (urllib.error.URLError, OSError):
+        return 0, b"", time.perf_counter() - start
+
+
+def start_server(port, database_url, hash_workers):
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': database_url,
+        'PASSWORD_HASH_WORKERS': str(hash_workers),
+        'PASSWORD_MAX_CONCURRENT_PER_IP': "0",
+        'EMOTION_ROLLUP_ENABLED': "false",
+    })
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 180
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("API server exited during startup")
+        if request(f"http://127.0.0.1:{port}/")[0] == 200:
+            return server
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("API server did not start within 180s")
+
+
+def multipart_frame(jpeg):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"frame.jpg\"\r\n"
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + jpeg + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def post_frames(base, token, jpeg, interval, stop, latencies, statuses):
+    body, content_type = multipart_frame(jpeg)
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        status, _, seconds = request(f"{base}/api/analyze/frame", body, headers, content_type)
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == 200:
+            latencies.append(seconds * 1000)
+        time.sleep(max(0.0, interval - seconds))
+
+
+def login_loop(base, account, stop, latencies, statuses):
+    body = json.dumps({"username": f"bench{account}", "password": PASSWORD}).encode()
+    while not stop.is_set():
+        status, _, seconds = request(f"{base}/api/auth/login", body)
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == 200:
+            latencies.append(seconds * 1000)
+
+
+def percentiles(values):
+    if not values:
+        return "n/a"
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return (f"p50 {statistics.median(ordered):8.1f} ms   p95 {pick(0.95):8.1f} ms   "
+            f"p99 {pick(0.99):8.1f} ms")
+
+
+def run_phase(base, token, jpeg, args, login_clients):
+    stop = threading.Event()
+    frame_latencies, frame_statuses = [], {}
+    login_latencies, login_statuses = [], {}
+    threads = [threading.Thread(target=post_frames, args=(
+        base, token, jpeg, args.frame_interval, stop, frame_latencies, frame_statuses))]
+    threads += [threading.Thread(target=login_loop, args=(
+        base, i, stop, login_latencies, login_statuses)) for i in range(login_clients)]
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    return frame_latencies, frame_statuses, login_latencies, login_statuses
+
+
+def benchmark_mode(label, hash_workers, args, jpeg):
+    database_path = os.path.join(args.db_dir, f"neurolens_login_bench_{hash_workers}.db")
+    seed(database_path, args.login_clients)
+    server = start_server(args.port, f"sqlite:///{database_path}", hash_workers)
+    base = f"http://127.0.0.1:{args.port}"
+    try:
+        token = json.loads(request(f"{base}/api/auth/guest", b"{}")[1])["token"]
+        print(f"\n🔐 {label}")
+        idle, idle_statuses, _, _ = run_phase(base, token, jpeg, args, 0)
+        print(f"   frames alone           {percentiles(idle)}   statuses {idle_statuses}")
+        loaded, loaded_statuses, logins, login_statuses = run_phase(base, token, jpeg, args, args.login_clients)
+        print(f"   frames under logins    {percentiles(loaded)}   statuses {loaded_statuses}")
+        print(f"   logins                 {percentiles(logins)}   statuses {login_statuses}")
+        throughput = len(logins) / args.duration
+        print(f"   login throughput       {throughput:.1f} logins/s")
+        return throughput, statistics.median(loaded) if loaded else float("nan")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark login throughput and frame latency under login load")
+    parser.add_argument("--login-clients", type=int, default=16, help="Concurrent login threads (one account each)")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per phase")
+    parser.add_argument("--frame-interval", type=float, default=0.1, help="Seconds between frames")
+    parser.add_argument("--image", help="JPEG to post as the frame (default: synthetic 640x480)")
+    parser.add_argument("--hash-workers", type=int, default=2, help="PASSWORD_HASH_WORKERS for the pool run")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--db-dir", default="/tmp")
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            jpeg = f.read()
+    else:
+        frame = np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+        jpeg = cv2.imencode(".jpg", frame)[1].tobytes()
+
+    inline = benchmark_mode("Argon2 inline in request workers (PASSWORD_HASH_WORKERS=0)", 0, args, jpeg)
+    pooled = benchmark_mode(f"Argon2 in process pool (PASSWORD_HASH_WORKERS={args.hash_workers})",
+                            args.hash_workers, args, jpeg)
+    print(f"\n✅ login throughput {inline[0]:.1f} → {pooled[0]:.1f} logins/s, "
+          f"median frame latency under load {inline[1]:.1f} → {pooled[1]:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Benchmark outbound email: the old connect-per-message send inside the handler
+against the spooled MailQueue with pooled SMTP connections.
+
+Runs against a local SMTP stand-in (no real mail leaves the machine) that delays
+each new connection by --handshake-ms, standing in for the TCP + STARTTLS + AUTH
+round trips to a real provider, and each message by --message-ms. --clients threads
+play request handlers sending --messages emails between them.
+
+Run: python benchmark_mail_queue.py [--messages 200] [--clients 8] [--workers 2] [--handshake-ms 150]
+"""
+import argparse
+import smtplib
+import socketserver
+import statistics
+import tempfile
+import threading
+import time
+
+from mail_queue import MailQueue, SMTPConnectionPool, build_message
+
+SENDER = "NeuroLens <noreply@neurolens.app>"
+HTML = "<p>Your verification code is <b>123456</b></p>" * 20
+
+
+class StandInSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT."""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        time.sleep(self.server.handshake_delay)
+        self.reply("220 standin ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line[:4].decode(errors="replace").upper()
+            if verb == "EHLO":
+                self.wfile.write(b"250-standin\r\n250 8BITMIME\r\n")
+            elif verb in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                time.sleep(self.server.message_delay)
+                with self.server.lock:
+                    self.server.received += 1
+                self.reply("250 OK queued")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class StandInSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, port, handshake_ms, message_ms):
+        super().__init__(("127.0.0.1", port), StandInSMTPHandler)
+        self.handshake_delay = handshake_ms / 1000.0
+        self.message_delay = message_ms / 1000.0
+        self.lock = threading.Lock()
+        self.received = 0
+
+
+def send_unpooled(port, to_email):
+    """The pre-queue EmailService.send_email: a fresh connection per message."""
+    server = smtplib.SMTP("127.0.0.1", port, timeout=30)
+    server.ehlo()
+    server.send_message(build_message(SENDER, to_email, "NeuroLens - Verify Your Email", HTML))
+    server.quit()
+
+
+def run_clients(clients, messages, send):
+    """Split messages over client threads; returns (per-call latencies ms, wall seconds)."""
+    latencies = []
+    lock = threading.Lock()
+
+    def client(count, offset):
+        for i in range(count):
+            start = time.perf_counter()
+            send(f"user{offset + i}@example.com")
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+
+    per_client = [messages // clients + (1 if i < messages % clients else 0) for i in range(clients)]
+    offsets = [sum(per_client[:i]) for i in range(clients)]
+    threads = [threading.Thread(target=client, args=(n, o)) for n, o in zip(per_client, offsets)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, time.perf_counter() - start
+
+
+def summary(label, latencies, seconds, messages):
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+    print(f"{label:<34} handler p50 {statistics.median(ordered):8.2f} ms   p99 {p99:8.2f} ms   "
+          f"{messages / seconds:7.1f} msg/s delivered")
+    return messages / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the outbound mail queue against a local SMTP stand-in")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent request handlers sending mail")
+    parser.add_argument("--workers", type=int, default=2, help="Mail sender threads / pooled SMTP connections")
+    parser.add_argument("--handshake-ms", type=float, default=150.0, help="Delay per new SMTP connection")
+    parser.add_argument("--message-ms", type=float, default=20.0, help="Delay per message")
+    parser.add_argument("--port", type=int, default=8825)
+    args = parser.parse_args()
+
+    smtp = StandInSMTPServer(args.port, args.handshake_ms, args.message_ms)
+    threading.Thread(target=smtp.serve_forever, daemon=True).start()
+    print(f"📧 SMTP stand-in on 127.0.0.1:{args.port} (handshake {args.handshake_ms:.0f} ms, "
+          f"message {args.message_ms:.0f} ms), {args.messages} messages from {args.clients} clients\n")
+    try:
+        latencies, seconds = run_clients(args.clients, args.messages, lambda to: send_unpooled(args.port, to))
+        inline = summary("inline, connection per message", latencies, seconds, args.messages)
+
+        with tempfile.TemporaryDirectory() as spool:
+            pool = SMTPConnectionPool("127.0.0.1", args.port, starttls=False, size=args.workers)
+            queue = MailQueue(pool, spool_dir=spool, sender=SENDER, workers=args.workers)
+            queue.start()
+            start = time.perf_counter()
+            latencies, _ = run_clients(
+                args.clients, args.messages,
+                lambda to: queue.enqueue(to, "NeuroLens - Verify Your Email", HTML)
+            )
+            queue.wait_until_empty(timeout=600)
+            seconds = time.perf_counter() - start
+            queued = summary(f"queued, {args.workers} pooled connection(s)", latencies, seconds, args.messages)
+            stats = queue.stats()
+            queue.stop()
+        print(f"\n   sent {stats['sent']}, failed {stats['failed']}, retries {stats['retries']}, "
+              f"SMTP connections opened {stats['smtp_pool']['opened']}, reused {stats['smtp_pool']['reused']}")
+        print(f"✅ delivery throughput {inline:.1f} → {queued:.1f} msg/s "
+              f"(stand-in received {smtp.received} messages)")
+    finally:
+        smtp.shutdown()
+        smtp.server_close()
+
+
+if __name__ == "__main__":
+    main()
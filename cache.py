@@ -0,0 +1,130 @@
+"""
+Small in-process TTL + LRU cache.
+
+Used for results that are expensive to compute and fine to serve slightly stale
+(admin analytics, per-user dashboard payloads). Entries expire ttl_seconds after
+they were stored; the least recently used entry is evicted once maxsize is reached.
+Each API worker process has its own cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ttl_seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: float = 30.0, name: str = "cache"):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = max(0.0, float(ttl_seconds))
+        self.name = name
+
+        # key -> (expires_at, value)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # key -> token of the get_or_set computing it; invalidation drops the token
+        self._fills: Dict[Hashable, object] = {}
+        self._lock = threading.Lock()
+
+        # Stats
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._stale_fills = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Cached value for key, or default if missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self._misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        with self._lock:
+            self._store(key, value, ttl_seconds)
+
+    def get_or_set(self, key: Hashable, compute: Callable[[], Any],
+                   ttl_seconds: Optional[float] = None) -> Any:
+        """
+        Return the cached value, or compute, store and return it. compute runs outside
+        the lock, so concurrent misses on the same key may each compute once. If the key
+        is invalidated while compute runs, the result is returned but not stored: it may
+        have been read before the write that caused the invalidation.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        token = object()
+        with self._lock:
+            self._fills[key] = token
+        try:
+            value = compute()
+        finally:
+            with self._lock:
+                current = self._fills.get(key) is token
+                if current:
+                    del self._fills[key]
+        with self._lock:
+            if current:
+                self._store(key, value, ttl_seconds)
+            else:
+                self._stale_fills += 1
+        return value
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Drop one entry (and any fill in progress). Returns True if it was cached."""
+        with self._lock:
+            self._fills.pop(key, None)
+            removed = self._entries.pop(key, None) is not None
+            self._invalidations += removed
+            return removed
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches predicate (e.g. all keys for one user)."""
+        with self._lock:
+            for k in [k for k in self._fills if predicate(k)]:
+                del self._fills[k]
+            keys = [k for k in self._entries if predicate(k)]
+            for k in keys:
+                del self._entries[k]
+            self._invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._fills.clear()
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+
+    def _store(self, key: Hashable, value: Any, ttl_seconds: Optional[float]) -> None:
+        ttl = self.ttl if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit/miss counters for monitoring."""
+        lookups = self._hits + self._misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+            "evictions": self._evictions,
+            "invalidations": self._invalidations,
+            "stale_fills": self._stale_fills,
+        }
@@ -0,0 +1,152 @@
+"""
+Check that the hot endpoint queries are served by the indexes added in migrate.py.
+
+Each query is compiled exactly as the endpoints issue it and run through EXPLAIN.
+On Postgres, sequential scans are disabled for the check (SET enable_seqscan = off)
+so small development tables still show which index the planner *can* use; pass
+--allow-seqscan to see the plan the planner would really pick. SQLite is supported
+via EXPLAIN QUERY PLAN for local runs.
+
+Run:
+    python migrate.py
+    python check_query_plans.py
+Exits with status 1 if any query does not use its expected index.
+"""
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Set
+
+from sqlalchemy import and_, func, or_, select, text
+
+from database import engine
+from models import ContentSession, EmotionLog
+
+SAMPLE_USER_ID = 1
+
+
+def hot_queries() -> List[Any]:
+    """(name, statement, expected index) for each hot query shape."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=7)
+    return [
+        (
+            "dashboard: latest emotion",
+            select(EmotionLog)
+            .where(EmotionLog.user_id == SAMPLE_USER_ID)
+            .order_by(EmotionLog.created_at.desc()).limit(1),
+            "ix_emotion_logs_user_id_created_at",
+        ),
+        (
+            "emotion history page",
+            select(EmotionLog)
+            .where(EmotionLog.user_id == SAMPLE_USER_ID)
+            .order_by(EmotionLog.created_at.desc()).limit(50),
+            "ix_emotion_logs_user_id_created_at",
+        ),
+        (
+            "emotion history page (keyset cursor)",
+            select(EmotionLog)
+            .where(
+                EmotionLog.user_id == SAMPLE_USER_ID,
+                EmotionLog.created_at <= cutoff,
+                or_(EmotionLog.created_at < cutoff,
+                    and_(EmotionLog.created_at == cutoff, EmotionLog.id < 1000))
+            )
+            .order_by(EmotionLog.created_at.desc(), EmotionLog.id.desc()).limit(50),
+            "ix_emotion_logs_user_id_created_at",
+        ),
+        (
+            "dashboard / active content session",
+            select(ContentSession)
+            .where(ContentSession.user_id == SAMPLE_USER_ID, ContentSession.is_active == True)
+            .order_by(ContentSession.started_at.desc()).limit(1),
+            "ix_content_sessions_user_active",
+        ),
+        (
+            "content summary by type",
+            select(
+                ContentSession.content_type,
+                func.sum(ContentSession.duration_seconds),
+                func.count(ContentSession.id)
+            )
+            .where(
+                ContentSession.user_id == SAMPLE_USER_ID,
+                ContentSession.started_at >= cutoff,
+                ContentSession.duration_seconds.isnot(None)
+            )
+            .group_by(ContentSession.content_type),
+            "ix_content_sessions_user_started",
+        ),
+    ]
+
+
+def _postgres_plan_indexes(plan: dict, found: Set[str], seq_scans: List[str]) -> None:
+    node = plan.get("Node Type", "")
+    if "Index" in node and plan.get("Index Name"):
+        found.add(plan["Index Name"])
+    if node == "Seq Scan":
+        seq_scans.append(plan.get("Relation Name", "?"))
+    for child in plan.get("Plans", []):
+        _postgres_plan_indexes(child, found, seq_scans)
+
+
+def explain(conn, stmt) -> Any:
+    """Returns (indexes used, tables seq-scanned, plan text)."""
+    compiled = stmt.compile(dialect=conn.dialect)
+    if compiled.positional:
+        params = tuple(compiled.params[key] for key in compiled.positiontup)
+    else:
+        params = compiled.params
+    found: Set[str] = set()
+    seq_scans: List[str] = []
+
+    if conn.dialect.name == "postgresql":
+        row = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params).scalar()
+        plan = (json.loads(row) if isinstance(row, str) else row)[0]["Plan"]
+        _postgres_plan_indexes(plan, found, seq_scans)
+        return found, seq_scans, json.dumps(plan, indent=2)
+
+    # SQLite: rows of (id, parent, notused, detail)
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+    details = [r[-1] for r in rows]
+    for detail in details:
+        if " INDEX " in detail:
+            found.add(detail.split(" INDEX ", 1)[1].split(" ")[0])
+        elif detail.startswith("SCAN ") and "INDEX" not in detail:
+            seq_scans.append(detail.split()[1])
+    return found, seq_scans, "\n".join(details)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Verify hot queries use index scans")
+    parser.add_argument("--allow-seqscan", action="store_true",
+                        help="Postgres: keep enable_seqscan on (real planner choice)")
+    parser.add_argument("--verbose", action="store_true", help="Print full plans")
+    args = parser.parse_args()
+
+    failures = 0
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql" and not args.allow_seqscan:
+            conn.execute(text("SET enable_seqscan = off"))
+
+        for name, stmt, expected in hot_queries():
+            found, seq_scans, plan = explain(conn, stmt)
+            ok = expected in found and not seq_scans
+            failures += not ok
+            print(f"{'✅' if ok else '❌'} {name}: uses {', '.join(sorted(found)) or 'no index'}"
+                  + (f" | seq scan on {', '.join(seq_scans)}" if seq_scans else ""))
+            if not ok:
+                print(f"   expected index: {expected}")
+            if args.verbose or not ok:
+                print("   " + plan.replace("\n", "\n   "))
+
+    if failures:
+        print(f"\n❌ {failures} hot quer{'y' if failures == 1 else 'ies'} not using the expected index "
+              f"(run python migrate.py?)")
+        sys.exit(1)
+    print("\n✅ All hot queries use their indexes")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from typing import List
+import os
 
 class Settings(BaseSettings):
     DATABASE_URL: str
@@ -16,10 +17,131 @@ class Settings(BaseSettings):
     EMAIL_USER: str = ""
     EMAIL_PASSWORD: str = ""
     EMAIL_FROM: str = "NeuroLens <noreply@neurolens.app>"
+    EMAIL_STARTTLS: bool = True
     
     # Activity Module
     BEHAVIORAL_POLL_INTERVAL: int = 5
     
+    # Emotion model: checkpoint + serving runtime ("eager", "torchscript" or "onnx").
+    # Non-eager runtimes load EMOTION_MODEL_ARTIFACT (see export_emotion_model.py);
+    # an INT8 model from quantize_emotion_model.py is served with the "onnx" runtime.
+    # If the artifact can't be loaded the checkpoint is served instead, and if that
+    # fails too the API refuses to start.
+    EMOTION_MODEL_PATH: str = ""
+    EMOTION_MODEL_RUNTIME: str = "eager"
+    EMOTION_MODEL_ARTIFACT: str = ""
+    EMOTION_ONNX_THREADS: int = 0
+    # Face crop resolution fed to the model (benchmark_input_resolution.py compares sizes)
+    EMOTION_INPUT_SIZE: int = 380
+    
+    # Emotion inference (worker pool + micro-batching)
+    INFERENCE_WORKERS: int = 2
+    INFERENCE_MAX_QUEUE: int = 32
+    INFERENCE_BATCHING_ENABLED: bool = True
+    INFERENCE_MAX_BATCH_SIZE: int = 16
+    INFERENCE_MAX_WAIT_MS: float = 8.0
+    
+    # Face tracking (skip full cascade detection on consecutive frames)
+    FACE_TRACKING_ENABLED: bool = True
+    FACE_TRACKING_REDETECT_INTERVAL: int = 10
+    FACE_TRACKING_PADDING: float = 0.5
+    FACE_TRACKING_MAX_AGE_SECONDS: float = 2.0  # forget a box after this long without frames
+    FACE_TRACKING_MAX_ENTRIES: int = 1024  # tracked users per process (LRU)
+    
+    # Frame sampling (reuse the last result for unchanged frames, thin out stable streams)
+    FRAME_SAMPLING_ENABLED: bool = True
+    FRAME_SAMPLING_DIFF_THRESHOLD: float = 3.0
+    FRAME_SAMPLING_MOTION_THRESHOLD: float = 8.0
+    FRAME_SAMPLING_STABLE_FRAMES: int = 5
+    FRAME_SAMPLING_MAX_SKIP: int = 4
+    FRAME_SAMPLING_MAX_AGE_SECONDS: float = 5.0
+    
+    # Emotion log write-behind (batched inserts instead of a commit per frame); rows that
+    # can't reach the DB are appended to the fallback file and replayed
+    EMOTION_LOG_WRITE_BEHIND: bool = True
+    EMOTION_LOG_FLUSH_ROWS: int = 500
+    EMOTION_LOG_FLUSH_INTERVAL_MS: float = 250.0
+    EMOTION_LOG_MAX_PENDING: int = 10000
+    EMOTION_LOG_FALLBACK_PATH: str = os.path.join(os.path.expanduser("~"), ".neurolens", "emotion_log_fallback.ndjson")
+    EMOTION_LOG_REPLAY_INTERVAL_SECONDS: float = 30.0  # replay spilled rows this often once inserts succeed again
+    
+    # Audit log write-behind; events that can't reach the DB are appended to the fallback file
+    AUDIT_LOG_WRITE_BEHIND: bool = True
+    AUDIT_LOG_FLUSH_ROWS: int = 200
+    AUDIT_LOG_FLUSH_INTERVAL_MS: float = 500.0
+    AUDIT_LOG_MAX_PENDING: int = 10000
+    AUDIT_LOG_FALLBACK_PATH: str = os.path.join(os.path.expanduser("~"), ".neurolens", "audit_fallback.ndjson")
+    AUDIT_LOG_REPLAY_INTERVAL_SECONDS: float = 30.0
+    
+    # How often live per-user state (current emotion, recording flag) is written to `users`
+    LIVE_STATE_PERSIST_SECONDS: float = 30.0
+    LIVE_STATE_MAX_USERS: int = 10000  # least recently updated users are evicted beyond this
+    
+    # Emotion rollups (background compaction of emotion_logs) and raw row retention
+    EMOTION_ROLLUP_ENABLED: bool = True
+    EMOTION_ROLLUP_INTERVAL_SECONDS: float = 60.0
+    EMOTION_ROLLUP_BATCH_SIZE: int = 5000
+    EMOTION_ROLLUP_SETTLE_SECONDS: float = 30.0
+    # Raw emotion_logs back the history and dataset export endpoints, so they are kept
+    # forever unless an operator opts in to deleting them (set EMOTION_ARCHIVE_DIR too)
+    EMOTION_RAW_RETENTION_DAYS: float = 0.0            # 0 = keep raw rows forever
+    EMOTION_ARCHIVE_DIR: str = ""                       # append expired raw rows here as NDJSON before deleting
+    
+    # Admin analytics (/api/admin/stats, audit summary) result cache
+    ADMIN_STATS_CACHE_TTL_SECONDS: float = 30.0
+    
+    # Rows per batch read / written by the streaming dataset export
+    DATASET_EXPORT_BATCH_SIZE: int = 5000
+    
+    # Dashboard Server-Sent Events stream
+    DASHBOARD_STREAM_HEARTBEAT_SECONDS: float = 15.0
+    DASHBOARD_STREAM_MIN_INTERVAL_SECONDS: float = 0.5   # coalesce bursts of changes
+    DASHBOARD_STREAM_RETRY_MS: int = 3000                 # client reconnect delay
+    
+    # /ws/analyze frame stream: re-check the token and account this often (and at token expiry)
+    WS_AUTH_RECHECK_SECONDS: float = 60.0
+    
+    # Per-user response cache for polled endpoints (dashboard, active session, recommendations)
+    USER_RESPONSE_CACHE_TTL_SECONDS: float = 5.0
+    USER_RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+    RECOMMENDATIONS_CACHE_TTL_SECONDS: float = 30.0
+    
+    # Authenticated user cache in get_current_user (saves the users lookup per request)
+    AUTH_USER_CACHE_TTL_SECONDS: float = 30.0
+    AUTH_USER_CACHE_MAX_ENTRIES: int = 10000
+    
+    # Argon2 hashing in a dedicated process pool (0 workers = hash inline in the request thread)
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 16
+    # Concurrent password checks allowed per client IP / per account (0 = unlimited)
+    PASSWORD_MAX_CONCURRENT_PER_IP: int = 4
+    PASSWORD_MAX_CONCURRENT_PER_ACCOUNT: int = 1
+    
+    # Plaintext cache for decrypted user fields, keyed by ciphertext (0 entries = disabled)
+    DECRYPT_CACHE_MAX_ENTRIES: int = 20000
+    DECRYPT_CACHE_TTL_SECONDS: float = 3600.0
+    
+    # Outbound mail queue: spool directory, background senders (one pooled SMTP connection each)
+    MAIL_QUEUE_ENABLED: bool = True
+    MAIL_SPOOL_DIR: str = os.path.join(os.path.expanduser("~"), ".neurolens", "mail_spool")  # outside the source tree
+    MAIL_SENDER_WORKERS: int = 2
+    MAIL_MAX_ATTEMPTS: int = 6
+    MAIL_RETRY_BASE_SECONDS: float = 5.0   # doubles per attempt
+    MAIL_RETRY_MAX_SECONDS: float = 600.0
+    MAIL_FAILED_RETENTION_HOURS: float = 24.0  # undeliverable messages in spool/failed are purged after this
+    MAIL_SPOOL_SCAN_SECONDS: float = 60.0      # pick up mail spooled by other workers sharing MAIL_SPOOL_DIR
+    MAIL_CLAIM_TIMEOUT_SECONDS: float = 900.0  # a message claimed this long ago by a dead sender is retried
+    SMTP_POOL_MAX_IDLE_SECONDS: float = 60.0
+    SMTP_POOL_MAX_MESSAGES_PER_CONNECTION: int = 100
+    
+    # Face detector backend: "auto", "dnn" (res10 SSD) or "haar"
+    FACE_DETECTOR_BACKEND: str = "auto"
+    FACE_DNN_CONFIDENCE: float = 0.6
+    FACE_DNN_PROTO_PATH: str = ""
+    FACE_DNN_MODEL_PATH: str = ""
+    FACE_HAAR_MIN_WEIGHT: float = 0.0
+    FACE_HAAR_FALLBACKS: bool = True
+    
     class Config:
         env_file = ".env"
         extra = "ignore"
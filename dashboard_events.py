@@ -0,0 +1,74 @@
+"""
+Change notifications for the dashboard Server-Sent Events stream.
+
+The dashboard used to poll /api/dashboard/status. Now the code paths that change a
+user's dashboard (frame analysis, content session tracking, start/stop recording)
+call notify(user_id), and every open /api/dashboard/stream for that user wakes up,
+rebuilds its state and pushes it if it differs from what it sent last.
+
+notify() is safe to call from request threads and from the event loop; it only
+sets an asyncio.Event on each subscriber's loop.
+
+Subscribers live in the API process, so a notify() only reaches streams held by the
+same process: run the API as a single uvicorn worker (see live_state).
+"""
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DashboardBroadcaster:
+    """Per-user fan-out of "dashboard changed" signals to stream subscribers."""
+
+    def __init__(self):
+        # user_id -> [(loop, event)] for each open stream
+        self._subscribers: Dict[int, List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+        self._lock = threading.Lock()
+
+        # Stats
+        self._notifications = 0
+        self._deliveries = 0
+
+    def subscribe(self, user_id: int) -> asyncio.Event:
+        """Register a stream (call from the event loop). The event is set on every change."""
+        event = asyncio.Event()
+        entry = (asyncio.get_running_loop(), event)
+        with self._lock:
+            self._subscribers.setdefault(user_id, []).append(entry)
+        return event
+
+    def unsubscribe(self, user_id: int, event: asyncio.Event) -> None:
+        with self._lock:
+            entries = [e for e in self._subscribers.get(user_id, []) if e[1] is not event]
+            if entries:
+                self._subscribers[user_id] = entries
+            else:
+                self._subscribers.pop(user_id, None)
+
+    def notify(self, user_id: int) -> None:
+        """Signal that user_id's dashboard state may have changed."""
+        with self._lock:
+            entries = list(self._subscribers.get(user_id, ()))
+        self._notifications += 1
+        for loop, event in entries:
+            try:
+                loop.call_soon_threadsafe(event.set)
+                self._deliveries += 1
+            except RuntimeError:
+                # Loop already closed (shutdown); the stream is going away anyway
+                logger.debug(f"Dropped dashboard notification for user {user_id}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Open streams and notification counters for monitoring."""
+        with self._lock:
+            streams = sum(len(entries) for entries in self._subscribers.values())
+            users = len(self._subscribers)
+        return {
+            "open_streams": streams,
+            "users": users,
+            "notifications": self._notifications,
+            "deliveries": self._deliveries,
+        }
@@ -0,0 +1,188 @@
+"""
+Streaming export of the emotion dataset (/api/admin/dataset/export).
+
+The export used to load every EmotionLog row into one JSON list. Rows are now read
+in batches with yield_per (a server-side cursor on Postgres) and written out chunk
+by chunk as JSON, NDJSON, CSV or Parquet, so memory stays flat regardless of table
+size. The emotion distribution comes from a single GROUP BY over the same filters.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import EmotionLog
+
+# Optional imports
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    pa = None
+    pq = None
+
+FORMATS = {
+    'json': ('application/json', 'json'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+FIELDS = ('emotion', 'intensity', 'content_type', 'probabilities', 'timestamp')
+# Keys of emotion_distribution in the pre-streaming JSON export (always present, 0 if unseen)
+JSON_DISTRIBUTION_LABELS = ('happy', 'sad', 'angry', 'neutral', 'focused', 'stressed', 'tired')
+
+
+def _filtered(query: Any, since: Optional[datetime], until: Optional[datetime],
+              user_id: Optional[int]) -> Any:
+    if since is not None:
+        query = query.filter(EmotionLog.created_at >= since)
+    if until is not None:
+        query = query.filter(EmotionLog.created_at < until)
+    if user_id is not None:
+        query = query.filter(EmotionLog.user_id == user_id)
+    return query
+
+
+def emotion_distribution(db: Session, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                         user_id: Optional[int] = None) -> Dict[str, int]:
+    """Samples per emotion for the export filters, in one aggregate query."""
+    query = _filtered(
+        db.query(EmotionLog.emotion, func.count(EmotionLog.id)), since, until, user_id
+    ).group_by(EmotionLog.emotion)
+    return {emotion: count for emotion, count in query.all()}
+
+
+def iter_batches(since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 user_id: Optional[int] = None, batch_size: int = 5000) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Export rows in id order, batch_size at a time. Opens its own session, since the
+    response body is produced after the request's session has gone away.
+    """
+    db = SessionLocal()
+    try:
+        query = _filtered(
+            db.query(
+                EmotionLog.emotion, EmotionLog.intensity, EmotionLog.content_type,
+                EmotionLog.probabilities, EmotionLog.created_at
+            ), since, until, user_id
+        ).order_by(EmotionLog.id).yield_per(batch_size)
+
+        batch: List[Dict[str, Any]] = []
+        for row in query:
+            batch.append({
+                'emotion': row.emotion,
+                'intensity': row.intensity,
+                'content_type': row.content_type,
+                'probabilities': row.probabilities,
+                'timestamp': row.created_at.isoformat() if row.created_at else None,
+            })
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        db.close()
+
+
+def stream_json(batches: Iterator[List[Dict[str, Any]]], distribution: Dict[str, int]) -> Iterator[bytes]:
+    """The original response shape ({total_samples, emotion_distribution, dataset}), streamed."""
+    header = {
+        'total_samples': sum(distribution.values()),
+        'emotion_distribution': {**{emotion: 0 for emotion in JSON_DISTRIBUTION_LABELS}, **distribution},
+    }
+    yield (json.dumps(header)[:-1] + ', "dataset": [').encode()
+    first = True
+    for batch in batches:
+        chunk = ", ".join(json.dumps(row) for row in batch)
+        yield ((chunk if first else ", " + chunk)).encode()
+        first = False
+    yield b"]}"
+
+
+def stream_ndjson(batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    for batch in batches:
+        yield ("\n".join(json.dumps(row) for row in batch) + "\n").encode()
+
+
+def stream_csv(batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written so far; tell() keeps counting."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_parquet(batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    """One Parquet row group per batch, yielded as soon as it is written."""
+    schema = pa.schema([
+        ('emotion', pa.string()),
+        ('intensity', pa.float64()),
+        ('content_type', pa.string()),
+        ('probabilities', pa.string()),
+        ('timestamp', pa.string()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for batch in batches:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream(fmt: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+           user_id: Optional[int] = None, distribution: Optional[Dict[str, int]] = None,
+           batch_size: int = 5000) -> Iterator[bytes]:
+    """Body generator for the requested format."""
+    batches = iter_batches(since, until, user_id, batch_size)
+    if fmt == 'ndjson':
+        return stream_ndjson(batches)
+    if fmt == 'csv':
+        return stream_csv(batches)
+    if fmt == 'parquet':
+        return stream_parquet(batches)
+    return stream_json(batches, distribution or {})
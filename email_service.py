@@ -5,6 +5,7 @@ import random
 import string
 import logging
 from config import settings
+from mail_queue import MailQueue, SMTPConnectionPool
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +23,8 @@ class EmailService:
     @staticmethod
     def send_email(to_email: str, subject: str, html_body: str) -> bool:
         """
-        Send email using SMTP
+        Send email using SMTP. While the outbound mail queue is running the message
+        is only spooled here and delivered by its background senders.
         
         Args:
             to_email: Recipient email
@@ -30,7 +32,7 @@ class EmailService:
             html_body: HTML content
         
         Returns:
-            True if sent successfully, False otherwise
+            True if sent (or queued) successfully, False otherwise
         """
         
         if not settings.EMAIL_ENABLED:
@@ -53,6 +55,15 @@ class EmailService:
             print(f"{'='*60}\n")
             return False
         
+        if outbound_mail.running:
+            try:
+                outbound_mail.enqueue(to_email, subject, html_body)
+            except OSError as e:
+                logger.error(f"❌ Could not spool email: {e}")
+                return False
+            print(f"📬 Email to {to_email} queued for delivery")
+            return True
+        
         try:
             # Create message
             msg = MIMEMultipart('alternative')
@@ -370,6 +381,28 @@ class EmailService:
         return EmailService.send_email(to_email, subject, html_body)
 
 
+# Background sender for send_email (started by the API on startup)
+outbound_mail = MailQueue(
+    SMTPConnectionPool(
+        settings.EMAIL_HOST, settings.EMAIL_PORT,
+        username=settings.EMAIL_USER, password=settings.EMAIL_PASSWORD,
+        starttls=settings.EMAIL_STARTTLS,
+        size=settings.MAIL_SENDER_WORKERS,
+        max_idle_seconds=settings.SMTP_POOL_MAX_IDLE_SECONDS,
+        max_messages=settings.SMTP_POOL_MAX_MESSAGES_PER_CONNECTION
+    ),
+    spool_dir=settings.MAIL_SPOOL_DIR,
+    sender=settings.EMAIL_FROM,
+    workers=settings.MAIL_SENDER_WORKERS,
+    max_attempts=settings.MAIL_MAX_ATTEMPTS,
+    retry_base_seconds=settings.MAIL_RETRY_BASE_SECONDS,
+    retry_max_seconds=settings.MAIL_RETRY_MAX_SECONDS,
+    failed_retention_hours=settings.MAIL_FAILED_RETENTION_HOURS,
+    scan_interval_seconds=settings.MAIL_SPOOL_SCAN_SECONDS,
+    claim_timeout_seconds=settings.MAIL_CLAIM_TIMEOUT_SECONDS
+)
+
+
 # Test email service
 if __name__ == "__main__":
     print("🧪 Testing Email Service\n")
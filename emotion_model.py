@@ -1,7 +1,13 @@
 import logging
 import os
+import threading
+import time
+from collections import OrderedDict
 from typing import Dict, Tuple, Optional, Any, List
 
+from config import settings
+from frame_sampler import AdaptiveFrameSampler
+
 # Optional imports
 try:
     import cv2
@@ -23,6 +29,16 @@ except ImportError:
     nn = None
     timm = None
 
+try:
+    import onnxruntime as ort
+    ORT_AVAILABLE = True
+except ImportError:
+    ORT_AVAILABLE = False
+    ort = None
+
+# Supported serving runtimes for the emotion model
+MODEL_RUNTIMES = ('eager', 'torchscript', 'onnx')
+
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
@@ -47,16 +63,127 @@ else:
     _EmotionModel = None
 
 
+def load_emotion_checkpoint(model_path: str, device: Any = None) -> Any:
+    """Build the eager EfficientNet-B4 emotion model and load a training checkpoint into it."""
+    device = device or torch.device('cpu')
+    model = _EmotionModel(num_classes=7)
+    checkpoint = torch.load(model_path, map_location=device)
+
+    if isinstance(checkpoint, dict) and 'model_state_dict' in checkpoint:
+        model.load_state_dict(checkpoint['model_state_dict'])
+    elif isinstance(checkpoint, dict) and 'state_dict' in checkpoint:
+        model.load_state_dict(checkpoint['state_dict'])
+    else:
+        model.load_state_dict(checkpoint)
+
+    model.to(device)
+    model.eval()
+    return model
+
+
+def softmax(logits: Any) -> Any:
+    """Row-wise softmax for a (batch, classes) NumPy array."""
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+# ImageNet normalization constants (RGB)
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+class FacePreprocessor:
+    """
+    Turns face crops into a normalized (N, 3, S, S) float32 batch using preallocated
+    buffers: resizing writes into a reused uint8 buffer, and one fused multiply-add per
+    crop writes straight into the CHW batch slot. A grayscale crop is expanded to three
+    channels by broadcasting against the per-channel constants, so no RGB copy is made.
+    Not thread-safe; EmotionDetector keeps one instance per thread.
+    """
+
+    def __init__(self, input_size: int, pin_memory: bool = False):
+        self.input_size = input_size
+        self.pin_memory = pin_memory and TORCH_AVAILABLE
+        # (x / 255 - mean) / std  ==  x * scale + bias
+        std = np.array(IMAGENET_STD, dtype=np.float32).reshape(3, 1, 1)
+        mean = np.array(IMAGENET_MEAN, dtype=np.float32).reshape(3, 1, 1)
+        self.scale = (1.0 / (255.0 * std)).astype(np.float32)
+        self.bias = (-mean / std).astype(np.float32)
+
+        self._resized_gray = np.empty((input_size, input_size), dtype=np.uint8)
+        self._resized_color = np.empty((input_size, input_size, 3), dtype=np.uint8)
+        self._batch = None
+        self._capacity = 0
+
+    def _ensure_capacity(self, n: int) -> None:
+        if n <= self._capacity:
+            return
+        capacity = max(n, self._capacity * 2, 1)
+        shape = (capacity, 3, self.input_size, self.input_size)
+        if self.pin_memory:
+            # Page-locked host memory so the host-to-GPU copy can run asynchronously
+            self._batch = torch.empty(shape, dtype=torch.float32).pin_memory().numpy()
+        else:
+            self._batch = np.empty(shape, dtype=np.float32)
+        self._capacity = capacity
+
+    def fill(self, face_images: List[Any]) -> Any:
+        """
+        Preprocess face crops into the shared batch buffer and return a view of the first
+        N rows. The view is overwritten by the next call on this preprocessor.
+        """
+        n = len(face_images)
+        self._ensure_capacity(n)
+        size = (self.input_size, self.input_size)
+
+        for i, face in enumerate(face_images):
+            out = self._batch[i]
+            if face.ndim == 2:
+                resized = cv2.resize(face, size, dst=self._resized_gray)
+                # (S, S) * (3, 1, 1) broadcasts into the (3, S, S) slot
+                np.multiply(resized, self.scale, out=out)
+            else:
+                resized = cv2.resize(face, size, dst=self._resized_color)
+                np.multiply(resized.transpose(2, 0, 1), self.scale, out=out)
+            np.add(out, self.bias, out=out)
+
+        return self._batch[:n]
+
+
 class EmotionDetector:
     """
-    Emotion detection from facial expressions using a PyTorch EfficientNet-B4 model.
-    Falls back to mock predictions if dependencies are missing.
+    Emotion detection from facial expressions using an EfficientNet-B4 model, served
+    eagerly from the training checkpoint or from an exported TorchScript/ONNX artifact.
+    An artifact that fails to load falls back to the checkpoint. Without a configured
+    artifact, a missing checkpoint or PyTorch falls back to mock predictions (development).
     """
 
     # Max dimension for face detection (smaller = faster)
     FACE_DETECT_MAX_DIM = 320
 
-    def __init__(self, model_path: Optional[str] = None):
+    # res10 SSD face detector input size and BGR mean
+    DNN_INPUT_SIZE = 300
+    DNN_MEAN = (104.0, 177.0, 123.0)
+    FACE_BACKENDS = ('auto', 'dnn', 'haar')
+
+    def __init__(self, model_path: Optional[str] = None,
+                 face_tracking: bool = True,
+                 track_redetect_interval: int = 10,
+                 track_padding: float = 0.5,
+                 track_max_age_seconds: float = 2.0,
+                 track_max_entries: int = 1024,
+                 face_backend: str = 'auto',
+                 dnn_confidence: float = 0.6,
+                 haar_min_weight: float = 0.0,
+                 haar_fallbacks: bool = True,
+                 dnn_proto_path: Optional[str] = None,
+                 dnn_model_path: Optional[str] = None,
+                 runtime: str = 'eager',
+                 artifact_path: Optional[str] = None,
+                 onnx_threads: int = 0,
+                 input_size: int = 380,
+                 frame_sampler: Optional[AdaptiveFrameSampler] = None):
         # Default path relative to this file
         if model_path is None:
             model_path = r"E:\Semester 7\fyp project\models\74.pth"
@@ -64,44 +191,80 @@ class EmotionDetector:
         self.model_path: str = os.path.abspath(model_path)
         self.model: Optional[Any] = None
         self.device = None
+        # Serving runtime: 'eager' (checkpoint + PyTorch), 'torchscript' or 'onnx' (exported artifact)
+        self.runtime = (runtime or 'eager').lower()
+        self.artifact_path: Optional[str] = os.path.abspath(artifact_path) if artifact_path else None
+        self.onnx_threads = onnx_threads
+        self._onnx_input_name: Optional[str] = None
         self.emotions = ['angry', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprise']
+        # Square model input resolution; 380 is EfficientNet-B4's native size, smaller
+        # sizes (e.g. 224/260/300) trade some accuracy for much cheaper inference.
+        self.input_size = int(input_size) if input_size and int(input_size) > 0 else 380
+        # Per-thread preallocated preprocessing buffers (see FacePreprocessor)
+        self._preprocessors = threading.local()
         
-        # Face detection - use DNN if available, fallback to Haar Cascade
+        # Face detection backend: 'dnn' (res10 SSD), 'haar' (cascade chain) or 'auto'
+        # (DNN when its model files are available, Haar otherwise)
         self.face_detector = None
         self.use_dnn = False
+        self.dnn_confidence = float(dnn_confidence)
+        self.haar_min_weight = float(haar_min_weight)
+        self.haar_fallbacks = haar_fallbacks
+        self._dnn_proto_path = dnn_proto_path
+        self._dnn_model_path = dnn_model_path
+        # cv2.dnn.Net keeps its input/output blobs internally, so forward passes are serialized
+        self._dnn_lock = threading.Lock()
+        # Same for cv2.CascadeClassifier: concurrent detectMultiScale calls corrupt its state
+        self._haar_lock = threading.Lock()
         
         # Pre-load cascade classifiers ONCE (not per frame)
         self._cascade_default = None
         self._cascade_alt = None
         self._init_face_detector()
+        try:
+            self.set_face_backend(face_backend)
+        except ValueError as e:
+            logger.warning(f"{e}. Using 'auto'.")
+            self.set_face_backend('auto')
+
+        # Per-user face tracking: {track_key: {'box': (x, y, w, h), 'frames': n, 'seen_at': t}}
+        # Consecutive frames only search a padded region around the last box; a full
+        # detection runs on loss or every track_redetect_interval frames. A box is forgotten
+        # if the user sent no frame for track_max_age_seconds; at most track_max_entries
+        # users are tracked (least recently seen are evicted first).
+        self.face_tracking = face_tracking
+        self.track_redetect_interval = max(1, int(track_redetect_interval))
+        self.track_padding = max(0.0, float(track_padding))
+        self.track_max_age = max(0.0, float(track_max_age_seconds))
+        self.track_max_entries = max(1, int(track_max_entries))
+        self._tracks: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+        self._track_lock = threading.Lock()
+        self._track_hits = 0
+        self._track_misses = 0
+
+        # Optional duplicate/stable-frame skipping, keyed like face tracking
+        self.frame_sampler = frame_sampler
 
         self._load_model()
     
     def _init_face_detector(self) -> None:
-        """Initialize face detector - prefer DNN over Haar Cascade for better accuracy."""
+        """Load the res10 SSD face detector (if its files exist) and the Haar cascades."""
         if not CV2_AVAILABLE:
             return
             
         try:
-            dnn_proto = cv2.data.haarcascades.replace('haarcascades', '') + "deploy.prototxt"
-            dnn_model = cv2.data.haarcascades.replace('haarcascades', '') + "res10_300x300_ssd_iter_140000.caffemodel"
+            data_dir = cv2.data.haarcascades.replace('haarcascades', '')
+            dnn_proto = self._dnn_proto_path or data_dir + "deploy.prototxt"
+            dnn_model = self._dnn_model_path or data_dir + "res10_300x300_ssd_iter_140000.caffemodel"
             
             if os.path.exists(dnn_proto) and os.path.exists(dnn_model):
                 self.face_detector = cv2.dnn.readNetFromCaffe(dnn_proto, dnn_model)
-                self.use_dnn = True
-                logger.info("✅ Using DNN face detector (more accurate)")
+                logger.info("✅ DNN face detector loaded")
             else:
-                self.face_detector = cv2.CascadeClassifier(
-                    cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-                )
-                self.use_dnn = False
-                logger.info("ℹ️ Using Haar Cascade face detector")
+                logger.info(f"ℹ️ DNN face detector files not found ({dnn_proto}, {dnn_model})")
         except Exception as e:
             logger.warning(f"DNN init failed, using Haar Cascade: {e}")
-            self.face_detector = cv2.CascadeClassifier(
-                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            )
-            self.use_dnn = False
+            self.face_detector = None
 
         # Pre-load cascade classifiers once (reused every frame)
         try:
@@ -116,32 +279,95 @@ class EmotionDetector:
             logger.warning(f"Failed to pre-load cascades: {e}")
 
     def _load_model(self) -> None:
-        """Load the PyTorch EfficientNet-B4 emotion model."""
+        """
+        Load the emotion model for the configured runtime (eager, TorchScript or ONNX Runtime).
+        An exported artifact that is missing or fails to load falls back to the eager
+        checkpoint; if that fails too, startup fails rather than serving mock predictions.
+        """
+        configured = self.runtime
+        if self.runtime not in MODEL_RUNTIMES:
+            logger.warning(f"Unknown model runtime '{self.runtime}'. Using eager PyTorch.")
+            self.runtime = 'eager'
+        if self.runtime != 'eager' and not self.artifact_path:
+            logger.warning(f"No exported model artifact configured for '{self.runtime}'. Using eager PyTorch.")
+            self.runtime = 'eager'
+        if self.runtime == 'onnx' and not ORT_AVAILABLE:
+            logger.warning("onnxruntime not available. Using eager PyTorch.")
+            self.runtime = 'eager'
+
+        if self.runtime == 'onnx':
+            self._load_onnx_model()
+        elif self.runtime == 'torchscript':
+            self._load_torchscript_model()
+        if self.model is not None:
+            return
+
+        if self.runtime != 'eager':
+            logger.warning(f"Falling back to eager PyTorch from {self.model_path}")
+            self.runtime = 'eager'
+        self._load_eager_model()
+        if self.model is None and configured != 'eager':
+            # An operator asked for a production runtime: don't quietly serve random emotions
+            raise RuntimeError(
+                f"Emotion model runtime '{configured}' is configured but neither its artifact "
+                f"({self.artifact_path}) nor the checkpoint ({self.model_path}) could be loaded"
+            )
+
+    def _load_eager_model(self) -> None:
+        """Load the training checkpoint with PyTorch (mock predictions if that's impossible)."""
         if not TORCH_AVAILABLE:
             logger.warning("PyTorch/timm not available. Using mock predictions.")
             return
-
         try:
             self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-            model = _EmotionModel(num_classes=7)
-            checkpoint = torch.load(self.model_path, map_location=self.device)
-
-            if isinstance(checkpoint, dict) and 'model_state_dict' in checkpoint:
-                model.load_state_dict(checkpoint['model_state_dict'])
-            elif isinstance(checkpoint, dict) and 'state_dict' in checkpoint:
-                model.load_state_dict(checkpoint['state_dict'])
-            else:
-                model.load_state_dict(checkpoint)
-
-            model.to(self.device)
-            model.eval()
-            self.model = model
+            self.model = load_emotion_checkpoint(self.model_path, self.device)
             logger.info(f"✅ Loaded PyTorch emotion model on {self.device}")
         except FileNotFoundError:
             logger.warning(f"Model file not found: {self.model_path}. Using mock predictions.")
         except Exception as e:
             logger.error(f"Failed to load model: {e}. Using mock predictions.")
 
+    def _load_torchscript_model(self) -> None:
+        """Load the exported TorchScript artifact."""
+        if not TORCH_AVAILABLE:
+            logger.error("PyTorch not available for the TorchScript runtime")
+            return
+        try:
+            self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+            model = torch.jit.load(self.artifact_path, map_location=self.device)
+            model.eval()
+            self.model = model
+            logger.info(f"✅ Loaded TorchScript emotion model on {self.device}")
+        except Exception as e:
+            logger.error(f"Failed to load TorchScript model {self.artifact_path}: {e}")
+
+    def _load_onnx_model(self) -> None:
+        """Create an ONNX Runtime session for the exported emotion model."""
+        try:
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.onnx_threads:
+                options.intra_op_num_threads = self.onnx_threads
+            providers = [p for p in ('CUDAExecutionProvider', 'CPUExecutionProvider')
+                         if p in ort.get_available_providers()]
+            session = ort.InferenceSession(self.artifact_path, sess_options=options, providers=providers)
+            self._onnx_input_name = session.get_inputs()[0].name
+            self.model = session
+            logger.info(f"✅ Loaded ONNX emotion model ({session.get_providers()[0]})")
+        except Exception as e:
+            logger.error(f"Failed to load ONNX model {self.artifact_path}: {e}")
+
+    def _forward(self, batch: Any) -> Any:
+        """Run a preprocessed (N, 3, H, W) float32 batch through the model; returns softmax probabilities."""
+        if self.runtime == 'onnx':
+            logits = self.model.run(None, {self._onnx_input_name: batch})[0]
+            return softmax(logits)
+
+        face_tensor = torch.from_numpy(batch).to(self.device, non_blocking=True)
+        with torch.no_grad():
+            output = self.model(face_tensor)
+            return torch.softmax(output, dim=1).cpu().numpy()
+
     def _downscale_for_detection(self, gray: Any) -> Tuple[Any, float]:
         """Downscale image for faster face detection, return (resized, scale_factor)."""
         h, w = gray.shape[:2]
@@ -152,13 +378,176 @@ class EmotionDetector:
         small = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
         return small, scale
 
-    def detect_face(self, image: Any) -> Tuple[str, Optional[Any], int]:
+    def set_face_backend(self, backend: str) -> str:
+        """
+        Select the face detection backend ('auto', 'dnn' or 'haar').
+        Returns the backend actually in use ('dnn' falls back to 'haar' if the net is missing).
+        """
+        backend = (backend or 'auto').lower()
+        if backend not in self.FACE_BACKENDS:
+            raise ValueError(f"Unknown face detector backend: {backend} (expected one of {self.FACE_BACKENDS})")
+
+        if backend == 'dnn' and self.face_detector is None:
+            logger.warning("DNN face detector requested but not loaded. Using Haar Cascade.")
+        self.use_dnn = backend in ('dnn', 'auto') and self.face_detector is not None
+        self.face_backend = 'dnn' if self.use_dnn else 'haar'
+        logger.info(f"ℹ️ Using {'DNN SSD' if self.use_dnn else 'Haar Cascade'} face detector")
+        return self.face_backend
+
+    def _detect_faces_dnn(self, image: Any) -> List[Tuple[int, int, int, int]]:
+        """Run the res10 SSD detector on a BGR frame; boxes are in full-resolution coords."""
+        if len(image.shape) == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        h, w = image.shape[:2]
+        size = self.DNN_INPUT_SIZE
+        blob = cv2.dnn.blobFromImage(
+            cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA),
+            1.0, (size, size), self.DNN_MEAN
+        )
+        with self._dnn_lock:
+            self.face_detector.setInput(blob)
+            detections = self.face_detector.forward()
+
+        boxes = []
+        for i in range(detections.shape[2]):
+            confidence = float(detections[0, 0, i, 2])
+            if confidence < self.dnn_confidence:
+                continue
+            x0 = int(max(0.0, detections[0, 0, i, 3]) * w)
+            y0 = int(max(0.0, detections[0, 0, i, 4]) * h)
+            x1 = int(min(1.0, detections[0, 0, i, 5]) * w)
+            y1 = int(min(1.0, detections[0, 0, i, 6]) * h)
+            if x1 > x0 and y1 > y0:
+                boxes.append((x0, y0, x1 - x0, y1 - y0))
+        return boxes
+
+    def _haar_detect(self, cascade: Any, gray: Any, **params: Any) -> Any:
+        """detectMultiScale, dropping boxes whose level weight is below haar_min_weight."""
+        with self._haar_lock:
+            if self.haar_min_weight <= 0:
+                return cascade.detectMultiScale(gray, **params)
+            faces, _, weights = cascade.detectMultiScale3(gray, outputRejectLevels=True, **params)
+        return [tuple(face) for face, weight in zip(faces, weights) if float(weight) >= self.haar_min_weight]
+
+    def _detect_faces_haar(self, gray: Any) -> List[Tuple[int, int, int, int]]:
+        """Run the cascade chain on a grayscale frame; boxes are in full-resolution coords."""
+        # Downscale for faster detection
+        small_gray, scale = self._downscale_for_detection(gray)
+        min_face = max(20, int(30 * scale))  # scale minSize too
+
+        # Use pre-loaded primary cascade (fast path)
+        faces = self._haar_detect(
+            self._cascade_default, small_gray, scaleFactor=1.1, minNeighbors=3, minSize=(min_face, min_face)
+        )
+
+        # Only try secondary cascade if primary found nothing
+        if len(faces) == 0 and self.haar_fallbacks and self._cascade_alt is not None:
+            faces = self._haar_detect(
+                self._cascade_alt, small_gray, scaleFactor=1.1, minNeighbors=3, minSize=(min_face, min_face)
+            )
+
+        # Last resort: lenient params on primary
+        if len(faces) == 0 and self.haar_fallbacks:
+            min_face_lenient = max(15, int(20 * scale))
+            faces = self._haar_detect(
+                self._cascade_default, small_gray,
+                scaleFactor=1.05, minNeighbors=2, minSize=(min_face_lenient, min_face_lenient)
+            )
+
+        # Scale back to original resolution
+        return [
+            (int(x / scale), int(y / scale), int(w / scale), int(h / scale))
+            for (x, y, w, h) in faces
+        ]
+
+    def _detect_faces_full(self, image: Any, gray: Any) -> List[Tuple[int, int, int, int]]:
+        """Full-frame detection with the selected backend."""
+        if self.use_dnn:
+            return self._detect_faces_dnn(image)
+        return self._detect_faces_haar(gray)
+
+    def _track_face(self, gray: Any, track_key: Any) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Look for the tracked face only inside a padded region around its last box.
+        Returns the new box, or None when a full detection is needed.
+        Uses the size-constrained cascade regardless of backend: it is the cheap check.
+        """
+        now = time.monotonic()
+        with self._track_lock:
+            state = self._tracks.get(track_key)
+            if state is None:
+                return None
+            if (state['frames'] >= self.track_redetect_interval
+                    or now - state['seen_at'] > self.track_max_age):
+                return None
+            x, y, w, h = state['box']
+
+        # Padded search region around the previous box
+        pad_w = int(w * self.track_padding)
+        pad_h = int(h * self.track_padding)
+        x0, y0 = max(0, x - pad_w), max(0, y - pad_h)
+        x1, y1 = min(gray.shape[1], x + w + pad_w), min(gray.shape[0], y + h + pad_h)
+        region = gray[y0:y1, x0:x1]
+        if region.size == 0:
+            return None
+
+        small_region, scale = self._downscale_for_detection(region)
+        # The face barely changes size between frames, so only scan nearby scales
+        min_side = max(15, int(min(w, h) * scale * 0.7))
+        max_side = max(min_side + 1, int(max(w, h) * scale * 1.4))
+        with self._haar_lock:
+            faces = self._cascade_default.detectMultiScale(
+                small_region, scaleFactor=1.1, minNeighbors=3,
+                minSize=(min_side, min_side), maxSize=(max_side, max_side)
+            )
+        if len(faces) != 1:
+            return None
+
+        fx, fy, fw, fh = faces[0]
+        return (
+            x0 + int(fx / scale), y0 + int(fy / scale),
+            int(fw / scale), int(fh / scale)
+        )
+
+    def _remember_face(self, track_key: Any, box: Tuple[int, int, int, int], full_detection: bool) -> None:
+        with self._track_lock:
+            state = self._tracks.pop(track_key, None)
+            frames = 0 if full_detection or state is None else state['frames'] + 1
+            self._tracks[track_key] = {'box': box, 'frames': frames, 'seen_at': time.monotonic()}
+            while len(self._tracks) > self.track_max_entries:
+                self._tracks.popitem(last=False)
+
+    def reset_tracking(self, track_key: Any) -> None:
+        """Forget the tracked face and sampled frames for one user (e.g. when recording stops)."""
+        with self._track_lock:
+            self._tracks.pop(track_key, None)
+        if self.frame_sampler is not None:
+            self.frame_sampler.reset(track_key)
+
+    def tracking_stats(self) -> Dict[str, Any]:
+        """Face tracking counters for monitoring."""
+        with self._track_lock:
+            tracked = len(self._tracks)
+            hits, misses = self._track_hits, self._track_misses
+        total = hits + misses
+        return {
+            "enabled": self.face_tracking,
+            "tracked_users": tracked,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+        }
+
+    def detect_face(self, image: Any, track_key: Any = None) -> Tuple[str, Optional[Any], int]:
         """
         Detect faces in an image using OpenCV.
         Returns: (status, face_roi, face_count)
         - status: 'single_face', 'multiple_faces', 'no_face', 'error'
         - face_roi: The face region of interest (only if single face)
         - face_count: Number of faces detected
+        When track_key is given (and tracking is enabled) the last face box for that key
+        is reused to search a small region first; extra people entering the frame are
+        picked up at the next full detection.
         """
         if not CV2_AVAILABLE or image is None:
             logger.warning("OpenCV not available or image is None. Skipping face detection.")
@@ -171,54 +560,41 @@ class EmotionDetector:
             else:
                 gray = image
 
-            # Downscale for faster detection
-            small_gray, scale = self._downscale_for_detection(gray)
-            min_face = max(20, int(30 * scale))  # scale minSize too
-
-            # Use pre-loaded primary cascade (fast path)
-            faces = self._cascade_default.detectMultiScale(
-                small_gray, scaleFactor=1.1, minNeighbors=3, minSize=(min_face, min_face)
-            )
+            tracking = self.face_tracking and track_key is not None
+            box = self._track_face(gray, track_key) if tracking else None
+            if tracking:
+                # detect_face runs on many request threads at once
+                with self._track_lock:
+                    if box is not None:
+                        self._track_hits += 1
+                    else:
+                        self._track_misses += 1
+            faces = [box] if box is not None else self._detect_faces_full(image, gray)
             face_count = len(faces)
 
-            # Only try secondary cascade if primary found nothing
-            if face_count == 0 and self._cascade_alt is not None:
-                faces = self._cascade_alt.detectMultiScale(
-                    small_gray, scaleFactor=1.1, minNeighbors=3, minSize=(min_face, min_face)
-                )
-                face_count = len(faces)
-
-            # Last resort: lenient params on primary
-            if face_count == 0:
-                min_face_lenient = max(15, int(20 * scale))
-                faces = self._cascade_default.detectMultiScale(
-                    small_gray, scaleFactor=1.05, minNeighbors=2, minSize=(min_face_lenient, min_face_lenient)
-                )
-                face_count = len(faces)
-
             # Check for multiple faces FIRST - this is the priority
             if face_count > 1:
+                if tracking:
+                    self.reset_tracking(track_key)
                 logger.warning(f"⚠️ MULTIPLE FACES DETECTED: {face_count} people in frame!")
                 return 'multiple_faces', None, face_count
             
-            # Single face found - map coordinates back to original image
+            # Single face found
             if face_count == 1:
                 x, y, w, h = faces[0]
-                # Scale back to original resolution for ROI extraction
-                if scale != 1.0:
-                    x = int(x / scale)
-                    y = int(y / scale)
-                    w = int(w / scale)
-                    h = int(h / scale)
                 # Clip to image bounds
                 x = max(0, x)
                 y = max(0, y)
                 w = min(w, gray.shape[1] - x)
                 h = min(h, gray.shape[0] - y)
+                if tracking:
+                    self._remember_face(track_key, (x, y, w, h), full_detection=box is None)
                 face_roi = gray[y:y+h, x:x+w]
                 logger.debug(f"Single face detected: {w}x{h} at ({x},{y})")
                 return 'single_face', face_roi, 1
             
+            if tracking:
+                self.reset_tracking(track_key)
             logger.debug("No face detected in frame")
             return 'no_face', None, 0
 
@@ -226,47 +602,56 @@ class EmotionDetector:
             logger.error(f"Face detection error: {e}")
             return 'error', None, 0
 
-    def predict_emotion(self, face_image: Any) -> Dict[str, Any]:
-        """Predict emotion from a grayscale face image using PyTorch model."""
-        if self.model is None:
-            return self._mock_prediction()
+    def _get_preprocessor(self) -> FacePreprocessor:
+        """This thread's FacePreprocessor, rebuilt if the input size changed."""
+        preprocessor = getattr(self._preprocessors, 'instance', None)
+        if preprocessor is None or preprocessor.input_size != self.input_size:
+            pin = self.device is not None and self.device.type == 'cuda'
+            preprocessor = FacePreprocessor(self.input_size, pin_memory=pin)
+            self._preprocessors.instance = preprocessor
+        return preprocessor
 
-        try:
-            # Convert grayscale to RGB
-            if len(face_image.shape) == 2:
-                face_rgb = cv2.cvtColor(face_image, cv2.COLOR_GRAY2RGB)
-            else:
-                face_rgb = face_image
+    def preprocess_faces(self, face_images: List[Any]) -> Any:
+        """Preprocess face crops into one (N, 3, H, W) float32 model input batch (an owned copy)."""
+        return self._get_preprocessor().fill(face_images).copy()
 
-            # Resize to EfficientNet-B4 input size
-            face_resized = cv2.resize(face_rgb, (380, 380))
-            face_normalized = face_resized.astype(np.float32) / 255.0
-            # ImageNet normalization
-            mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
-            std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
-            face_normalized = (face_normalized - mean) / std
-            # HWC -> CHW, add batch dim
-            face_tensor = torch.from_numpy(face_normalized.transpose(2, 0, 1)).unsqueeze(0).to(self.device)
+    def _prediction_from_probs(self, predictions: Any) -> Dict[str, Any]:
+        """Build the emotion result dict from one row of softmax probabilities."""
+        emotion_idx = int(np.argmax(predictions))
+        emotion = self.emotions[emotion_idx]
+        intensity = float(predictions[emotion_idx])
 
-            with torch.no_grad():
-                output = self.model(face_tensor)
-                predictions = torch.softmax(output, dim=1)[0].cpu().numpy()
+        probabilities = {self.emotions[i]: float(predictions[i]) for i in range(len(self.emotions))}
 
-            emotion_idx = int(np.argmax(predictions))
-            emotion = self.emotions[emotion_idx]
-            intensity = float(predictions[emotion_idx])
+        return {
+            'emotion': emotion,
+            'intensity': intensity,
+            'probabilities': probabilities
+        }
 
-            probabilities = {self.emotions[i]: float(predictions[i]) for i in range(len(self.emotions))}
+    def predict_emotion(self, face_image: Any) -> Dict[str, Any]:
+        """Predict emotion from a grayscale face image using the loaded model."""
+        return self.predict_emotion_batch([face_image])[0]
 
-            return {
-                'emotion': emotion,
-                'intensity': intensity,
-                'probabilities': probabilities
-            }
+    def predict_emotion_batch(self, face_images: List[Any]) -> List[Dict[str, Any]]:
+        """
+        Predict emotions for several face crops with a single forward pass.
+        Returns one result dict per input, in the same order.
+        """
+        if not face_images:
+            return []
+        if self.model is None:
+            return [self._mock_prediction() for _ in face_images]
+
+        try:
+            # Borrowed view of this thread's buffer; consumed by _forward before reuse
+            batch = self._get_preprocessor().fill(face_images)
+            predictions = self._forward(batch)
+            return [self._prediction_from_probs(row) for row in predictions]
 
         except Exception as e:
             logger.error(f"Emotion prediction error: {e}")
-            return self._fallback_prediction()
+            return [self._fallback_prediction() for _ in face_images]
 
     def _fallback_prediction(self) -> Dict[str, Any]:
         """Return a neutral fallback prediction when model is unavailable."""
@@ -281,77 +666,114 @@ class EmotionDetector:
         return self._fallback_prediction()
         
 
-    def process_frame(self, frame_bytes: bytes) -> Dict[str, Any]:
-        """Process a single video frame (bytes) and return emotion analysis."""
+    def prepare_frame(self, frame_bytes: bytes, track_key: Any = None) -> Tuple[Optional[Dict[str, Any]], Optional[Any]]:
+        """
+        Decode a frame and run face detection (everything before the model).
+        track_key (usually the user id) enables face tracking across that user's frames.
+        Returns: (response, face_roi)
+        - response: final result dict when there is nothing to predict (no face, errors)
+        - face_roi: the single face crop to feed to the emotion model
+        """
         if not CV2_AVAILABLE:
             return {
                 'success': False,
                 'error': 'OpenCV not installed',
                 'emotion': 'unknown',
                 'intensity': 0.0
-            }
+            }, None
 
-        try:
-            nparr = np.frombuffer(frame_bytes, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if image is None:
-                logger.error("Failed to decode image from bytes")
-                return {
-                    'success': False,
-                    'error': 'Failed to decode image',
-                    'emotion': 'unknown',
-                    'intensity': 0.0
-                }
-            
-            logger.debug(f"📷 Processing frame: {image.shape}")
+        nparr = np.frombuffer(frame_bytes, np.uint8)
+        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        
+        if image is None:
+            logger.error("Failed to decode image from bytes")
+            return {
+                'success': False,
+                'error': 'Failed to decode image',
+                'emotion': 'unknown',
+                'intensity': 0.0
+            }, None
+        
+        logger.debug(f"📷 Processing frame: {image.shape}")
 
-            status, face_roi, face_count = self.detect_face(image)
-            
-            # Handle multiple faces - stop detection and return error
-            if status == 'multiple_faces':
-                logger.warning(f"⚠️ Multiple people detected ({face_count}). Stopping emotion detection.")
-                return {
-                    'success': False,
-                    'error': 'multiple_faces',
-                    'error_message': f'Multiple people detected ({face_count}). Please ensure only one person is in the frame.',
-                    'emotion': 'error',
-                    'intensity': 0.0,
-                    'face_detected': True,
-                    'face_count': face_count,
-                    'stop_detection': True  # Signal frontend to stop and show popup
-                }
-            
-            if status == 'no_face':
-                logger.warning("⚠️ No face detected in frame")
-                # Return clear "no face" response - don't guess!
-                return {
-                    'success': True,
-                    'error': 'No face detected',
-                    'emotion': 'no_face',
-                    'intensity': 0.0,
-                    'face_detected': False,
-                    'face_count': 0
-                }
-            
-            if status == 'error':
-                return {
-                    'success': False,
-                    'error': 'Face detection error',
-                    'emotion': 'unknown',
-                    'intensity': 0.0,
-                    'face_detected': False
-                }
-
-            # Single face detected - proceed with emotion prediction
-            result = self.predict_emotion(face_roi)
-            result.update({
-                'success': True, 
+        status, face_roi, face_count = self.detect_face(image, track_key=track_key)
+        
+        # Handle multiple faces - stop detection and return error
+        if status == 'multiple_faces':
+            logger.warning(f"⚠️ Multiple people detected ({face_count}). Stopping emotion detection.")
+            return {
+                'success': False,
+                'error': 'multiple_faces',
+                'error_message': f'Multiple people detected ({face_count}). Please ensure only one person is in the frame.',
+                'emotion': 'error',
+                'intensity': 0.0,
                 'face_detected': True,
-                'face_count': 1
-            })
-            logger.info(f"✅ Emotion detected: {result['emotion']} ({result['intensity']:.2f})")
-            return result
+                'face_count': face_count,
+                'stop_detection': True  # Signal frontend to stop and show popup
+            }, None
+        
+        if status == 'no_face':
+            logger.warning("⚠️ No face detected in frame")
+            # Return clear "no face" response - don't guess!
+            return {
+                'success': True,
+                'error': 'No face detected',
+                'emotion': 'no_face',
+                'intensity': 0.0,
+                'face_detected': False,
+                'face_count': 0
+            }, None
+        
+        if status == 'error':
+            return {
+                'success': False,
+                'error': 'Face detection error',
+                'emotion': 'unknown',
+                'intensity': 0.0,
+                'face_detected': False
+            }, None
+
+        return None, face_roi
+
+    def finalize_prediction(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Mark a model prediction for a single detected face as a successful frame result."""
+        result.update({
+            'success': True, 
+            'face_detected': True,
+            'face_count': 1
+        })
+        logger.info(f"✅ Emotion detected: {result['emotion']} ({result['intensity']:.2f})")
+        return result
+
+    def sample_frame(self, frame_bytes: bytes, track_key: Any = None) -> Tuple[Optional[Dict[str, Any]], Optional[Any]]:
+        """
+        Check the frame against the last inferred frame for track_key.
+        Returns: (cached_result, signature) - cached_result (marked 'cached': True) when
+        inference can be skipped; pass signature to remember_frame after inferring.
+        """
+        if self.frame_sampler is None or track_key is None:
+            return None, None
+        return self.frame_sampler.sample(track_key, frame_bytes)
+
+    def remember_frame(self, track_key: Any, signature: Optional[Any], result: Dict[str, Any]) -> None:
+        """Store an inferred result as the reference for track_key's next frames."""
+        if self.frame_sampler is not None and track_key is not None:
+            self.frame_sampler.record(track_key, signature, result)
+
+    def process_frame(self, frame_bytes: bytes, track_key: Any = None) -> Dict[str, Any]:
+        """Process a single video frame (bytes) and return emotion analysis."""
+        try:
+            cached, signature = self.sample_frame(frame_bytes, track_key)
+            if cached is not None:
+                return cached
+
+            response, face_roi = self.prepare_frame(frame_bytes, track_key=track_key)
+            if response is None:
+                # Single face detected - proceed with emotion prediction
+                response = self.finalize_prediction(self.predict_emotion(face_roi))
+
+            self.remember_frame(track_key, signature, response)
+            return response
 
         except Exception as e:
             logger.error(f"Frame processing error: {e}")
@@ -364,4 +786,28 @@ class EmotionDetector:
 
 
 # Global instance
-emotion_detector = EmotionDetector()
+emotion_detector = EmotionDetector(
+    model_path=settings.EMOTION_MODEL_PATH or None,
+    runtime=settings.EMOTION_MODEL_RUNTIME,
+    artifact_path=settings.EMOTION_MODEL_ARTIFACT or None,
+    onnx_threads=settings.EMOTION_ONNX_THREADS,
+    input_size=settings.EMOTION_INPUT_SIZE,
+    face_tracking=settings.FACE_TRACKING_ENABLED,
+    track_redetect_interval=settings.FACE_TRACKING_REDETECT_INTERVAL,
+    track_padding=settings.FACE_TRACKING_PADDING,
+    track_max_age_seconds=settings.FACE_TRACKING_MAX_AGE_SECONDS,
+    track_max_entries=settings.FACE_TRACKING_MAX_ENTRIES,
+    face_backend=settings.FACE_DETECTOR_BACKEND,
+    dnn_confidence=settings.FACE_DNN_CONFIDENCE,
+    haar_min_weight=settings.FACE_HAAR_MIN_WEIGHT,
+    haar_fallbacks=settings.FACE_HAAR_FALLBACKS,
+    dnn_proto_path=settings.FACE_DNN_PROTO_PATH or None,
+    dnn_model_path=settings.FACE_DNN_MODEL_PATH or None,
+    frame_sampler=AdaptiveFrameSampler(
+        diff_threshold=settings.FRAME_SAMPLING_DIFF_THRESHOLD,
+        motion_threshold=settings.FRAME_SAMPLING_MOTION_THRESHOLD,
+        stable_frames=settings.FRAME_SAMPLING_STABLE_FRAMES,
+        max_skip=settings.FRAME_SAMPLING_MAX_SKIP,
+        max_age_seconds=settings.FRAME_SAMPLING_MAX_AGE_SECONDS
+    ) if settings.FRAME_SAMPLING_ENABLED else None
+)
@@ -0,0 +1,392 @@
+"""
+Hourly emotion rollups, and the raw emotion_logs retention policy.
+
+emotion_logs grows by one row per analyzed frame, and the admin emotion distribution,
+daily activity and top-user panels only need sample counts and intensity sums per
+emotion. A background compactor folds raw rows into emotion_rollups (one row per
+user, UTC hour and emotion) in id order, remembering the last folded id in
+rollup_watermarks. Readers combine the rollups with the raw "tail" above the
+watermark, so results stay current between compaction runs. (Recommendations read
+the user's last 20 raw logs directly; that window is too short for hourly buckets.)
+
+Raw rows are kept forever by default. When an operator sets EMOTION_RAW_RETENTION_DAYS,
+folded-in raw rows older than that are deleted (appended to daily NDJSON files in
+EMOTION_ARCHIVE_DIR first, if set). Rollups are kept.
+
+Run `python emotion_rollups.py` to compact everything pending once.
+"""
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, literal_column, select, union_all
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import EmotionLog, EmotionRollup, RollupWatermark
+from rollups import upsert_increment
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = "emotion_logs"
+
+EMOTIONS = ('angry', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprise')
+
+
+def _as_utc(dt: datetime) -> datetime:
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def bucket_floor(dt: datetime) -> datetime:
+    """Start of the UTC hour containing dt."""
+    return _as_utc(dt).replace(minute=0, second=0, microsecond=0)
+
+
+def get_watermark(db: Session, lock: bool = False) -> int:
+    """Last emotion_logs id folded into the rollups (0 if nothing yet)."""
+    query = db.query(RollupWatermark).filter(RollupWatermark.name == WATERMARK_NAME)
+    if lock and db.get_bind().dialect.name == 'postgresql':
+        # Serializes compactors running in several API workers
+        query = query.with_for_update()
+    mark = query.first()
+    return mark.last_id if mark is not None else 0
+
+
+def _set_watermark(db: Session, last_id: int) -> None:
+    updated = db.query(RollupWatermark).filter(RollupWatermark.name == WATERMARK_NAME).update(
+        {RollupWatermark.last_id: last_id}, synchronize_session=False
+    )
+    if not updated:
+        db.add(RollupWatermark(name=WATERMARK_NAME, last_id=last_id))
+        db.flush()
+
+
+# ==================== COMPACTION ====================
+
+def compact(db: Session, batch_size: int = 5000, settle_seconds: float = 30.0,
+            now: Optional[datetime] = None) -> int:
+    """
+    Fold the next batch of raw rows above the watermark into the rollups and advance
+    the watermark. Rows younger than settle_seconds are left for a later run so a
+    late-committing insert with a lower id is never skipped. Returns the rows folded
+    in; the caller commits.
+    """
+    now = _as_utc(now or datetime.now(timezone.utc))
+    settled_before = now - timedelta(seconds=settle_seconds)
+    watermark = get_watermark(db, lock=True)
+
+    rows = db.query(
+        EmotionLog.id, EmotionLog.user_id, EmotionLog.username, EmotionLog.is_guest,
+        EmotionLog.emotion, EmotionLog.intensity, EmotionLog.created_at
+    ).filter(EmotionLog.id > watermark).order_by(EmotionLog.id).limit(batch_size).all()
+
+    # (user_id, bucket_start, emotion) -> row dict
+    buckets: Dict[tuple, Dict[str, Any]] = {}
+    last_id = watermark
+    for row in rows:
+        created_at = _as_utc(row.created_at) if row.created_at is not None else now
+        if created_at >= settled_before:
+            break
+        emotion = (row.emotion or 'unknown').lower()[:50]
+        key = (row.user_id, bucket_floor(created_at), emotion)
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = {
+                'user_id': row.user_id, 'username': row.username, 'is_guest': bool(row.is_guest),
+                'bucket_start': key[1], 'emotion': emotion,
+                'sample_count': 0, 'intensity_sum': 0.0,
+            }
+        bucket['sample_count'] += 1
+        bucket['intensity_sum'] += row.intensity or 0.0
+        last_id = row.id
+
+    if last_id == watermark:
+        return 0
+
+    upsert_increment(
+        db, EmotionRollup.__table__, list(buckets.values()),
+        key_columns=['user_id', 'bucket_start', 'emotion'],
+        increment_columns=['sample_count', 'intensity_sum']
+    )
+    _set_watermark(db, last_id)
+    return sum(1 for row in rows if row.id <= last_id)
+
+
+# ==================== RETENTION ====================
+
+def _archive(rows: List[Any], archive_dir: str) -> None:
+    """Append raw rows to one NDJSON file per UTC day."""
+    os.makedirs(archive_dir, exist_ok=True)
+    by_day: Dict[date, List[str]] = defaultdict(list)
+    for row in rows:
+        created_at = _as_utc(row.created_at) if row.created_at is not None else None
+        by_day[created_at.date() if created_at else date.min].append(json.dumps({
+            'id': row.id,
+            'user_id': row.user_id,
+            'username': row.username,
+            'emotion': row.emotion,
+            'intensity': row.intensity,
+            'content_type': row.content_type,
+            'content_confidence': row.content_confidence,
+            'probabilities': row.probabilities,
+            'is_guest': row.is_guest,
+            'created_at': created_at.isoformat() if created_at else None,
+        }))
+    for day, lines in by_day.items():
+        path = os.path.join(archive_dir, f"emotion_logs-{day.isoformat()}.ndjson")
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def apply_retention(db: Session, raw_retention_days: float, archive_dir: str = "",
+                    batch_size: int = 5000, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Delete (or archive, then delete) raw rows past raw_retention_days that are already
+    folded into the rollups. A retention of 0 keeps everything. Commits after every batch.
+    """
+    now = _as_utc(now or datetime.now(timezone.utc))
+    result = {'raw_deleted': 0, 'raw_archived': 0}
+
+    if raw_retention_days > 0:
+        cutoff = now - timedelta(days=raw_retention_days)
+        watermark = get_watermark(db)
+        while True:
+            columns = [EmotionLog.id, EmotionLog.created_at]
+            if archive_dir:
+                columns = [
+                    EmotionLog.id, EmotionLog.user_id, EmotionLog.username, EmotionLog.emotion,
+                    EmotionLog.intensity, EmotionLog.content_type, EmotionLog.content_confidence,
+                    EmotionLog.probabilities, EmotionLog.is_guest, EmotionLog.created_at
+                ]
+            rows = db.query(*columns).filter(
+                EmotionLog.created_at < cutoff,
+                EmotionLog.id <= watermark
+            ).order_by(EmotionLog.id).limit(batch_size).all()
+            if not rows:
+                break
+            if archive_dir:
+                _archive(rows, archive_dir)
+                result['raw_archived'] += len(rows)
+            db.query(EmotionLog).filter(
+                EmotionLog.id.in_([row.id for row in rows])
+            ).delete(synchronize_session=False)
+            db.commit()
+            result['raw_deleted'] += len(rows)
+
+    return result
+
+
+# ==================== READS ====================
+
+def emotion_totals(db: Session, since: Optional[datetime] = None,
+                   user_id: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Per-emotion {'count', 'intensity_sum'} since the start of the UTC hour containing
+    `since` (all time if None), for one user or everyone. Includes raw rows not
+    compacted yet.
+    """
+    watermark = get_watermark(db)
+    totals: Dict[str, Dict[str, float]] = defaultdict(lambda: {'count': 0, 'intensity_sum': 0.0})
+
+    rollup_query = db.query(
+        EmotionRollup.emotion,
+        func.sum(EmotionRollup.sample_count),
+        func.sum(EmotionRollup.intensity_sum)
+    )
+    tail_query = db.query(
+        EmotionLog.emotion,
+        func.count(EmotionLog.id),
+        func.sum(EmotionLog.intensity)
+    ).filter(EmotionLog.id > watermark)
+    if since is not None:
+        # One boundary for both sides, or the tail would cover less than the rollups
+        since = bucket_floor(since)
+        rollup_query = rollup_query.filter(EmotionRollup.bucket_start >= since)
+        tail_query = tail_query.filter(EmotionLog.created_at >= since)
+    if user_id is not None:
+        rollup_query = rollup_query.filter(EmotionRollup.user_id == user_id)
+        tail_query = tail_query.filter(EmotionLog.user_id == user_id)
+
+    for emotion, count, intensity_sum in rollup_query.group_by(EmotionRollup.emotion).all():
+        totals[emotion]['count'] += int(count or 0)
+        totals[emotion]['intensity_sum'] += float(intensity_sum or 0.0)
+    for emotion, count, intensity_sum in tail_query.group_by(EmotionLog.emotion).all():
+        emotion = (emotion or 'unknown').lower()
+        totals[emotion]['count'] += int(count or 0)
+        totals[emotion]['intensity_sum'] += float(intensity_sum or 0.0)
+    return dict(totals)
+
+
+def daily_counts(db: Session, since: datetime) -> Dict[date, int]:
+    """
+    Samples per UTC day since the start of the UTC hour containing `since`, across all
+    users, from the rollups plus the tail.
+    """
+    watermark = get_watermark(db)
+    counts: Dict[date, int] = defaultdict(int)
+    since = bucket_floor(since)
+
+    rows = db.query(
+        EmotionRollup.bucket_start,
+        func.sum(EmotionRollup.sample_count)
+    ).filter(
+        EmotionRollup.bucket_start >= since
+    ).group_by(EmotionRollup.bucket_start).all()
+    for bucket_start, count in rows:
+        counts[_as_utc(bucket_start).date()] += int(count or 0)
+
+    # Tail aggregated in SQL too, so a lagging (or disabled) compactor doesn't pull raw rows
+    created_at = EmotionLog.created_at
+    if db.get_bind().dialect.name == 'postgresql':
+        created_at = func.timezone('UTC', created_at)
+    day_column = func.date(created_at)
+    rows = db.query(day_column, func.count(EmotionLog.id)).filter(
+        EmotionLog.id > watermark,
+        EmotionLog.created_at >= since
+    ).group_by(day_column).all()
+    for day, count in rows:
+        # Postgres returns date objects, SQLite 'YYYY-MM-DD' strings
+        counts[date.fromisoformat(str(day))] += int(count or 0)
+    return dict(counts)
+
+
+def top_users(db: Session, limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    Users with the most samples of all time, as one GROUP BY over the rollups
+    UNION ALL the uncompacted tail. Returns [{'username', 'count'}, ...].
+    """
+    watermark = get_watermark(db)
+    samples = union_all(
+        select(
+            EmotionRollup.username.label('username'),
+            EmotionRollup.sample_count.label('samples')
+        ),
+        select(
+            EmotionLog.username.label('username'),
+            literal_column('1').label('samples')
+        ).where(EmotionLog.id > watermark)
+    ).subquery()
+    total = func.sum(samples.c.samples).label('total')
+    rows = db.execute(
+        select(samples.c.username, total)
+        .group_by(samples.c.username)
+        .order_by(total.desc())
+        .limit(limit)
+    ).all()
+    return [{'username': username, 'count': int(count or 0)} for username, count in rows]
+
+
+# ==================== BACKGROUND JOB ====================
+
+class EmotionRollupCompactor:
+    """Background thread running compaction and retention every interval_seconds."""
+
+    def __init__(self, interval_seconds: float = 60.0, batch_size: int = 5000,
+                 settle_seconds: float = 30.0, raw_retention_days: float = 0.0,
+                 archive_dir: str = "", max_batches_per_run: int = 20):
+        self.interval = max(1.0, float(interval_seconds))
+        self.batch_size = max(1, int(batch_size))
+        self.settle_seconds = max(0.0, float(settle_seconds))
+        self.raw_retention_days = max(0.0, float(raw_retention_days))
+        self.archive_dir = archive_dir
+        self.max_batches_per_run = max(1, int(max_batches_per_run))
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._run_lock = threading.Lock()
+
+        # Stats
+        self._runs = 0
+        self._failed_runs = 0
+        self._compacted_rows = 0
+        self._raw_deleted = 0
+        self._raw_archived = 0
+        self._last_run_at: Optional[datetime] = None
+        self._watermark = 0
+
+    def start(self) -> None:
+        """Start the compaction thread (no-op if already running)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="emotion-rollup-compactor", daemon=True)
+        self._thread.start()
+        logger.info(f"✅ Emotion rollup compactor started (every {self.interval:.0f}s)")
+        if self.raw_retention_days and not self.archive_dir:
+            logger.warning(
+                f"⚠️ Raw emotion logs older than {self.raw_retention_days:g} days will be deleted "
+                f"without an archive (EMOTION_ARCHIVE_DIR is not set)"
+            )
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(30)
+            self._thread = None
+
+    def run_once(self) -> int:
+        """Compact everything pending (up to max_batches_per_run batches), then apply retention."""
+        with self._run_lock:
+            db = SessionLocal()
+            compacted = 0
+            try:
+                for _ in range(self.max_batches_per_run):
+                    count = compact(db, self.batch_size, self.settle_seconds)
+                    db.commit()
+                    compacted += count
+                    if count < self.batch_size:
+                        break
+                self._watermark = get_watermark(db)
+
+                retention = apply_retention(db, self.raw_retention_days, self.archive_dir, self.batch_size)
+                self._raw_deleted += retention['raw_deleted']
+                self._raw_archived += retention['raw_archived']
+            except Exception as e:
+                db.rollback()
+                self._failed_runs += 1
+                logger.error(f"Emotion rollup compaction failed: {e}")
+            finally:
+                db.close()
+
+            self._runs += 1
+            self._compacted_rows += compacted
+            self._last_run_at = datetime.now(timezone.utc)
+            if compacted:
+                logger.debug(f"💾 Compacted {compacted} emotion log(s) into rollups")
+            return compacted
+
+    def stats(self) -> Dict[str, Any]:
+        """Compaction progress and retention counters for monitoring."""
+        return {
+            "runs": self._runs,
+            "failed_runs": self._failed_runs,
+            "compacted_rows": self._compacted_rows,
+            "watermark": self._watermark,
+            "raw_deleted": self._raw_deleted,
+            "raw_archived": self._raw_archived,
+            "last_run_at": self._last_run_at.isoformat() if self._last_run_at else None,
+            "interval_seconds": self.interval,
+            "raw_retention_days": self.raw_retention_days,
+        }
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+
+if __name__ == "__main__":
+    from config import settings
+
+    compactor = EmotionRollupCompactor(
+        batch_size=settings.EMOTION_ROLLUP_BATCH_SIZE,
+        settle_seconds=settings.EMOTION_ROLLUP_SETTLE_SECONDS,
+        raw_retention_days=settings.EMOTION_RAW_RETENTION_DAYS,
+        archive_dir=settings.EMOTION_ARCHIVE_DIR,
+        max_batches_per_run=1000000
+    )
+    count = compactor.run_once()
+    print(f"✅ Compacted {count} emotion log(s); watermark at id {compactor.stats()['watermark']}")
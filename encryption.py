@@ -1,6 +1,8 @@
 from cryptography.fernet import Fernet
 from passlib.context import CryptContext
 from config import settings
+from cache import TTLCache
+from typing import Dict, Iterable, List, Optional
 import base64
 import hashlib
 import logging
@@ -19,6 +21,16 @@ except Exception as e:
     fernet = Fernet(Fernet.generate_key())
     logger.warning("Using auto-generated encryption key")
 
+# Plaintext of recently decrypted fields keyed by ciphertext. Fernet tokens carry a
+# random IV, so re-encrypting a changed field yields a new key and entries never go stale.
+# The plaintext sits in process memory for up to the TTL; set DECRYPT_CACHE_MAX_ENTRIES=0
+# where that is not acceptable (masking it with a key held in the same process wouldn't help).
+decrypted_cache = TTLCache(
+    maxsize=max(1, settings.DECRYPT_CACHE_MAX_ENTRIES),
+    ttl_seconds=settings.DECRYPT_CACHE_TTL_SECONDS,
+    name="decrypted_fields"
+)
+
 
 class EncryptionService:
     
@@ -67,15 +79,45 @@ class EncryptionService:
             raise ValueError("Failed to encrypt data")
     
     @staticmethod
-    def decrypt_data(encrypted_data: str) -> str:
-        """Decrypt encrypted data"""
+    def decrypt_data(encrypted_data: str, cache: bool = True) -> str:
+        """
+        Decrypt encrypted data (served from the plaintext cache when possible).
+        Pass cache=False for one-off secrets that shouldn't linger in memory.
+        """
+        caching = cache and settings.DECRYPT_CACHE_MAX_ENTRIES > 0 and isinstance(encrypted_data, str)
+        if caching:
+            cached = decrypted_cache.get(encrypted_data)
+            if cached is not None:
+                return cached
         try:
             encrypted_bytes = base64.urlsafe_b64decode(encrypted_data.encode())
-            decrypted_bytes = fernet.decrypt(encrypted_bytes)
-            return decrypted_bytes.decode()
+            plaintext = fernet.decrypt(encrypted_bytes).decode()
         except Exception as e:
             logger.debug(f"Decryption error: {e}")
             raise ValueError("Failed to decrypt data")
+        if caching:
+            decrypted_cache.set(encrypted_data, plaintext)
+        return plaintext
+    
+    @staticmethod
+    def decrypt_many(encrypted_values: Iterable[str], fallback: Optional[str] = None) -> List[str]:
+        """
+        Decrypt a column of values (e.g. for a user listing), in order. Repeated
+        ciphertexts are decrypted once. A value that fails to decrypt raises
+        ValueError, or becomes fallback when one is given.
+        """
+        values = list(encrypted_values)
+        plaintexts: Dict[str, str] = {}
+        for token in values:
+            if token in plaintexts:
+                continue
+            try:
+                plaintexts[token] = EncryptionService.decrypt_data(token)
+            except ValueError:
+                if fallback is None:
+                    raise
+                plaintexts[token] = fallback
+        return [plaintexts[token] for token in values]
     
     @staticmethod
     def generate_encryption_key() -> str:
@@ -0,0 +1,103 @@
+"""
+Export the EfficientNet-B4 emotion checkpoint to ONNX or TorchScript for serving.
+The exported graph is checked against eager PyTorch before the command succeeds.
+
+Run:
+    python export_emotion_model.py --checkpoint models/74.pth --format onnx --output models/emotion.onnx
+    python export_emotion_model.py --checkpoint models/74.pth --format torchscript --output models/emotion.pt
+
+Then set EMOTION_MODEL_RUNTIME=onnx (or torchscript) and EMOTION_MODEL_ARTIFACT=<output> in .env.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import torch
+
+from emotion_model import load_emotion_checkpoint, softmax
+
+DEFAULT_INPUT_SIZE = 380
+
+
+def export_onnx(model, output_path, input_size, opset):
+    dummy = torch.randn(1, 3, input_size, input_size)
+    torch.onnx.export(
+        model, dummy, output_path,
+        input_names=["input"], output_names=["logits"],
+        # Spatial axes stay dynamic so EMOTION_INPUT_SIZE can change without re-exporting
+        dynamic_axes={"input": {0: "batch", 2: "height", 3: "width"}, "logits": {0: "batch"}},
+        opset_version=opset,
+        do_constant_folding=True
+    )
+
+
+def export_torchscript(model, output_path, input_size):
+    dummy = torch.randn(1, 3, input_size, input_size)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, dummy)
+        traced = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+    traced.save(output_path)
+
+
+def run_exported(fmt, output_path, batch):
+    """Run a NumPy batch through the exported artifact, returning softmax probabilities."""
+    if fmt == "onnx":
+        import onnxruntime as ort
+        session = ort.InferenceSession(output_path, providers=["CPUExecutionProvider"])
+        logits = session.run(None, {session.get_inputs()[0].name: batch})[0]
+        return softmax(logits)
+
+    scripted = torch.jit.load(output_path, map_location="cpu")
+    with torch.no_grad():
+        return torch.softmax(scripted(torch.from_numpy(batch)), dim=1).numpy()
+
+
+def verify(model, fmt, output_path, input_size, batch_size, atol):
+    """Compare exported vs eager probabilities on random inputs. Returns the max abs difference."""
+    rng = np.random.default_rng(0)
+    batch = rng.standard_normal((batch_size, 3, input_size, input_size)).astype(np.float32)
+
+    with torch.no_grad():
+        expected = torch.softmax(model(torch.from_numpy(batch)), dim=1).numpy()
+    actual = run_exported(fmt, output_path, batch)
+
+    max_diff = float(np.max(np.abs(expected - actual)))
+    same_argmax = bool(np.all(expected.argmax(axis=1) == actual.argmax(axis=1)))
+    print(f"🔍 Max |eager - {fmt}| probability difference: {max_diff:.2e} (tolerance {atol:.0e})")
+    print(f"🔍 Top-1 emotion matches eager: {'✅ Yes' if same_argmax else '❌ No'}")
+    return max_diff if same_argmax else float("inf")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the emotion model to ONNX or TorchScript")
+    parser.add_argument("--checkpoint", required=True, help="Training checkpoint (.pth)")
+    parser.add_argument("--format", choices=["onnx", "torchscript"], default="onnx")
+    parser.add_argument("--output", required=True, help="Output artifact path")
+    parser.add_argument("--input-size", type=int, default=DEFAULT_INPUT_SIZE)
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset version")
+    parser.add_argument("--atol", type=float, default=1e-3, help="Allowed probability difference vs eager")
+    parser.add_argument("--verify-batch", type=int, default=4)
+    args = parser.parse_args()
+
+    model = load_emotion_checkpoint(args.checkpoint, torch.device("cpu"))
+    print(f"✅ Loaded checkpoint {args.checkpoint}")
+
+    output_dir = os.path.dirname(os.path.abspath(args.output))
+    os.makedirs(output_dir, exist_ok=True)
+
+    if args.format == "onnx":
+        export_onnx(model, args.output, args.input_size, args.opset)
+    else:
+        export_torchscript(model, args.output, args.input_size)
+    print(f"📦 Exported {args.format} model to {args.output}")
+
+    max_diff = verify(model, args.format, args.output, args.input_size, args.verify_batch, args.atol)
+    if max_diff > args.atol:
+        print("❌ Exported model does not match eager PyTorch within tolerance")
+        sys.exit(1)
+    print("✅ Export verified")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Adaptive frame sampling for the emotion pipeline.
+
+Cameras send several frames a second while the user mostly sits still, so many
+consecutive frames are near-identical. AdaptiveFrameSampler computes a tiny
+grayscale signature per frame (JPEG decoded at 1/8 scale, shrunk to 16x16) and
+answers with the previous result when the frame has not meaningfully changed.
+Once the predicted emotion has been stable for a while it also skips frames with
+small movements, inferring only every few frames; a large change always triggers
+a fresh inference.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import cv2
+    import numpy as np
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+    cv2 = None
+    np = None
+
+SIGNATURE_SIZE = 16
+
+# Results that must never be reused for later frames
+_UNCACHEABLE_EMOTIONS = ('error', 'unknown')
+
+
+class AdaptiveFrameSampler:
+    """
+    Per-key (usually per-user) duplicate-frame and stable-emotion skipping.
+    - diff_threshold: mean absolute pixel difference (0-255) under which a frame
+      counts as a duplicate of the last inferred one
+    - motion_threshold: larger difference still skippable once the emotion is stable
+    - stable_frames: identical emotions in a row before adaptive skipping starts
+    - max_skip: most frames skipped in a row while stable (inference rate floor)
+    - max_age_seconds: a cached result is never reused after this long
+    """
+
+    def __init__(self, diff_threshold: float = 3.0, motion_threshold: float = 8.0,
+                 stable_frames: int = 5, max_skip: int = 4,
+                 max_age_seconds: float = 5.0, max_keys: int = 1024):
+        self.diff_threshold = float(diff_threshold)
+        self.motion_threshold = max(float(motion_threshold), self.diff_threshold)
+        self.stable_frames = max(1, int(stable_frames))
+        self.max_skip = max(0, int(max_skip))
+        self.max_age_seconds = float(max_age_seconds)
+        self.max_keys = max(1, int(max_keys))
+
+        # key -> {'signature', 'result', 'inferred_at', 'stable', 'skipped'}
+        self._state: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Stats
+        self._frames = 0
+        self._duplicates = 0
+        self._adaptive_skips = 0
+
+    def signature(self, frame_bytes: bytes) -> Optional[Any]:
+        """Cheap 16x16 grayscale thumbnail of an encoded frame (None if undecodable)."""
+        if not CV2_AVAILABLE:
+            return None
+        small = cv2.imdecode(np.frombuffer(frame_bytes, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if small is None:
+            return None
+        return cv2.resize(small, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def lookup(self, key: Any, signature: Optional[Any]) -> Optional[Dict[str, Any]]:
+        """Return the previous result (marked cached) if this frame can skip inference."""
+        with self._lock:
+            self._frames += 1
+            state = self._state.get(key)
+            if state is None or signature is None:
+                return None
+            if time.monotonic() - state['inferred_at'] > self.max_age_seconds:
+                return None
+
+            diff = float(np.mean(np.abs(signature - state['signature'])))
+            if diff <= self.diff_threshold:
+                self._duplicates += 1
+            elif (diff <= self.motion_threshold and
+                  state['stable'] >= self.stable_frames and
+                  state['skipped'] < self._skip_budget(state['stable'])):
+                self._adaptive_skips += 1
+            else:
+                return None
+
+            state['skipped'] += 1
+            self._state.move_to_end(key)
+            result = dict(state['result'])
+
+        result['cached'] = True
+        return result
+
+    def sample(self, key: Any, frame_bytes: bytes) -> Tuple[Optional[Dict[str, Any]], Optional[Any]]:
+        """Signature + lookup in one call. Returns (cached_result_or_None, signature)."""
+        signature = self.signature(frame_bytes)
+        return self.lookup(key, signature), signature
+
+    def record(self, key: Any, signature: Optional[Any], result: Dict[str, Any]) -> None:
+        """Remember a freshly inferred result as the reference for the next frames."""
+        if signature is None:
+            return
+        if not result.get('success') or result.get('emotion') in _UNCACHEABLE_EMOTIONS:
+            self.reset(key)
+            return
+
+        with self._lock:
+            previous = self._state.get(key)
+            stable = 1
+            if previous is not None and previous['result'].get('emotion') == result.get('emotion'):
+                stable = previous['stable'] + 1
+            self._state[key] = {
+                'signature': signature,
+                'result': dict(result),
+                'inferred_at': time.monotonic(),
+                'stable': stable,
+                'skipped': 0,
+            }
+            self._state.move_to_end(key)
+            while len(self._state) > self.max_keys:
+                self._state.popitem(last=False)
+
+    def reset(self, key: Any) -> None:
+        """Forget the sampling state for key (e.g. when its recording stops)."""
+        with self._lock:
+            self._state.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Skip counters for monitoring."""
+        skipped = self._duplicates + self._adaptive_skips
+        return {
+            'frames': self._frames,
+            'duplicate_skips': self._duplicates,
+            'adaptive_skips': self._adaptive_skips,
+            'skip_rate': round(skipped / self._frames, 3) if self._frames else 0.0,
+            'tracked_keys': len(self._state),
+        }
+
+    def _skip_budget(self, stable: int) -> int:
+        # One extra skipped frame per stable inference beyond the threshold, up to max_skip
+        return min(self.max_skip, stable - self.stable_frames + 1)
@@ -0,0 +1,205 @@
+"""
+Inference scheduling for the emotion model.
+
+BatchInferenceScheduler sits in front of EmotionDetector: face crops submitted by
+concurrent /api/analyze/frame requests are collected for a few milliseconds and run
+through the model as one batched tensor, then each caller gets its own result back.
+
+InferenceExecutor keeps frame decoding and face detection off the asyncio event loop
+and caps how many frames can be in flight, so a saturated camera endpoint rejects
+new frames quickly instead of stalling every other request on the worker.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Sentinel pushed onto the queue to stop the worker thread
+_STOP = object()
+
+
+class BatchInferenceScheduler:
+    """
+    Micro-batching scheduler for EmotionDetector.predict_emotion_batch.
+    A single worker thread owns the model; requests wait at most max_wait_ms
+    for other requests to join their batch (up to max_batch_size crops).
+    """
+
+    def __init__(self, detector: Any, max_batch_size: int = 16, max_wait_ms: float = 8.0):
+        self.detector = detector
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # Stats
+        self._batches = 0
+        self._frames = 0
+        self._largest_batch = 0
+
+    def start(self) -> None:
+        """Start the worker thread (no-op if already running)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="emotion-batcher", daemon=True)
+            self._thread.start()
+            logger.info(
+                f"✅ Batch inference scheduler started "
+                f"(max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait * 1000:.1f})"
+            )
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the worker thread after it drains the requests already queued."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def submit(self, face_image: Any) -> Future:
+        """Queue a face crop for prediction and return a Future with its result dict."""
+        if self._thread is None:
+            self.start()
+        future: Future = Future()
+        self._queue.put((face_image, future))
+        return future
+
+    async def predict(self, face_image: Any) -> Dict[str, Any]:
+        """Await the prediction for one face crop without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(face_image))
+
+    def stats(self) -> Dict[str, Any]:
+        """Batching counters for monitoring."""
+        return {
+            "batches": self._batches,
+            "frames": self._frames,
+            "avg_batch_size": round(self._frames / self._batches, 2) if self._batches else 0.0,
+            "largest_batch": self._largest_batch,
+            "queue_depth": self._queue.qsize(),
+        }
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch: List[Tuple[Any, Future]] = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: List[Tuple[Any, Future]]) -> None:
+        # Drop requests whose caller already gave up
+        live = [(face, fut) for face, fut in batch if fut.set_running_or_notify_cancel()]
+        if not live:
+            return
+
+        try:
+            results = self.detector.predict_emotion_batch([face for face, _ in live])
+        except Exception as e:
+            logger.error(f"Batched inference error: {e}")
+            for _, fut in live:
+                fut.set_exception(e)
+            return
+
+        for (_, fut), result in zip(live, results):
+            fut.set_result(result)
+
+        self._batches += 1
+        self._frames += len(live)
+        self._largest_batch = max(self._largest_batch, len(live))
+        logger.debug(f"🧠 Ran batch of {len(live)} face(s)")
+
+
+class InferenceBusyError(RuntimeError):
+    """Raised when the inference queue is full and a frame has to be rejected."""
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool for per-frame CPU work (JPEG decode, face detection, model).
+    OpenCV and PyTorch release the GIL, so threads give real parallelism here while
+    sharing the single loaded model. At most max_workers + max_queue frames are
+    admitted at once; anything beyond that raises InferenceBusyError immediately.
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 32):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.capacity = self.max_workers + self.max_queue
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+        # Stats
+        self._admitted = 0
+        self._rejected = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def is_saturated(self) -> bool:
+        """Cheap pre-check so callers can reject before doing any other work."""
+        return self._in_flight >= self.capacity
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Reserve an in-flight slot for one frame, or raise InferenceBusyError."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise InferenceBusyError(f"Inference queue full ({self.capacity} frames in flight)")
+        with self._lock:
+            self._in_flight += 1
+            self._admitted += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run fn(*args) on the inference pool and await its result."""
+        return await asyncio.wrap_future(self._executor.submit(fn, *args))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Admission counters for monitoring."""
+        return {
+            "workers": self.max_workers,
+            "capacity": self.capacity,
+            "in_flight": self._in_flight,
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+        }
@@ -0,0 +1,211 @@
+"""
+In-memory live state per user (current emotion, content, recording flag).
+
+analyze_frame used to rewrite five columns of the user's `users` row on every frame,
+churning the table that every authenticated request also reads. LiveStateStore keeps
+that state in memory instead, serves it to the dashboard / admin views directly, and
+persists only the users whose state changed to `users` every persist_interval_seconds
+(grouped into one executemany UPDATE per set of changed columns).
+
+The store lives in the API process, so the API must run as a single process (one
+uvicorn worker): with several workers, /api/dashboard/status and
+/api/admin/active-users would only see users whose frames reached the same worker.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, update
+
+from database import SessionLocal
+from models import User
+
+logger = logging.getLogger(__name__)
+
+# State fields mirrored to columns of the users table
+PERSISTED_FIELDS = (
+    'current_emotion', 'current_emotion_intensity', 'current_content',
+    'last_activity', 'is_recording'
+)
+
+
+class LiveStateStore:
+    """Latest per-user state with write-behind persistence to the users table."""
+
+    def __init__(self, persist_interval_seconds: float = 30.0, max_users: int = 10000):
+        self.persist_interval = max(1.0, float(persist_interval_seconds))
+        self.max_users = max(1, int(max_users))
+
+        # user_id -> state dict (PERSISTED_FIELDS + 'is_guest', 'last_emotion_at')
+        self._states: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        # user_id -> fields changed since the last persist (registered users only)
+        self._dirty: Dict[int, set] = {}
+        self._lock = threading.Lock()
+        self._persist_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Stats
+        self._updates = 0
+        self._persisted_rows = 0
+        self._persists = 0
+        self._failed_persists = 0
+
+    def start(self) -> None:
+        """Warm the store from recently active users and start the persist thread."""
+        self.load_recent()
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="live-state-persist", daemon=True)
+        self._thread.start()
+        logger.info(f"✅ Live state store started (persist every {self.persist_interval:.0f}s)")
+
+    def stop(self) -> None:
+        """Stop the persist thread and write out any pending changes."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(10)
+            self._thread = None
+        self.persist()
+
+    def update(self, user_id: int, is_guest: bool = False, **fields: Any) -> None:
+        """Merge new state for a user. Guests are kept in memory only."""
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            state = self._states.get(user_id)
+            if state is None:
+                state = {'user_id': user_id, 'is_guest': is_guest}
+                self._states[user_id] = state
+            state.update(fields)
+            if 'current_emotion' in fields:
+                state['last_emotion_at'] = now
+            self._states.move_to_end(user_id)
+            self._updates += 1
+
+            if not is_guest:
+                self._dirty.setdefault(user_id, set()).update(
+                    f for f in fields if f in PERSISTED_FIELDS
+                )
+            self._evict()
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Copy of a user's live state, or None if the store has not seen them."""
+        with self._lock:
+            state = self._states.get(user_id)
+            return dict(state) if state is not None else None
+
+    def active_since(self, cutoff: datetime, include_guests: bool = False) -> List[Dict[str, Any]]:
+        """States of users whose last_activity is at or after cutoff, most recent first."""
+        with self._lock:
+            states = [
+                dict(s) for s in self._states.values()
+                if s.get('last_activity') is not None and s['last_activity'] >= cutoff
+                and (include_guests or not s.get('is_guest'))
+            ]
+        states.sort(key=lambda s: s['last_activity'], reverse=True)
+        return states
+
+    def load_recent(self, minutes: int = 5) -> int:
+        """Seed state for users active in the last few minutes (e.g. after a restart)."""
+        cutoff = datetime.now(timezone.utc) - timedelta(minutes=minutes)
+        db = SessionLocal()
+        try:
+            rows = db.query(User.id, *[getattr(User, f) for f in PERSISTED_FIELDS]).filter(
+                User.last_activity != None,
+                User.last_activity >= cutoff
+            ).all()
+        except Exception as e:
+            logger.warning(f"Could not load live state: {e}")
+            return 0
+        finally:
+            db.close()
+
+        with self._lock:
+            for row in rows:
+                if row.id in self._states:
+                    continue
+                state = {'user_id': row.id, 'is_guest': False}
+                state.update({f: getattr(row, f) for f in PERSISTED_FIELDS})
+                if state['last_activity'] is not None and state['last_activity'].tzinfo is None:
+                    state['last_activity'] = state['last_activity'].replace(tzinfo=timezone.utc)
+                self._states[row.id] = state
+            self._evict()
+        return len(rows)
+
+    def persist(self) -> int:
+        """Write changed state to the users table. Returns the number of rows updated."""
+        with self._persist_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+                # Group users by which columns changed so each group is one executemany UPDATE
+                groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+                for user_id, fields in dirty.items():
+                    state = self._states.get(user_id)
+                    if state is None or not fields:
+                        continue
+                    columns = tuple(sorted(fields))
+                    params = {f: state.get(f) for f in columns}
+                    params['b_user_id'] = user_id
+                    groups.setdefault(columns, []).append(params)
+
+            if not groups:
+                return 0
+
+            db = SessionLocal()
+            try:
+                for columns, params in groups.items():
+                    stmt = (
+                        update(User.__table__)
+                        .where(User.__table__.c.id == bindparam('b_user_id'))
+                        .values({c: bindparam(c) for c in columns})
+                    )
+                    db.execute(stmt, params)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                self._failed_persists += 1
+                logger.error(f"Live state persist failed: {e}")
+                # Keep the changes for the next attempt (unless newer ones replaced them)
+                with self._lock:
+                    for user_id, fields in dirty.items():
+                        self._dirty.setdefault(user_id, set()).update(fields)
+                return 0
+            finally:
+                db.close()
+
+            written = sum(len(p) for p in groups.values())
+            self._persists += 1
+            self._persisted_rows += written
+            logger.debug(f"💾 Persisted live state for {written} user(s)")
+            return written
+
+    def stats(self) -> Dict[str, Any]:
+        """Store size and persistence counters for monitoring."""
+        return {
+            "users": len(self._states),
+            "dirty_users": len(self._dirty),
+            "updates": self._updates,
+            "persists": self._persists,
+            "persisted_rows": self._persisted_rows,
+            "failed_persists": self._failed_persists,
+            "persist_interval_seconds": self.persist_interval,
+        }
+
+    def _evict(self) -> None:
+        # Oldest clean entries go first; dirty ones wait for their persist
+        excess = len(self._states) - self.max_users
+        if excess <= 0:
+            return
+        for user_id in list(self._states):
+            if excess <= 0:
+                break
+            if user_id not in self._dirty:
+                del self._states[user_id]
+                excess -= 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.persist_interval):
+            self.persist()
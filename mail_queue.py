@@ -0,0 +1,531 @@
+"""
+Outbound email: a persistent spool, background senders and pooled SMTP connections.
+
+EmailService.send_email used to connect, STARTTLS, log in, send and quit inside the
+request handler for every message. Now the handler only writes the message to the
+spool directory (one JSON file per message) and returns. MailQueue's sender threads
+deliver spooled messages over SMTPConnectionPool, which keeps authenticated
+connections open between messages. Failed deliveries are retried with exponential
+backoff; messages that are rejected permanently or run out of attempts are moved
+to spool_dir/failed and purged after failed_retention_hours. Pending messages are
+reloaded from the spool on start, so mail survives restarts.
+
+Several processes (e.g. uvicorn workers) may share one spool directory. A sender
+claims a message by renaming <id>.json to <id>.<claimed at>.sending before delivering
+it; a message whose file is already gone was claimed or delivered elsewhere and is
+dropped. Each queue rescans the spool every scan_interval_seconds to pick up mail
+spooled by other processes, and hands claims older than claim_timeout_seconds
+(their sender died mid-delivery) back to the spool.
+
+Spool files hold recipients and verification / reset codes, so each record is
+Fernet-encrypted with EncryptionService and written owner-only (0600, directory 0700).
+"""
+import heapq
+import json
+import logging
+import os
+import random
+import smtplib
+import ssl
+import threading
+import time
+import uuid
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Dict, List, Optional, Tuple
+
+from encryption import EncryptionService
+
+logger = logging.getLogger(__name__)
+
+CLAIM_SUFFIX = ".sending"
+
+
+def build_message(sender: str, to_email: str, subject: str, html_body: str) -> MIMEMultipart:
+    msg = MIMEMultipart('alternative')
+    msg['From'] = sender
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(html_body, 'html'))
+    return msg
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """5xx replies (other than authentication, which is a config problem) won't succeed on retry."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class SMTPConnectionPool:
+    """
+    Up to size open, authenticated SMTP connections shared by the sender threads.
+    Connections are reused until they have been idle for max_idle_seconds or have
+    sent max_messages; a reused connection the server already dropped is replaced
+    transparently.
+    """
+
+    def __init__(self, host: str, port: int, username: str = "", password: str = "",
+                 starttls: bool = True, size: int = 2, max_idle_seconds: float = 60.0,
+                 max_messages: int = 100, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.size = max(1, int(size))
+        self.max_idle = max(0.0, float(max_idle_seconds))
+        self.max_messages = max(1, int(max_messages))
+        self.timeout = timeout
+
+        # (connection, last used, messages sent on it)
+        self._idle: List[Tuple[smtplib.SMTP, float, int]] = []
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+
+        # Stats
+        self._opened = 0
+        self._reused = 0
+        self._closed = 0
+
+    def send(self, message: MIMEMultipart) -> None:
+        """Send one message on a pooled connection. SMTP errors propagate."""
+        with self._slots:
+            conn, sent, reused = self._checkout()
+            try:
+                conn.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                self._close(conn)
+                if not reused:
+                    raise
+                # The server timed out the idle connection; retry once on a fresh one
+                conn, sent, _ = self._connect(), 0, False
+                try:
+                    conn.send_message(message)
+                except Exception:
+                    self._close(conn)
+                    raise
+            except smtplib.SMTPRecipientsRefused:
+                # Rejected recipient: the connection itself is still fine
+                self._checkin(conn, sent)
+                raise
+            except Exception:
+                self._close(conn)
+                raise
+            self._checkin(conn, sent + 1)
+
+    def close(self) -> None:
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _, _ in idle:
+            self._close(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "opened": self._opened,
+            "reused": self._reused,
+            "closed": self._closed,
+        }
+
+    def _checkout(self) -> Tuple[smtplib.SMTP, int, bool]:
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used, sent = self._idle.pop()
+            if now - last_used <= self.max_idle:
+                self._reused += 1
+                return conn, sent, True
+            self._close(conn)
+        return self._connect(), 0, False
+
+    def _checkin(self, conn: smtplib.SMTP, sent: int) -> None:
+        if sent >= self.max_messages:
+            self._close(conn)
+            return
+        with self._lock:
+            self._idle.append((conn, time.monotonic(), sent))
+
+    def _connect(self) -> smtplib.SMTP:
+        conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.ehlo()
+            if self.starttls:
+                conn.starttls(context=ssl.create_default_context())
+                conn.ehlo()
+            if self.username:
+                conn.login(self.username, self.password)
+        except Exception:
+            self._close(conn)
+            raise
+        self._opened += 1
+        return conn
+
+    def _close(self, conn: smtplib.SMTP) -> None:
+        try:
+            conn.quit()
+        except Exception:
+            conn.close()
+        self._closed += 1
+
+
+class MailQueue:
+    """Spool-backed outbound queue drained by background sender threads."""
+
+    def __init__(self, pool: SMTPConnectionPool, spool_dir: str, sender: str,
+                 workers: int = 2, max_attempts: int = 6,
+                 retry_base_seconds: float = 5.0, retry_max_seconds: float = 600.0,
+                 failed_retention_hours: float = 24.0, scan_interval_seconds: float = 60.0,
+                 claim_timeout_seconds: float = 900.0):
+        self.pool = pool
+        self.spool_dir = spool_dir
+        self.failed_dir = os.path.join(spool_dir, "failed")
+        self.sender = sender
+        self.workers = max(1, int(workers))
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_base = max(0.0, float(retry_base_seconds))
+        self.retry_max = max(self.retry_base, float(retry_max_seconds))
+        self.failed_retention = max(0.0, float(failed_retention_hours)) * 3600
+        self.scan_interval = max(1.0, float(scan_interval_seconds))
+        self.claim_timeout = max(pool.timeout * 4, float(claim_timeout_seconds))
+        self._next_scan = 0.0
+
+        # message id -> spooled record; heap of (due at, message id)
+        self._messages: Dict[str, Dict[str, Any]] = {}
+        self._due: List[Tuple[float, str]] = []
+        self._sending = 0
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+
+        # Stats
+        self._enqueued = 0
+        self._sent = 0
+        self._retries = 0
+        self._failed = 0
+        self._purged = 0
+        self._claimed_elsewhere = 0
+        self._recovered = 0
+        self._errors = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def start(self) -> None:
+        """Reload the spool and start the sender threads (no-op if already running)."""
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+        os.makedirs(self.failed_dir, mode=0o700, exist_ok=True)
+        self.purge_failed()
+        self.recover_abandoned()
+        restored = self._load_spool()
+        with self._cond:
+            self._next_scan = time.time() + self.scan_interval
+            self._threads = [
+                threading.Thread(target=self._run, name=f"mail-sender-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+        logger.info(f"✅ Mail queue started (workers={self.workers}, spool={self.spool_dir}, restored={restored})")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the senders after their current message; unsent mail stays in the spool."""
+        with self._cond:
+            threads, self._threads = self._threads, []
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in threads:
+            thread.join(timeout)
+        self.pool.close()
+
+    def enqueue(self, to_email: str, subject: str, html_body: str) -> str:
+        """Spool one message for delivery and return its id."""
+        message_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        record = {
+            "id": message_id,
+            "to": to_email,
+            "subject": subject,
+            "html": html_body,
+            "attempts": 0,
+            "next_attempt_at": time.time(),
+            "last_error": None,
+        }
+        self._write(record, self._path(message_id))
+        with self._cond:
+            self._messages[message_id] = record
+            heapq.heappush(self._due, (record["next_attempt_at"], message_id))
+            self._enqueued += 1
+            self._cond.notify()
+        return message_id
+
+    def purge_failed(self) -> int:
+        """Delete undeliverable messages older than failed_retention_hours. Returns files removed."""
+        if not os.path.isdir(self.failed_dir):
+            return 0
+        cutoff = time.time() - self.failed_retention
+        purged = 0
+        for name in os.listdir(self.failed_dir):
+            path = os.path.join(self.failed_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    purged += 1
+            except FileNotFoundError:
+                continue
+        if purged:
+            self._purged += purged
+            logger.info(f"🗑️ Purged {purged} undeliverable email(s) from {self.failed_dir}")
+        return purged
+
+    def recover_abandoned(self) -> int:
+        """Return claims older than claim_timeout_seconds to the spool and drop stale temp files."""
+        now = time.time()
+        recovered = 0
+        for name in os.listdir(self.spool_dir):
+            path = os.path.join(self.spool_dir, name)
+            try:
+                if name.endswith(CLAIM_SUFFIX):
+                    message_id, claimed_at = name[:-len(CLAIM_SUFFIX)].rsplit(".", 1)
+                    if now - int(claimed_at) < self.claim_timeout:
+                        continue
+                    logger.warning(f"⚠️ Email {message_id} was claimed {now - int(claimed_at):.0f}s ago "
+                                   f"and never finished, returning it to the spool")
+                    os.replace(path, self._path(message_id))
+                    recovered += 1
+                elif name.endswith(".tmp") and now - os.path.getmtime(path) >= self.claim_timeout:
+                    os.remove(path)
+            except FileNotFoundError:
+                continue
+            except ValueError:
+                logger.error(f"Unrecognised spool file {name}, moving to failed/")
+                os.replace(path, os.path.join(self.failed_dir, name))
+        self._recovered += recovered
+        return recovered
+
+    def wait_until_empty(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued message has been sent or failed (for tests and benchmarks)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._messages:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "pending": len(self._messages),
+            "sending": self._sending,
+            "enqueued": self._enqueued,
+            "sent": self._sent,
+            "retries": self._retries,
+            "failed": self._failed,
+            "purged": self._purged,
+            "claimed_elsewhere": self._claimed_elsewhere,
+            "recovered": self._recovered,
+            "errors": self._errors,
+            "smtp_pool": self.pool.stats(),
+        }
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    now = time.time()
+                    if self._due and self._due[0][0] <= now or now >= self._next_scan:
+                        break
+                    wake_at = min(self._due[0][0], self._next_scan) if self._due else self._next_scan
+                    self._cond.wait(wake_at - now)
+                if self._stopping:
+                    return
+                record = None
+                if time.time() >= self._next_scan:
+                    # This thread does the scan; the others keep sending
+                    self._next_scan = time.time() + self.scan_interval
+                else:
+                    _, message_id = heapq.heappop(self._due)
+                    record = self._messages.get(message_id)
+                    if record is None:
+                        continue
+                    self._sending += 1
+            if record is None:
+                try:
+                    self.purge_failed()
+                    self.recover_abandoned()
+                    self._load_spool()
+                except Exception as e:
+                    logger.exception(f"Mail spool scan failed: {e}")
+                continue
+            try:
+                self._deliver(record)
+            except Exception as e:
+                # Spool I/O error (disk full, permissions...): keep the thread alive and try again later
+                logger.exception(f"❌ Error handling email {record['id']}: {e}")
+                with self._cond:
+                    self._errors += 1
+                    if record["id"] in self._messages:
+                        heapq.heappush(self._due, (time.time() + max(1.0, self.retry_base), record["id"]))
+            finally:
+                with self._cond:
+                    self._sending -= 1
+                    self._cond.notify_all()
+
+    def _deliver(self, record: Dict[str, Any]) -> None:
+        message_id = record["id"]
+        claimed = self._claim(message_id)
+        if claimed is None:
+            self._forget(message_id, claimed_elsewhere=True)
+            return
+        try:
+            try:
+                # The spool file is authoritative: another process may have retried it since we loaded it
+                record, _ = self._read(claimed)
+            except ValueError as e:
+                logger.error(f"Unreadable spooled email {message_id}, moving to failed/: {e}")
+                os.replace(claimed, os.path.join(self.failed_dir, os.path.basename(self._path(message_id))))
+                self._forget(message_id)
+                return
+            if record["next_attempt_at"] > time.time():
+                os.replace(claimed, self._path(message_id))
+                self._schedule(record)
+                return
+            self._send(record, claimed)
+        except FileNotFoundError:
+            # Our claim outlived claim_timeout and was handed to another sender
+            logger.warning(f"⚠️ Claim on email {message_id} was taken over, leaving it to the other sender")
+            self._forget(message_id, claimed_elsewhere=True)
+        except Exception:
+            # Hand the claim back so this (or another) sender can retry it
+            try:
+                os.replace(claimed, self._path(message_id))
+            except OSError:
+                pass
+            raise
+
+    def _send(self, record: Dict[str, Any], claimed: str) -> None:
+        record["attempts"] += 1
+        try:
+            self.pool.send(build_message(self.sender, record["to"], record["subject"], record["html"]))
+        except Exception as e:
+            record["last_error"] = f"{type(e).__name__}: {e}"
+            if is_permanent_failure(e) or record["attempts"] >= self.max_attempts:
+                logger.error(f"❌ Giving up on email to {record['to']} after {record['attempts']} attempt(s): {e}")
+                self._write(record, claimed)
+                os.replace(claimed, os.path.join(self.failed_dir, os.path.basename(self._path(record["id"]))))
+                self._forget(record["id"], failed=True)
+                return
+            delay = min(self.retry_max, self.retry_base * 2 ** (record["attempts"] - 1))
+            record["next_attempt_at"] = time.time() + delay * random.uniform(0.8, 1.2)
+            logger.warning(f"⚠️ Email to {record['to']} failed (attempt {record['attempts']}), retrying in {delay:.0f}s: {e}")
+            self._write(record, claimed)
+            os.replace(claimed, self._path(record["id"]))
+            with self._cond:
+                self._retries += 1
+            self._schedule(record)
+            return
+        logger.info(f"Email sent to {record['to']}")
+        os.remove(claimed)
+        self._forget(record["id"], sent=True)
+
+    def _claim(self, message_id: str) -> Optional[str]:
+        """Atomically take a spooled message for delivery; None if it's already gone."""
+        claimed = os.path.join(self.spool_dir, f"{message_id}.{int(time.time())}{CLAIM_SUFFIX}")
+        try:
+            os.rename(self._path(message_id), claimed)
+        except FileNotFoundError:
+            return None
+        return claimed
+
+    def _schedule(self, record: Dict[str, Any]) -> None:
+        with self._cond:
+            self._messages[record["id"]] = record
+            heapq.heappush(self._due, (record["next_attempt_at"], record["id"]))
+            self._cond.notify()
+
+    def _forget(self, message_id: str, sent: bool = False, failed: bool = False,
+                claimed_elsewhere: bool = False) -> None:
+        with self._cond:
+            self._messages.pop(message_id, None)
+            self._sent += sent
+            self._failed += failed
+            self._claimed_elsewhere += claimed_elsewhere
+            self._cond.notify_all()
+
+    def _load_spool(self) -> int:
+        """Queue spooled messages this process doesn't know about yet. Returns how many."""
+        restored = 0
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not name.endswith(".json"):
+                continue
+            message_id = name[:-len(".json")]
+            with self._cond:
+                if message_id in self._messages:
+                    continue
+            path = os.path.join(self.spool_dir, name)
+            try:
+                record, plaintext = self._read(path)
+            except FileNotFoundError:
+                continue  # claimed by another sender meanwhile
+            except (OSError, ValueError) as e:
+                # Includes files encrypted under a different ENCRYPTION_KEY
+                logger.error(f"Unreadable spooled email {name}, moving to failed/: {e}")
+                try:
+                    os.replace(path, os.path.join(self.failed_dir, name))
+                except FileNotFoundError:
+                    pass
+                continue
+            if plaintext:
+                self._reencrypt(record)
+            with self._cond:
+                if message_id in self._messages:
+                    continue
+                self._messages[message_id] = record
+                heapq.heappush(self._due, (record["next_attempt_at"], message_id))
+                self._cond.notify()
+            restored += 1
+        return restored
+
+    def _reencrypt(self, record: Dict[str, Any]) -> None:
+        """Rewrite a plaintext spool file from an older version encrypted (under a claim)."""
+        claimed = self._claim(record["id"])
+        if claimed is None:
+            return
+        self._write(record, claimed)
+        os.replace(claimed, self._path(record["id"]))
+
+    def _path(self, message_id: str) -> str:
+        return os.path.join(self.spool_dir, f"{message_id}.json")
+
+    @staticmethod
+    def _read(path: str) -> Tuple[Dict[str, Any], bool]:
+        """Load a spool file; also returns whether it was a plaintext file from an older version."""
+        with open(path, encoding="utf-8") as f:
+            data = f.read()
+        if data.lstrip().startswith("{"):
+            return json.loads(data), True
+        # Not cached: spool records carry reset codes
+        return json.loads(EncryptionService.decrypt_data(data, cache=False)), False
+
+    def _write(self, record: Dict[str, Any], path: str) -> None:
+        """Atomically (re)write an encrypted spool file, fsynced so it survives a crash."""
+        os.makedirs(self.spool_dir, mode=0o700, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(EncryptionService.encrypt_data(json.dumps(record)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
@@ -1,13 +1,18 @@
-from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile, Request
+from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
+import asyncio
+import time
 import uuid
 import random
 import json
 import logging
+import os
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
-from database import engine, get_db, Base
+from database import engine, get_db, Base, SessionLocal
 from models import User, EmotionLog, AnalysisSession, AuditLog, ContentSession
 from schemas import (
     UserSignup, UserLogin, UserResponse, 
@@ -17,11 +22,22 @@ from schemas import (
     InitiateSignupResponse, VerifySignupRequest,
     UpdateProfileRequest, VerifyProfileUpdateRequest, ChangePasswordRequest
 )
-from encryption import EncryptionService
-from auth import create_access_token, get_current_user
+from encryption import EncryptionService, decrypted_cache
+from auth import create_access_token, get_current_user, get_user_from_token, invalidate_user, token_expires_at, user_cache
 from config import settings
-from email_service import EmailService
+from email_service import EmailService, outbound_mail
 from emotion_model import emotion_detector
+from inference import BatchInferenceScheduler, InferenceExecutor, InferenceBusyError
+from password_hashing import PasswordHashPool, PasswordHashBusyError, ConcurrencyLimiter
+from write_behind import AuditLogWriter, EmotionLogWriter
+from live_state import LiveStateStore
+import rollups
+import admin_stats
+import dataset_export
+import pagination
+from dashboard_events import DashboardBroadcaster
+from cache import TTLCache
+from emotion_rollups import EmotionRollupCompactor
 from terms_and_conditions import TERMS_AND_CONDITIONS, PRIVACY_POLICY
 from fastapi import Header
 
@@ -154,6 +170,7 @@ def _update_content_session(db: Session, user_id: int, username: str,
             if session_row:
                 session_row.duration_seconds = int((now - prev['started_at']).total_seconds())
                 session_row.ended_at = now
+                rollups.roll_forward(db, session_row)
                 db.flush()
         except Exception as e:
             print(f"⚠️ Session update error: {e}")
@@ -172,6 +189,7 @@ def _update_content_session(db: Session, user_id: int, username: str,
                 old_session.is_active = False
                 old_session.ended_at = now
                 old_session.duration_seconds = int((now - prev['started_at']).total_seconds())
+                rollups.roll_forward(db, old_session)
                 db.flush()
                 print(f"⏱️ Session ended: {prev['content_type']}/{prev['activity']} — {old_session.duration_seconds}s")
         except Exception as e:
@@ -197,6 +215,7 @@ def _update_content_session(db: Session, user_id: int, username: str,
         )
         db.add(new_session)
         db.flush()  # get new_session.id
+        rollups.record_session_start(db, new_session)
 
         active_content_sessions[session_key] = {
             'session_id': new_session.id,
@@ -238,6 +257,154 @@ pending_profile_updates = {}
 # Create tables
 Base.metadata.create_all(bind=engine)
 
+# Bounded pool that keeps decode/detection/inference off the event loop
+inference_executor = InferenceExecutor(
+    max_workers=settings.INFERENCE_WORKERS,
+    max_queue=settings.INFERENCE_MAX_QUEUE
+)
+
+# Batches face crops from concurrent frame requests into one forward pass
+inference_scheduler = BatchInferenceScheduler(
+    emotion_detector,
+    max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=settings.INFERENCE_MAX_WAIT_MS
+)
+
+INFERENCE_BUSY_DETAIL = "Emotion analysis is busy, please retry shortly"
+
+# Argon2 runs in its own process pool so login bursts can't starve frame ingestion
+password_hasher = PasswordHashPool(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE
+)
+password_ip_limiter = ConcurrencyLimiter(settings.PASSWORD_MAX_CONCURRENT_PER_IP, name="ip")
+password_account_limiter = ConcurrencyLimiter(settings.PASSWORD_MAX_CONCURRENT_PER_ACCOUNT, name="account")
+
+
+@contextmanager
+def _password_slot(request: Request, account_key: str):
+    """Per-IP and per-account in-flight limits for password hashing (429 beyond them)."""
+    ip = request.client.host if request.client else "unknown"
+    with password_ip_limiter.hold(ip) as ip_ok, password_account_limiter.hold(account_key) as account_ok:
+        if not (ip_ok and account_ok):
+            print(f"⚠️ Concurrent password attempt limit hit (ip={ip})")
+            raise HTTPException(status_code=429, detail="Too many concurrent attempts, please retry shortly",
+                                headers={"Retry-After": "1"})
+        yield
+
+
+def _hash_password(password: str) -> str:
+    try:
+        return password_hasher.hash(password)
+    except PasswordHashBusyError:
+        raise HTTPException(status_code=503, detail="Server is busy, please retry shortly", headers={"Retry-After": "1"})
+
+
+def _verify_password(password: str, hashed_password: str) -> bool:
+    try:
+        return password_hasher.verify(password, hashed_password)
+    except PasswordHashBusyError:
+        raise HTTPException(status_code=503, detail="Server is busy, please retry shortly", headers={"Retry-After": "1"})
+
+
+# Batches EmotionLog inserts off the request path (file fallback while the DB is down)
+emotion_log_writer = EmotionLogWriter(
+    fallback_path=settings.EMOTION_LOG_FALLBACK_PATH,
+    max_batch_rows=settings.EMOTION_LOG_FLUSH_ROWS,
+    flush_interval_ms=settings.EMOTION_LOG_FLUSH_INTERVAL_MS,
+    max_pending=settings.EMOTION_LOG_MAX_PENDING,
+    replay_interval_seconds=settings.EMOTION_LOG_REPLAY_INTERVAL_SECONDS,
+    # Responses cached between a frame and its flush would miss that frame
+    on_written=lambda rows: _invalidate_written_users(rows)
+)
+
+# Batches audit events off the request path (file fallback while the DB is down)
+audit_log_writer = AuditLogWriter(
+    fallback_path=settings.AUDIT_LOG_FALLBACK_PATH,
+    max_batch_rows=settings.AUDIT_LOG_FLUSH_ROWS,
+    flush_interval_ms=settings.AUDIT_LOG_FLUSH_INTERVAL_MS,
+    max_pending=settings.AUDIT_LOG_MAX_PENDING,
+    replay_interval_seconds=settings.AUDIT_LOG_REPLAY_INTERVAL_SECONDS
+)
+
+# Current emotion / content / recording flag per user, persisted to `users` periodically
+# (in-process: run the API as a single uvicorn worker)
+live_state = LiveStateStore(
+    persist_interval_seconds=settings.LIVE_STATE_PERSIST_SECONDS,
+    max_users=settings.LIVE_STATE_MAX_USERS
+)
+
+# Folds emotion_logs into hourly rollups and (if configured) expires old raw rows
+emotion_rollup_compactor = EmotionRollupCompactor(
+    interval_seconds=settings.EMOTION_ROLLUP_INTERVAL_SECONDS,
+    batch_size=settings.EMOTION_ROLLUP_BATCH_SIZE,
+    settle_seconds=settings.EMOTION_ROLLUP_SETTLE_SECONDS,
+    raw_retention_days=settings.EMOTION_RAW_RETENTION_DAYS,
+    archive_dir=settings.EMOTION_ARCHIVE_DIR
+)
+
+# Wakes open /api/dashboard/stream connections when a user's dashboard changes
+dashboard_broadcaster = DashboardBroadcaster()
+
+# Per-user responses of the polled endpoints, keyed (endpoint, user_id); writers invalidate
+user_response_cache = TTLCache(
+    maxsize=settings.USER_RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.USER_RESPONSE_CACHE_TTL_SECONDS,
+    name="user-responses"
+)
+DASHBOARD_CACHE = "dashboard_status"
+ACTIVE_SESSION_CACHE = "content_session_active"
+RECOMMENDATIONS_CACHE = "recommendations"
+
+
+def _invalidate_user_responses(user_id: int, *endpoints: str) -> None:
+    """Drop cached responses for a user (all endpoints if none are given)."""
+    for endpoint in endpoints or (DASHBOARD_CACHE, ACTIVE_SESSION_CACHE, RECOMMENDATIONS_CACHE):
+        user_response_cache.invalidate((endpoint, user_id))
+
+
+def _invalidate_written_users(rows: list) -> None:
+    """emotion_log_writer hook: a batch of EmotionLog rows was just committed."""
+    for user_id in {row["user_id"] for row in rows}:
+        _invalidate_user_responses(user_id)
+
+# Short-lived results of the admin analytics queries
+admin_stats_cache = TTLCache(maxsize=32, ttl_seconds=settings.ADMIN_STATS_CACHE_TTL_SECONDS, name="admin-stats")
+
+
+async def _run_emotion_pipeline(frame_bytes: bytes, user_id: int = None) -> dict:
+    """
+    Decode the frame and detect the face on the inference pool, then predict through
+    the batching scheduler. Raises InferenceBusyError when the pool is saturated.
+    user_id keys the per-user face tracker and frame sampler.
+    """
+    with inference_executor.slot():
+        try:
+            # Unchanged / stable frames reuse the previous result (marked 'cached')
+            cached, signature = await inference_executor.run(emotion_detector.sample_frame, frame_bytes, user_id)
+            if cached is not None:
+                return cached
+
+            response, face_roi = await inference_executor.run(emotion_detector.prepare_frame, frame_bytes, user_id)
+            if response is None:
+                if settings.INFERENCE_BATCHING_ENABLED:
+                    prediction = await inference_scheduler.predict(face_roi)
+                else:
+                    prediction = await inference_executor.run(emotion_detector.predict_emotion, face_roi)
+                response = emotion_detector.finalize_prediction(prediction)
+
+            emotion_detector.remember_frame(user_id, signature, response)
+            return response
+
+        except Exception as e:
+            logger.error(f"Frame processing error: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'emotion': 'neutral',
+                'intensity': 0.5
+            }
+
 
 def log_audit_event(
     db: Session,
@@ -249,7 +416,15 @@ def log_audit_event(
     user_agent: str = None,
     status: str = "success"
 ):
-    """Helper function to log audit events"""
+    """
+    Helper function to log audit events. With AUDIT_LOG_WRITE_BEHIND the event is
+    queued for the audit writer and db is not touched; callers commit their own changes.
+    """
+    if settings.AUDIT_LOG_WRITE_BEHIND:
+        audit_log_writer.log(action, user_id=user_id, username=username, details=details,
+                             ip_address=ip_address, user_agent=user_agent, status=status)
+        print(f"📝 Audit: {action} - {username or 'System'} - {status}")
+        return
     try:
         audit_entry = AuditLog(
             user_id=user_id,
@@ -280,9 +455,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Total-Samples", "X-Emotion-Distribution"],
 )
 
 
+@app.on_event("startup")
+def on_startup():
+    if int(os.environ.get("WEB_CONCURRENCY", "1") or 1) > 1:
+        print("⚠️ WEB_CONCURRENCY > 1: live dashboard state and streams are per process, "
+              "run the API as a single worker")
+    if settings.INFERENCE_BATCHING_ENABLED:
+        inference_scheduler.start()
+    if settings.EMOTION_LOG_WRITE_BEHIND:
+        emotion_log_writer.start()
+    if settings.AUDIT_LOG_WRITE_BEHIND:
+        audit_log_writer.start()
+    live_state.start()
+    password_hasher.start()
+    if settings.MAIL_QUEUE_ENABLED and settings.EMAIL_ENABLED:
+        outbound_mail.start()
+    if settings.EMOTION_ROLLUP_ENABLED:
+        emotion_rollup_compactor.start()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    inference_scheduler.stop()
+    inference_executor.shutdown()
+    # Flush buffered emotion logs before the process exits
+    emotion_log_writer.stop()
+    audit_log_writer.stop()
+    live_state.stop()
+    emotion_rollup_compactor.stop()
+    password_hasher.shutdown()
+    outbound_mail.stop()
+
+
 @app.get("/")
 def root():
     return {
@@ -359,7 +567,7 @@ def signup(user_data: UserSignup, db: Session = Depends(get_db)):
 
 
 @app.post("/api/auth/verify-signup", response_model=SignupResponse, status_code=201)
-def verify_signup(request: VerifySignupRequest, db: Session = Depends(get_db)):
+def verify_signup(request: VerifySignupRequest, http_request: Request, db: Session = Depends(get_db)):
     """Verify email code and create account"""
     
     email_normalized = request.email.lower().strip()
@@ -393,11 +601,13 @@ def verify_signup(request: VerifySignupRequest, db: Session = Depends(get_db)):
     # Code is valid - now create the account
     signup_data = pending["data"]
     
+    with _password_slot(http_request, email_hash):
+        password_hash = _hash_password(signup_data["password"])
+    
     try:
         # Encrypt for storage
         encrypted_email = EncryptionService.encrypt_data(signup_data["email"])
         encrypted_username = EncryptionService.encrypt_data(signup_data["username"])
-        password_hash = EncryptionService.hash_password(signup_data["password"])
         username_hash = EncryptionService.hash_username(signup_data["username"])
         print(f"✅ Data encrypted successfully")
     except Exception as e:
@@ -523,6 +733,7 @@ def verify_email(request: VerifyEmailRequest, db: Session = Depends(get_db)):
     user.verification_code = None
     user.verification_code_expiry = None
     db.commit()
+    invalidate_user(user.id)
     
     print(f"✅ Email verified for {user.name}")
     
@@ -618,7 +829,10 @@ def login(credentials: UserLogin, request: Request, db: Session = Depends(get_db
             })
         )
     
-    if not EncryptionService.verify_password(credentials.password, user.password_hash):
+    with _password_slot(request, username_hash):
+        password_valid = _verify_password(credentials.password, user.password_hash)
+    
+    if not password_valid:
         # Increment failed attempts
         user.failed_login_attempts = (user.failed_login_attempts or 0) + 1
         print(f"❌ LOGIN FAILED: Invalid password for '{username_normalized}' (attempt {user.failed_login_attempts}/5)")
@@ -834,7 +1048,7 @@ def verify_reset_code(request: VerifyResetCodeRequest, db: Session = Depends(get
 
 
 @app.post("/api/auth/reset-password")
-def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db)):
+def reset_password(request: ResetPasswordRequest, http_request: Request, db: Session = Depends(get_db)):
     """Reset password using the emailed code"""
     
     email_normalized = request.email.lower().strip()
@@ -866,14 +1080,18 @@ def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db))
         print(f"❌ Reset code expired")
         raise HTTPException(status_code=400, detail="Reset code expired. Please request a new one.")
     
+    with _password_slot(http_request, username_hash):
+        password_hash = _hash_password(request.new_password)
+    
     try:
-        user.password_hash = EncryptionService.hash_password(request.new_password)
+        user.password_hash = password_hash
         user.reset_token = None
         user.reset_token_expiry = None
         # Reset failed login attempts and unlock account
         user.failed_login_attempts = 0
         user.account_locked_until = None
         db.commit()
+        invalidate_user(user.id)
         
         username_display = EncryptionService.decrypt_data(user.username_encrypted)
         print(f"✅ Password reset successful for {user.name}")
@@ -1029,6 +1247,7 @@ def update_profile(
     # Commit name/username changes
     if updates_applied:
         db.commit()
+        invalidate_user(user.id)
         log_audit_event(db, "PROFILE_UPDATED", user_id=user.id, username=current_username,
                        details=json.dumps({"updated_fields": updates_applied}))
     
@@ -1096,6 +1315,7 @@ def verify_profile_email_update(
     user.email_hash = pending["new_email_hash"]
     user.email_encrypted = pending["new_email_encrypted"]
     db.commit()
+    invalidate_user(user.id)
     
     # Clean up
     del pending_profile_updates[user.id]
@@ -1158,6 +1378,7 @@ def resend_profile_verification(
 @app.post("/api/profile/change-password")
 def change_password(
     request: ChangePasswordRequest,
+    http_request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -1173,15 +1394,17 @@ def change_password(
     
     current_username = EncryptionService.decrypt_data(user.username_encrypted)
     
-    # Verify current password
-    if not EncryptionService.verify_password(request.current_password, user.password_hash):
-        log_audit_event(db, "PASSWORD_CHANGE_FAILED", user_id=user.id, username=current_username,
-                       details="Invalid current password", status="failed")
-        raise HTTPException(status_code=400, detail="Current password is incorrect")
-    
-    # Update password
-    user.password_hash = EncryptionService.hash_password(request.new_password)
+    with _password_slot(http_request, user.username_hash):
+        # Verify current password
+        if not _verify_password(request.current_password, user.password_hash):
+            log_audit_event(db, "PASSWORD_CHANGE_FAILED", user_id=user.id, username=current_username,
+                           details="Invalid current password", status="failed")
+            raise HTTPException(status_code=400, detail="Current password is incorrect")
+        
+        # Update password
+        user.password_hash = _hash_password(request.new_password)
     db.commit()
+    invalidate_user(user.id)
     
     log_audit_event(db, "PASSWORD_CHANGED", user_id=user.id, username=current_username,
                    details="Password changed successfully")
@@ -1192,30 +1415,23 @@ def change_password(
 # ==================== RECORDING STATE MANAGEMENT ====================
 
 @app.post("/api/recording/start")
-def start_recording(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
+def start_recording(current_user: User = Depends(get_current_user)):
     """Mark recording as started for current user"""
     
     is_guest = getattr(current_user, 'is_guest', False)
     
     if is_guest or current_user.id == 0:
+        live_state.update(current_user.id, is_guest=True, is_recording=True, last_activity=datetime.now(timezone.utc))
+        _invalidate_user_responses(current_user.id, DASHBOARD_CACHE)
+        dashboard_broadcaster.notify(current_user.id)
         return {"status": "recording", "message": "Guest recording started"}
     
-    try:
-        user = db.query(User).filter(User.id == current_user.id).first()
-        if user:
-            user.is_recording = True
-            user.last_activity = datetime.now(timezone.utc)
-            db.commit()
-            print(f"🎬 Recording started for user: {current_user.id}")
-        
-        return {"status": "recording", "message": "Recording started"}
-    except Exception as e:
-        print(f"❌ Failed to start recording: {e}")
-        db.rollback()
-        raise HTTPException(status_code=500, detail="Failed to start recording")
+    live_state.update(current_user.id, is_recording=True, last_activity=datetime.now(timezone.utc))
+    _invalidate_user_responses(current_user.id, DASHBOARD_CACHE)
+    dashboard_broadcaster.notify(current_user.id)
+    print(f"🎬 Recording started for user: {current_user.id}")
+    
+    return {"status": "recording", "message": "Recording started"}
 
 
 @app.post("/api/recording/stop")
@@ -1231,13 +1447,15 @@ def stop_recording(
         # Clear in-memory session for guest
         active_content_sessions.pop(current_user.id, None)
         analysis_context_cache.pop(current_user.id, None)
+        emotion_detector.reset_tracking(current_user.id)
+        live_state.update(current_user.id, is_guest=True, is_recording=False)
+        _invalidate_user_responses(current_user.id)
+        dashboard_broadcaster.notify(current_user.id)
         return {"status": "idle", "message": "Guest recording stopped"}
     
     try:
         now = datetime.now(timezone.utc)
-        user = db.query(User).filter(User.id == current_user.id).first()
-        if user:
-            user.is_recording = False
+        live_state.update(current_user.id, is_recording=False)
         
         # Close active content session in DB
         active_sessions = db.query(ContentSession).filter(
@@ -1249,12 +1467,16 @@ def stop_recording(
             sess.ended_at = now
             if sess.started_at:
                 sess.duration_seconds = int((now - sess.started_at).total_seconds())
+                rollups.roll_forward(db, sess)
         
         # Clear in-memory tracker
         active_content_sessions.pop(current_user.id, None)
         analysis_context_cache.pop(current_user.id, None)
+        emotion_detector.reset_tracking(current_user.id)
         
         db.commit()
+        _invalidate_user_responses(current_user.id)
+        dashboard_broadcaster.notify(current_user.id)
         print(f"⏹️ Recording stopped for user: {current_user.id} ({len(active_sessions)} session(s) closed)")
         
         return {"status": "idle", "message": "Recording stopped"}
@@ -1264,196 +1486,249 @@ def stop_recording(
         raise HTTPException(status_code=500, detail="Failed to stop recording")
 
 
-@app.post("/api/analyze/frame")
-async def analyze_frame(
-    file: UploadFile = File(None),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Analyze emotion from uploaded frame with content + activity classification + time tracking"""
-    
-    is_guest = getattr(current_user, 'is_guest', False)
-    username = getattr(current_user, 'username', 'guest')
-    
-    if not is_guest:
-        try:
-            username = EncryptionService.decrypt_data(current_user.username_encrypted)
-        except ValueError:
-            username = f"user_{current_user.id}"
-    
-    # ===== CONTENT + ACTIVITY CONTEXT (cached to keep emotion response fast) =====
-    content_type = None
-    content_confidence = None
-    app_name = ""
-    window_title = ""
-    activity = 'BROWSING'
-    activity_emoji = '🌐'
-    activity_confidence = 'Low'
-    productivity = 'NEUTRAL'
-    productivity_emoji = '➖'
-    content_details = {}
+def _frame_username(current_user: User) -> str:
+    """Display username for a frame's logs (decrypted for registered users)."""
+    if getattr(current_user, 'is_guest', False):
+        return getattr(current_user, 'username', 'guest')
+    try:
+        return EncryptionService.decrypt_data(current_user.username_encrypted)
+    except ValueError:
+        return f"user_{current_user.id}"
 
+
+def _get_analysis_context(db: Session, current_user: User, username: str) -> dict:
+    """
+    Content + activity context for a frame. Classification is cached per user for
+    ANALYSIS_CONTEXT_REFRESH_SECONDS to keep emotion responses fast; the content
+    session is only updated when the context is refreshed.
+    """
+    is_guest = getattr(current_user, 'is_guest', False)
     now_utc = datetime.now(timezone.utc)
     cached_context = analysis_context_cache.get(current_user.id)
     context_is_fresh = (
         cached_context is not None and
         (now_utc - cached_context['updated_at']).total_seconds() < ANALYSIS_CONTEXT_REFRESH_SECONDS
     )
-
     if context_is_fresh:
-        content_type = cached_context.get('content_type')
-        content_confidence = cached_context.get('content_confidence')
-        app_name = cached_context.get('app_name', '')
-        window_title = cached_context.get('window_title', '')
-        activity = cached_context.get('activity', 'BROWSING')
-        activity_emoji = cached_context.get('activity_emoji', '🌐')
-        activity_confidence = cached_context.get('activity_confidence', 'Low')
-        productivity = cached_context.get('productivity', 'NEUTRAL')
-        productivity_emoji = cached_context.get('productivity_emoji', '➖')
-        content_details = cached_context.get('content_details', {})
-    else:
-        fast_detector = get_fast_content_detector()
-        if fast_detector:
-            try:
-                content_result = fast_detector.categorize_from_window()
-                content_type = content_result.get('category', 'OTHER')
-                app_name = content_result.get('app', '')
-                window_title = content_result.get('title', '')
-                confidence_map = {'Very High': 0.95, 'High': 0.80, 'Medium': 0.60, 'Low': 0.40}
-                content_confidence = confidence_map.get(content_result.get('confidence', 'Low'), 0.40)
-            except Exception as e:
-                print(f"⚠️ Content detection failed: {e}")
-
-        activity_result = _classify_activity(app_name, window_title, content_type or "")
-        activity = activity_result.get('activity', 'BROWSING')
-        activity_emoji = activity_result.get('emoji', '🌐')
-        activity_confidence = activity_result.get('confidence', 'Low')
-
-        productivity_result = _get_productivity(activity, content_type)
-        productivity = productivity_result['classification']
-        productivity_emoji = productivity_result['emoji']
+        return cached_context
+
+    content_type = None
+    content_confidence = None
+    app_name = ""
+    window_title = ""
+
+    fast_detector = get_fast_content_detector()
+    if fast_detector:
+        try:
+            content_result = fast_detector.categorize_from_window()
+            content_type = content_result.get('category', 'OTHER')
+            app_name = content_result.get('app', '')
+            window_title = content_result.get('title', '')
+            confidence_map = {'Very High': 0.95, 'High': 0.80, 'Medium': 0.60, 'Low': 0.40}
+            content_confidence = confidence_map.get(content_result.get('confidence', 'Low'), 0.40)
+        except Exception as e:
+            print(f"⚠️ Content detection failed: {e}")
+
+    activity_result = _classify_activity(app_name, window_title, content_type or "")
+    activity = activity_result.get('activity', 'BROWSING')
+    activity_emoji = activity_result.get('emoji', '🌐')
+    activity_confidence = activity_result.get('confidence', 'Low')
+
+    productivity_result = _get_productivity(activity, content_type)
+    productivity = productivity_result['classification']
+    productivity_emoji = productivity_result['emoji']
+
+    content_details = {
+        'app_name': app_name,
+        'window_title': window_title[:200],
+        'activity': activity,
+        'activity_emoji': activity_emoji,
+        'activity_confidence': activity_confidence,
+        'productivity': productivity,
+        'productivity_emoji': productivity_emoji,
+    }
+
+    print(f"📊 Content: {content_type} | Activity: {activity_emoji} {activity} | Productivity: {productivity_emoji} {productivity}")
+
+    # Update session only when context is refreshed to reduce per-frame DB overhead.
+    try:
+        _update_content_session(
+            db=db,
+            user_id=current_user.id,
+            username=username,
+            content_type=content_type or "UNKNOWN",
+            content_confidence=content_confidence,
+            activity=activity,
+            activity_emoji=activity_emoji,
+            activity_confidence=activity_confidence,
+            productivity=productivity,
+            productivity_emoji=productivity_emoji,
+            app_name=app_name,
+            window_title=window_title,
+            is_guest=is_guest
+        )
+    except Exception as e:
+        print(f"⚠️ Session tracking error: {e}")
+
+    context = {
+        'updated_at': now_utc,
+        'content_type': content_type,
+        'content_confidence': content_confidence,
+        'app_name': app_name,
+        'window_title': window_title,
+        'activity': activity,
+        'activity_emoji': activity_emoji,
+        'activity_confidence': activity_confidence,
+        'productivity': productivity,
+        'productivity_emoji': productivity_emoji,
+        'content_details': content_details,
+    }
+    analysis_context_cache[current_user.id] = context
+    return context
 
-        content_details = {
-            'app_name': app_name,
-            'window_title': window_title[:200],
-            'activity': activity,
-            'activity_emoji': activity_emoji,
-            'activity_confidence': activity_confidence,
-            'productivity': productivity,
-            'productivity_emoji': productivity_emoji,
-        }
 
-        print(f"📊 Content: {content_type} | Activity: {activity_emoji} {activity} | Productivity: {productivity_emoji} {productivity}")
+def _context_response(context: dict) -> dict:
+    """Neutral response carrying only the content context (no usable camera frame)."""
+    return {
+        "emotion": "neutral",
+        "intensity": 0.5,
+        "content": context['content_type'] or "UNKNOWN",
+        "content_conf": context['content_confidence'] or 0.0,
+        "content_details": context['content_details'],
+        "timestamp": datetime.now().isoformat()
+    }
 
-        # Update session only when context is refreshed to reduce per-frame DB overhead.
+
+async def _analyze_frame_bytes(contents: bytes, current_user: User, username: str,
+                               context: dict, db: Session) -> dict:
+    """
+    Run emotion detection on one encoded frame and persist valid results.
+    Shared by the HTTP upload endpoint and the WebSocket stream.
+    Raises InferenceBusyError when the inference pool is saturated.
+    """
+    is_guest = getattr(current_user, 'is_guest', False)
+    content_type = context['content_type']
+    content_confidence = context['content_confidence']
+
+    print(f"📷 Received frame: {len(contents)} bytes from {username}")
+    result = await _run_emotion_pipeline(contents, current_user.id) if emotion_detector else None
+    
+    if result:
+        print(f"🧠 Model result: {result.get('emotion')} ({result.get('intensity', 0):.2f}) - Face detected: {result.get('face_detected', False)}")
+        emotion_data = {
+            "emotion": result.get('emotion', 'neutral'),
+            "intensity": result.get('intensity', 0.5),
+            "content": content_type or "UNKNOWN",
+            "content_conf": content_confidence or 0.0,
+            "content_details": context['content_details'],
+            "timestamp": datetime.now().isoformat(),
+            "face_detected": result.get('face_detected', False),
+            "probabilities": result.get('probabilities', {}),
+            "error": result.get('error'),
+            "error_message": result.get('error_message'),
+            "stop_detection": result.get('stop_detection', False),
+            "face_count": result.get('face_count', 1),
+            "cached": result.get('cached', False)
+        }
+    else:
+        emotion_data = _context_response(context)
+    
+    # ✅ Only save VALID emotions to database
+    invalid_emotions = ['error', 'no_face', 'unknown']
+    should_save = emotion_data["emotion"] not in invalid_emotions
+    
+    if should_save:
+        live_state.update(
+            current_user.id,
+            is_guest=is_guest,
+            current_emotion=emotion_data["emotion"],
+            current_emotion_intensity=emotion_data["intensity"],
+            current_content=content_type,
+            last_activity=datetime.now(timezone.utc),
+            is_recording=True
+        )
+    
+    if should_save and settings.EMOTION_LOG_WRITE_BEHIND:
+        # Row + user state are written in batches by the background writer
+        if not emotion_log_writer.log(
+            user_id=current_user.id,
+            username=username,
+            emotion=emotion_data["emotion"],
+            intensity=emotion_data["intensity"],
+            content_type=content_type,
+            content_confidence=content_confidence,
+            probabilities=json.dumps(emotion_data.get("probabilities", {})),
+            is_guest=is_guest
+        ):
+            print(f"⚠️ Emotion log buffer full, spilled frame for {username} to the fallback file")
+        else:
+            print(f"✅ Queued: {username} - {emotion_data['emotion']} | {context['activity']} on {content_type}")
+        # Content session changes (if the context was refreshed) still commit here
         try:
-            _update_content_session(
-                db=db,
+            db.commit()
+        except Exception:
+            db.rollback()
+    elif should_save:
+        try:
+            emotion_log = EmotionLog(
                 user_id=current_user.id,
                 username=username,
-                content_type=content_type or "UNKNOWN",
+                emotion=emotion_data["emotion"],
+                intensity=emotion_data["intensity"],
+                content_type=content_type,
                 content_confidence=content_confidence,
-                activity=activity,
-                activity_emoji=activity_emoji,
-                activity_confidence=activity_confidence,
-                productivity=productivity,
-                productivity_emoji=productivity_emoji,
-                app_name=app_name,
-                window_title=window_title,
+                probabilities=json.dumps(emotion_data.get("probabilities", {})),
                 is_guest=is_guest
             )
+            db.add(emotion_log)
+            db.commit()
+            print(f"✅ Logged: {username} - {emotion_data['emotion']} | {context['activity']} on {content_type}")
         except Exception as e:
-            print(f"⚠️ Session tracking error: {e}")
+            print(f"❌ Failed to save emotion log: {e}")
+            db.rollback()
+    else:
+        # Still commit content session even if emotion is invalid
+        try:
+            db.commit()
+        except Exception:
+            pass
+        print(f"⏭️ Skipping emotion save for: {emotion_data['emotion']}")
+    
+    # Emotion, recent-log recommendations and (if the context was refreshed) content session
+    # changed. Write-behind rows invalidate again once flushed (_invalidate_written_users).
+    _invalidate_user_responses(current_user.id)
+    dashboard_broadcaster.notify(current_user.id)
+    return emotion_data
 
-        analysis_context_cache[current_user.id] = {
-            'updated_at': now_utc,
-            'content_type': content_type,
-            'content_confidence': content_confidence,
-            'app_name': app_name,
-            'window_title': window_title,
-            'activity': activity,
-            'activity_emoji': activity_emoji,
-            'activity_confidence': activity_confidence,
-            'productivity': productivity,
-            'productivity_emoji': productivity_emoji,
-            'content_details': content_details,
-        }
+
+@app.post("/api/analyze/frame")
+async def analyze_frame(
+    file: UploadFile = File(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Analyze emotion from uploaded frame with content + activity classification + time tracking"""
+    
+    # Fail fast while the inference pool is saturated (before any content/DB work)
+    if file and inference_executor.is_saturated():
+        raise HTTPException(status_code=503, detail=INFERENCE_BUSY_DETAIL, headers={"Retry-After": "1"})
+    
+    username = _frame_username(current_user)
+    
+    # ===== CONTENT + ACTIVITY CONTEXT (cached to keep emotion response fast) =====
+    context = _get_analysis_context(db, current_user, username)
     
     # ===== EMOTION DETECTION =====
     if file:
         try:
             contents = await file.read()
-            print(f"📷 Received frame: {len(contents)} bytes from {username}")
-            result = emotion_detector.process_frame(contents) if emotion_detector else None
-            
-            if result:
-                print(f"🧠 Model result: {result.get('emotion')} ({result.get('intensity', 0):.2f}) - Face detected: {result.get('face_detected', False)}")
-                emotion_data = {
-                    "emotion": result.get('emotion', 'neutral'),
-                    "intensity": result.get('intensity', 0.5),
-                    "content": content_type or "UNKNOWN",
-                    "content_conf": content_confidence or 0.0,
-                    "content_details": content_details,
-                    "timestamp": datetime.now().isoformat(),
-                    "face_detected": result.get('face_detected', False),
-                    "probabilities": result.get('probabilities', {}),
-                    "error": result.get('error'),
-                    "error_message": result.get('error_message'),
-                    "stop_detection": result.get('stop_detection', False),
-                    "face_count": result.get('face_count', 1)
-                }
-            else:
-                emotion_data = {
-                    "emotion": "neutral",
-                    "intensity": 0.5,
-                    "content": content_type or "UNKNOWN",
-                    "content_conf": content_confidence or 0.0,
-                    "content_details": content_details,
-                    "timestamp": datetime.now().isoformat()
-                }
-            
-            # ✅ Only save VALID emotions to database
-            invalid_emotions = ['error', 'no_face', 'unknown']
-            should_save = emotion_data["emotion"] not in invalid_emotions
-            
-            if should_save:
-                try:
-                    emotion_log = EmotionLog(
-                        user_id=current_user.id,
-                        username=username,
-                        emotion=emotion_data["emotion"],
-                        intensity=emotion_data["intensity"],
-                        content_type=content_type,
-                        content_confidence=content_confidence,
-                        probabilities=json.dumps(emotion_data.get("probabilities", {})),
-                        is_guest=is_guest
-                    )
-                    db.add(emotion_log)
-                    
-                    if not is_guest:
-                        user = db.query(User).filter(User.id == current_user.id).first()
-                        if user:
-                            user.current_emotion = emotion_data["emotion"]
-                            user.current_emotion_intensity = emotion_data["intensity"]
-                            user.current_content = content_type
-                            user.last_activity = datetime.now(timezone.utc)
-                            user.is_recording = True
-                    
-                    db.commit()
-                    print(f"✅ Logged: {username} - {emotion_data['emotion']} | {activity} on {content_type}")
-                except Exception as e:
-                    print(f"❌ Failed to save emotion log: {e}")
-                    db.rollback()
-            else:
-                # Still commit content session even if emotion is invalid
-                try:
-                    db.commit()
-                except Exception:
-                    pass
-                print(f"⏭️ Skipping emotion save for: {emotion_data['emotion']}")
-            
-            return emotion_data
-            
+            return await _analyze_frame_bytes(contents, current_user, username, context, db)
+        except InferenceBusyError:
+            try:
+                db.commit()
+            except Exception:
+                pass
+            raise HTTPException(status_code=503, detail=INFERENCE_BUSY_DETAIL, headers={"Retry-After": "1"})
         except Exception as e:
             logger.error(f"Frame analysis error: {e}")
     
@@ -1463,14 +1738,122 @@ async def analyze_frame(
     except Exception:
         pass
     
-    return {
-        "emotion": "neutral",
-        "intensity": 0.5,
-        "content": content_type or "UNKNOWN",
-        "content_conf": content_confidence or 0.0,
-        "content_details": content_details,
-        "timestamp": datetime.now().isoformat()
-    }
+    return _context_response(context)
+
+
+@app.websocket("/ws/analyze")
+async def analyze_stream(websocket: WebSocket, token: str = None):
+    """
+    Stream camera frames over one WebSocket instead of one POST per frame.
+    Authenticate once with ?token=<jwt> (or an Authorization: Bearer header), then send
+    binary JPEG frames; each analyzed frame is answered with the same JSON as
+    /api/analyze/frame plus a dropped_frames counter. While a frame is being analyzed
+    only the newest incoming frame is kept, so a client that outpaces inference sees
+    stale frames dropped server-side instead of an ever-growing backlog.
+    The token and account are checked again every WS_AUTH_RECHECK_SECONDS and when the
+    token expires; the stream is closed (1008) once either is no longer valid.
+    """
+    if not token:
+        auth_header = websocket.headers.get("authorization", "")
+        if auth_header.lower().startswith("bearer "):
+            token = auth_header[7:]
+    token = token or ""
+
+    def authenticate():
+        """The token's user if the token is still valid and the account active, else None."""
+        db = SessionLocal()
+        try:
+            user = get_user_from_token(token, db)
+            db.expunge_all()
+        except HTTPException:
+            return None
+        finally:
+            db.close()
+        return user if user.is_active else None
+
+    def next_auth_check():
+        check_at = time.monotonic() + settings.WS_AUTH_RECHECK_SECONDS
+        expires_at = token_expires_at(token)
+        if expires_at is not None:
+            # +1 s: exp has whole-second resolution and is only rejected once it has passed
+            check_at = min(check_at, time.monotonic() + max(0.0, expires_at - time.time()) + 1.0)
+        return check_at
+
+    current_user = authenticate()
+    if current_user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    username = _frame_username(current_user)
+    print(f"🔌 Frame stream opened for {username}")
+
+    latest = {"frame": None, "closed": False}
+    frame_ready = asyncio.Event()
+    dropped = 0
+
+    async def receive_frames():
+        nonlocal dropped
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                frame = message.get("bytes")
+                if not frame:
+                    continue  # text/control messages are ignored
+                if latest["frame"] is not None:
+                    dropped += 1
+                latest["frame"] = frame
+                frame_ready.set()
+        finally:
+            latest["closed"] = True
+            frame_ready.set()
+
+    receiver = asyncio.create_task(receive_frames())
+    auth_check_at = next_auth_check()
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(frame_ready.wait(), timeout=max(0.0, auth_check_at - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            if time.monotonic() >= auth_check_at:
+                current_user = authenticate()
+                if current_user is None:
+                    print(f"🔒 Frame stream for {username}: token expired or account disabled, closing")
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                    break
+                auth_check_at = next_auth_check()
+            if not frame_ready.is_set():
+                continue
+            frame_ready.clear()
+            frame, latest["frame"] = latest["frame"], None
+            if frame is None:
+                if latest["closed"]:
+                    break
+                continue
+
+            db = SessionLocal()
+            try:
+                context = _get_analysis_context(db, current_user, username)
+                try:
+                    emotion_data = await _analyze_frame_bytes(frame, current_user, username, context, db)
+                except InferenceBusyError:
+                    dropped += 1
+                    emotion_data = {"error": "busy", "error_message": INFERENCE_BUSY_DETAIL}
+            finally:
+                db.close()
+
+            emotion_data["dropped_frames"] = dropped
+            await websocket.send_json(emotion_data)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Frame stream error: {e}")
+    finally:
+        receiver.cancel()
+        print(f"🔌 Frame stream closed for {username} ({dropped} frame(s) dropped)")
 
 
 @app.get("/api/analyze/content")
@@ -1586,17 +1969,44 @@ def get_content_classifier_status():
     }
 
 
+def _count_total(db: Session, query, total: str):
+    if total not in pagination.TOTAL_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid total mode '{total}'. Use one of: {', '.join(pagination.TOTAL_MODES)}"
+        )
+    return pagination.count_total(db, query, total)
+
+
+def _paginate(response: Response, db: Session, query, sort_column, id_column,
+              limit: int, cursor: str, offset: int, total: str):
+    """Keyset page of query; sets X-Next-Cursor (and X-Total-Count when total is requested)."""
+    if total is not None:
+        total_count = _count_total(db, query, total)
+        if total_count is not None:
+            response.headers["X-Total-Count"] = str(total_count)
+    try:
+        rows, next_cursor = pagination.paginate(query, sort_column, id_column, limit, cursor, offset)
+    except pagination.InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+
 @app.get("/api/emotions/history")
 def get_emotion_history(
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
-    limit: int = 100
+    limit: int = 100,
+    cursor: str = None,
+    total: str = "none"
 ):
-    """Get emotion detection history"""
+    """Get emotion detection history (next page via the X-Next-Cursor header)"""
     
-    emotions = db.query(EmotionLog).filter(
-        EmotionLog.user_id == current_user.id
-    ).order_by(EmotionLog.created_at.desc()).limit(limit).all()
+    query = db.query(EmotionLog).filter(EmotionLog.user_id == current_user.id)
+    emotions = _paginate(response, db, query, EmotionLog.created_at, EmotionLog.id, limit, cursor, 0, total)
     
     return [
         {
@@ -1614,18 +2024,22 @@ def get_emotion_history(
 
 @app.get("/api/content/sessions")
 def get_content_sessions(
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
     limit: int = 50,
-    offset: int = 0
+    offset: int = 0,
+    cursor: str = None,
+    total: str = "none"
 ):
     """
     Get content consumption session history for the current user.
     Each session shows what the user was doing, for how long, and the content type.
+    Pass the X-Next-Cursor header value as ?cursor= for the next page.
     """
-    sessions = db.query(ContentSession).filter(
-        ContentSession.user_id == current_user.id
-    ).order_by(ContentSession.started_at.desc()).offset(offset).limit(limit).all()
+    query = db.query(ContentSession).filter(ContentSession.user_id == current_user.id)
+    sessions = _paginate(response, db, query, ContentSession.started_at, ContentSession.id,
+                         limit, cursor, offset, total)
     
     return [
         {
@@ -1657,83 +2071,36 @@ def get_content_sessions_summary(
     """
     Get a summary of content consumption for the last N hours.
     Groups by content_type and activity, showing total time spent on each.
+    Served from hourly rollups (window rounded out to the hour) plus the open session.
     """
-    from sqlalchemy import func as sqla_func
-    
     cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
+    summary = rollups.summarize(db, current_user.id, cutoff)
     
-    # Summarize by content type
-    content_summary = db.query(
-        ContentSession.content_type,
-        sqla_func.sum(ContentSession.duration_seconds).label('total_seconds'),
-        sqla_func.count(ContentSession.id).label('session_count')
-    ).filter(
-        ContentSession.user_id == current_user.id,
-        ContentSession.started_at >= cutoff,
-        ContentSession.duration_seconds.isnot(None)
-    ).group_by(ContentSession.content_type).all()
-    
-    # Summarize by activity
-    activity_summary = db.query(
-        ContentSession.activity,
-        ContentSession.activity_emoji,
-        sqla_func.sum(ContentSession.duration_seconds).label('total_seconds'),
-        sqla_func.count(ContentSession.id).label('session_count')
-    ).filter(
-        ContentSession.user_id == current_user.id,
-        ContentSession.started_at >= cutoff,
-        ContentSession.duration_seconds.isnot(None)
-    ).group_by(ContentSession.activity, ContentSession.activity_emoji).all()
-    
-    # Summarize by productivity
-    productivity_summary = db.query(
-        ContentSession.productivity,
-        ContentSession.productivity_emoji,
-        sqla_func.sum(ContentSession.duration_seconds).label('total_seconds'),
-        sqla_func.count(ContentSession.id).label('session_count')
-    ).filter(
-        ContentSession.user_id == current_user.id,
-        ContentSession.started_at >= cutoff,
-        ContentSession.duration_seconds.isnot(None)
-    ).group_by(ContentSession.productivity, ContentSession.productivity_emoji).all()
-    
-    total_seconds = sum(row.total_seconds or 0 for row in content_summary)
+    total_seconds = sum(item['total_seconds'] for item in summary['content_type'])
+    
+    def _entry(item: dict) -> dict:
+        return {
+            "total_seconds": item['total_seconds'],
+            "total_formatted": _format_duration(item['total_seconds']),
+            "session_count": item['session_count'],
+            "percentage": round((item['total_seconds'] / total_seconds * 100), 1) if total_seconds > 0 else 0
+        }
     
     return {
         "period_hours": hours,
         "total_time_seconds": total_seconds,
         "total_time_formatted": _format_duration(total_seconds),
         "by_content_type": [
-            {
-                "content_type": row.content_type,
-                "total_seconds": row.total_seconds,
-                "total_formatted": _format_duration(row.total_seconds),
-                "session_count": row.session_count,
-                "percentage": round((row.total_seconds / total_seconds * 100), 1) if total_seconds > 0 else 0
-            }
-            for row in content_summary
+            {"content_type": item['key'], **_entry(item)}
+            for item in summary['content_type']
         ],
         "by_activity": [
-            {
-                "activity": row.activity,
-                "activity_emoji": row.activity_emoji,
-                "total_seconds": row.total_seconds,
-                "total_formatted": _format_duration(row.total_seconds),
-                "session_count": row.session_count,
-                "percentage": round((row.total_seconds / total_seconds * 100), 1) if total_seconds > 0 else 0
-            }
-            for row in activity_summary
+            {"activity": item['key'], "activity_emoji": item['emoji'], **_entry(item)}
+            for item in summary['activity']
         ],
         "by_productivity": [
-            {
-                "productivity": row.productivity,
-                "productivity_emoji": row.productivity_emoji,
-                "total_seconds": row.total_seconds,
-                "total_formatted": _format_duration(row.total_seconds),
-                "session_count": row.session_count,
-                "percentage": round((row.total_seconds / total_seconds * 100), 1) if total_seconds > 0 else 0
-            }
-            for row in productivity_summary
+            {"productivity": item['key'], "productivity_emoji": item['emoji'], **_entry(item)}
+            for item in summary['productivity']
         ],
     }
 
@@ -1744,35 +2111,53 @@ def get_active_content_session(
     db: Session = Depends(get_db)
 ):
     """Get the user's currently active content session (what they're doing right now)."""
-    session = db.query(ContentSession).filter(
-        ContentSession.user_id == current_user.id,
-        ContentSession.is_active == True
-    ).order_by(ContentSession.started_at.desc()).first()
+    # The session row is cached; elapsed time is always computed fresh
+    session = user_response_cache.get_or_set(
+        (ACTIVE_SESSION_CACHE, current_user.id),
+        lambda: _active_content_session_row(db, current_user.id)
+    )
     
     if not session:
         return {"active": False, "session": None}
     
     now = datetime.now(timezone.utc)
-    elapsed = int((now - session.started_at).total_seconds()) if session.started_at else 0
+    started_at = session["started_at"]
+    elapsed = int((now - started_at).total_seconds()) if started_at else 0
     
     return {
         "active": True,
         "session": {
-            "id": session.id,
-            "content_type": session.content_type,
-            "activity": session.activity,
-            "activity_emoji": session.activity_emoji,
-            "productivity": session.productivity,
-            "productivity_emoji": session.productivity_emoji,
-            "app_name": session.app_name,
-            "window_title": session.window_title,
-            "started_at": session.started_at.isoformat(),
+            **{k: v for k, v in session.items() if k != "started_at"},
+            "started_at": started_at.isoformat(),
             "elapsed_seconds": elapsed,
             "elapsed_formatted": _format_duration(elapsed),
         }
     }
 
 
+def _active_content_session_row(db: Session, user_id: int):
+    """Fields of the user's active content session, or None."""
+    session = db.query(ContentSession).filter(
+        ContentSession.user_id == user_id,
+        ContentSession.is_active == True
+    ).order_by(ContentSession.started_at.desc()).first()
+    
+    if not session:
+        return None
+    
+    return {
+        "id": session.id,
+        "content_type": session.content_type,
+        "activity": session.activity,
+        "activity_emoji": session.activity_emoji,
+        "productivity": session.productivity,
+        "productivity_emoji": session.productivity_emoji,
+        "app_name": session.app_name,
+        "window_title": session.window_title,
+        "started_at": session.started_at,
+    }
+
+
 def _format_duration(seconds) -> str:
     """Format seconds into human-readable duration string."""
     if not seconds or seconds <= 0:
@@ -1815,6 +2200,33 @@ def verify_admin(x_api_key: str = Header(None)):
     return True
 
 
+@app.get("/api/admin/metrics")
+def admin_metrics(_: bool = Depends(verify_admin)):
+    """Admin: Runtime counters for the frame pipeline (inference, sampling, write-behind)"""
+    return {
+        "inference_executor": inference_executor.stats(),
+        "password_hasher": password_hasher.stats(),
+        "decrypted_field_cache": decrypted_cache.stats(),
+        "password_limits": {
+            "per_ip": password_ip_limiter.stats(),
+            "per_account": password_account_limiter.stats(),
+        },
+        "batch_scheduler": inference_scheduler.stats(),
+        "face_tracking": emotion_detector.tracking_stats(),
+        "frame_sampling": emotion_detector.frame_sampler.stats() if emotion_detector.frame_sampler else None,
+        "emotion_log_writer": emotion_log_writer.stats(),
+        "audit_log_writer": audit_log_writer.stats(),
+        "mail_queue": outbound_mail.stats(),
+        "live_state": live_state.stats(),
+        "emotion_rollups": emotion_rollup_compactor.stats(),
+        "admin_stats_cache": admin_stats_cache.stats(),
+        "dashboard_streams": dashboard_broadcaster.stats(),
+        "user_response_cache": user_response_cache.stats(),
+        "auth_user_cache": user_cache.stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+
 @app.get("/api/admin/users")
 def admin_get_users(
     _: bool = Depends(verify_admin),
@@ -1825,6 +2237,8 @@ def admin_get_users(
     """Admin: Get all users"""
     
     users = db.query(User).offset(offset).limit(limit).all()
+    emails = EncryptionService.decrypt_many(u.email_encrypted for u in users)
+    usernames = EncryptionService.decrypt_many(u.username_encrypted for u in users)
     
     return {
         "total": db.query(User).count(),
@@ -1832,23 +2246,26 @@ def admin_get_users(
             {
                 "id": u.id,
                 "name": u.name,
-                "email": EncryptionService.decrypt_data(u.email_encrypted),
-                "username": EncryptionService.decrypt_data(u.username_encrypted),
+                "email": email,
+                "username": username,
                 "email_verified": u.email_verified,
                 "is_active": u.is_active,
                 "created_at": u.created_at.isoformat()
             }
-            for u in users
+            for u, email, username in zip(users, emails, usernames)
         ]
     }
 
 
 @app.get("/api/admin/emotion-logs")
 def admin_get_emotion_logs(
+    response: Response,
     _: bool = Depends(verify_admin),
     db: Session = Depends(get_db),
     limit: int = 1000,
-    user_id: int = None
+    user_id: int = None,
+    cursor: str = None,
+    total: str = "approx"
 ):
     """Admin: Get emotion logs for dataset management"""
     
@@ -1857,10 +2274,12 @@ def admin_get_emotion_logs(
     if user_id:
         query = query.filter(EmotionLog.user_id == user_id)
     
-    logs = query.order_by(EmotionLog.created_at.desc()).limit(limit).all()
+    total_count = _count_total(db, query, total)
+    logs = _paginate(response, db, query, EmotionLog.created_at, EmotionLog.id, limit, cursor, 0, None)
     
     return {
-        "total": query.count(),
+        "total": total_count,
+        "next_cursor": response.headers.get("X-Next-Cursor"),
         "logs": [
             {
                 "id": log.id,
@@ -1879,29 +2298,36 @@ def admin_get_emotion_logs(
 @app.get("/api/admin/dataset/export")
 def admin_export_dataset(
     _: bool = Depends(verify_admin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    format: str = "json",
+    since: datetime = None,
+    until: datetime = None,
+    user_id: int = None
 ):
-    """Admin: Export emotion dataset for model training"""
-    
-    logs = db.query(EmotionLog).all()
+    """Admin: Export emotion dataset for model training (streamed as json, ndjson, csv or parquet)"""
     
-    return {
-        "dataset": [
-            {
-                "emotion": log.emotion,
-                "intensity": log.intensity,
-                "content_type": log.content_type,
-                "probabilities": log.probabilities,
-                "timestamp": log.created_at.isoformat()
-            }
-            for log in logs
-        ],
-        "total_samples": len(logs),
-        "emotion_distribution": {
-            emotion: db.query(EmotionLog).filter(EmotionLog.emotion == emotion).count()
-            for emotion in ['happy', 'sad', 'angry', 'neutral', 'focused', 'stressed', 'tired']
+    fmt = format.lower()
+    if fmt not in dataset_export.FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported format '{format}'. Use one of: {', '.join(dataset_export.FORMATS)}"
+        )
+    if fmt == 'parquet' and not dataset_export.PYARROW_AVAILABLE:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow to be installed")
+    
+    # One GROUP BY for the distribution; rows are streamed in batches afterwards
+    distribution = dataset_export.emotion_distribution(db, since, until, user_id)
+    media_type, extension = dataset_export.FORMATS[fmt]
+    
+    return StreamingResponse(
+        dataset_export.stream(fmt, since, until, user_id, distribution, settings.DATASET_EXPORT_BATCH_SIZE),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="emotion_dataset.{extension}"',
+            "X-Total-Samples": str(sum(distribution.values())),
+            "X-Emotion-Distribution": json.dumps(distribution),
         }
-    }
+    )
 
 
 @app.get("/api/admin/audit")
@@ -1961,105 +2387,194 @@ def admin_get_active_users(
     # Users active in the last 5 minutes are considered "currently using"
     cutoff_time = datetime.now(timezone.utc) - timedelta(minutes=5)
     
-    active_users = db.query(User).filter(
-        User.last_activity != None,
-        User.last_activity >= cutoff_time
-    ).all()
+    # Live state comes from the in-memory store; only names are read from the DB
+    active_states = live_state.active_since(cutoff_time)
+    ids = [state['user_id'] for state in active_states]
+    identities = {
+        row.id: row
+        for row in db.query(User.id, User.name, User.username_encrypted).filter(User.id.in_(ids)).all()
+    } if ids else {}
+    usernames = dict(zip(
+        identities, EncryptionService.decrypt_many(u.username_encrypted for u in identities.values())
+    ))
+    
+    users = []
+    for state in active_states:
+        u = identities.get(state['user_id'])
+        if u is None:
+            continue
+        users.append({
+            "id": u.id,
+            "name": u.name,
+            "username": usernames[u.id],
+            "current_emotion": state.get('current_emotion') or "N/A",
+            "current_emotion_intensity": state.get('current_emotion_intensity') or 0,
+            "current_content": state.get('current_content') or "N/A",
+            "last_activity": state['last_activity'].isoformat(),
+            "status": "Recording" if state.get('is_recording') else "Idle"
+        })
     
     return {
-        "active_count": len(active_users),
-        "users": [
-            {
-                "id": u.id,
-                "name": u.name,
-                "username": EncryptionService.decrypt_data(u.username_encrypted),
-                "current_emotion": u.current_emotion or "N/A",
-                "current_emotion_intensity": u.current_emotion_intensity or 0,
-                "current_content": u.current_content or "N/A",
-                "last_activity": u.last_activity.isoformat() if u.last_activity else None,
-                "status": "Recording" if getattr(u, 'is_recording', False) else "Idle"
-            }
-            for u in active_users
-        ]
+        "active_count": len(users),
+        "users": users
+    }
+
+
+def _build_dashboard_state(db: Session, user_id: int) -> dict:
+    """Dashboard payload for a user: live state, falling back to the database."""
+    
+    # Live state (recording flag, latest emotion) comes from the in-memory store
+    state = live_state.get(user_id)
+    
+    if state is not None:
+        is_recording = bool(state.get('is_recording'))
+    else:
+        user = db.query(User).filter(User.id == user_id).first()
+        is_recording = getattr(user, 'is_recording', False) if user else False
+    
+    if state is not None and state.get('last_emotion_at'):
+        emotion = state.get('current_emotion')
+        emotion_intensity = state.get('current_emotion_intensity')
+        content = state.get('current_content')
+        last_emotion_at = state['last_emotion_at']
+    else:
+        # Store hasn't seen a frame yet: fall back to the LATEST emotion log (limit 1)
+        last_log = db.query(EmotionLog).filter(
+            EmotionLog.user_id == user_id
+        ).order_by(EmotionLog.created_at.desc()).limit(1).first()
+        emotion = last_log.emotion if last_log else None
+        emotion_intensity = last_log.intensity if last_log else None
+        content = last_log.content_type if last_log else None
+        last_emotion_at = last_log.created_at if last_log else None
+    
+    # Get the active content session for richer dashboard data
+    active_session = db.query(ContentSession).filter(
+        ContentSession.user_id == user_id,
+        ContentSession.is_active == True
+    ).order_by(ContentSession.started_at.desc()).limit(1).first()
+    
+    status = "Recording" if is_recording else "Idle"
+    
+    # Build content details from active session
+    content_details = None
+    if active_session:
+        # Prefer active session content over EmotionLog (more detailed)
+        if not content or content == 'UNKNOWN':
+            content = active_session.content_type
+        content_details = {
+            'activity': active_session.activity,
+            'activity_emoji': active_session.activity_emoji,
+            'productivity': active_session.productivity,
+            'productivity_emoji': active_session.productivity_emoji,
+            'app_name': active_session.app_name,
+            'duration_seconds': active_session.duration_seconds or 0,
+        }
+    
+    return {
+        "current_emotion": emotion,
+        "current_emotion_intensity": emotion_intensity,
+        "current_content": content,
+        "content_details": content_details,
+        "status": status,
+        "last_session": last_emotion_at.isoformat() if last_emotion_at else None,
+        "session_summary": None  # Moved to separate endpoint for performance
     }
 
 
+IDLE_DASHBOARD_STATE = {
+    "current_emotion": None,
+    "current_emotion_intensity": None,
+    "current_content": None,
+    "status": "Idle",
+    "last_session": None,
+    "session_summary": None
+}
+
+
 @app.get("/api/dashboard/status")
 def get_dashboard_status(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get current dashboard status - OPTIMIZED for high-frequency polling"""
+    """Get current dashboard status (polling fallback for /api/dashboard/stream)"""
     
     try:
-    
-        # Use a single efficient query to get both user and last log
-        from sqlalchemy.orm import joinedload
-        
-        user = db.query(User).filter(User.id == current_user.id).first()
-        
-        # Get only the LATEST emotion log (limit 1 - very fast)
-        last_log = db.query(EmotionLog).filter(
-            EmotionLog.user_id == current_user.id
-        ).order_by(EmotionLog.created_at.desc()).limit(1).first()
-        
-        # Get the active content session for richer dashboard data
-        active_session = db.query(ContentSession).filter(
-            ContentSession.user_id == current_user.id,
-            ContentSession.is_active == True
-        ).order_by(ContentSession.started_at.desc()).limit(1).first()
-        
-        # Determine status
-        is_recording = getattr(user, 'is_recording', False) if user else False
-        status = "Recording" if is_recording else "Idle"
-        
-        # Get emotion/content from last_log (most reliable source)
-        if last_log:
-            emotion = last_log.emotion
-            emotion_intensity = last_log.intensity
-            content = last_log.content_type
-        else:
-            emotion = None
-            emotion_intensity = None
-            content = None
-        
-        # Build content details from active session
-        content_details = None
-        if active_session:
-            # Prefer active session content over EmotionLog (more detailed)
-            if not content or content == 'UNKNOWN':
-                content = active_session.content_type
-            content_details = {
-                'activity': active_session.activity,
-                'activity_emoji': active_session.activity_emoji,
-                'productivity': active_session.productivity,
-                'productivity_emoji': active_session.productivity_emoji,
-                'app_name': active_session.app_name,
-                'duration_seconds': active_session.duration_seconds or 0,
-            }
-        
-        # Debug (reduced frequency)
-        print(f"📊 Dashboard: user={current_user.id}, recording={is_recording}, emotion={emotion}, content={content}, activity={content_details.get('activity') if content_details else None}")
-        
-        return {
-            "current_emotion": emotion,
-            "current_emotion_intensity": emotion_intensity,
-            "current_content": content,
-            "content_details": content_details,
-            "status": status,
-            "last_session": last_log.created_at.isoformat() if last_log else None,
-            "session_summary": None  # Moved to separate endpoint for performance
-        }
+        return user_response_cache.get_or_set(
+            (DASHBOARD_CACHE, current_user.id),
+            lambda: _build_dashboard_state(db, current_user.id)
+        )
     except Exception as e:
         print(f"❌ Dashboard error: {e}")
-        return {
-            "current_emotion": None,
-            "current_emotion_intensity": None,
-            "current_content": None,
-            "status": "Idle",
-            "last_session": None,
-            "session_summary": None
-        }
+        return dict(IDLE_DASHBOARD_STATE)
+
+
+def _dashboard_state_snapshot(user_id: int) -> dict:
+    """_build_dashboard_state with its own session (for the stream, off the event loop)."""
+    db = SessionLocal()
+    try:
+        return _build_dashboard_state(db, user_id)
+    except Exception as e:
+        print(f"❌ Dashboard stream error: {e}")
+        return dict(IDLE_DASHBOARD_STATE)
+    finally:
+        db.close()
+
+
+@app.get("/api/dashboard/stream")
+async def stream_dashboard_status(request: Request, token: str = None):
+    """
+    Server-Sent Events stream of the dashboard status. Sends the current state on
+    connect, then a new `dashboard` event whenever frame analysis, content tracking
+    or recording start/stop change it. EventSource can't set headers, so authenticate
+    with ?token=<jwt> (an Authorization: Bearer header also works).
+    """
+    if not token:
+        auth_header = request.headers.get("authorization", "")
+        if auth_header.lower().startswith("bearer "):
+            token = auth_header[7:]
+    
+    db = SessionLocal()
+    try:
+        current_user = get_user_from_token(token or "", db)
+    finally:
+        db.close()
+    user_id = current_user.id
+    
+    async def events():
+        # Subscribed here, not before the response starts: a client that disconnects
+        # before the first chunk never runs the generator, so its finally wouldn't either
+        changed = dashboard_broadcaster.subscribe(user_id)
+        loop = asyncio.get_running_loop()
+        last_payload = None
+        try:
+            yield f"retry: {int(settings.DASHBOARD_STREAM_RETRY_MS)}\n\n"
+            while True:
+                changed.clear()
+                state = await loop.run_in_executor(None, _dashboard_state_snapshot, user_id)
+                payload = json.dumps(state)
+                if payload != last_payload:
+                    yield f"event: dashboard\ndata: {payload}\n\n"
+                    last_payload = payload
+                
+                # Wait for the next change, sending a comment as keep-alive meanwhile
+                while True:
+                    try:
+                        await asyncio.wait_for(changed.wait(), timeout=settings.DASHBOARD_STREAM_HEARTBEAT_SECONDS)
+                        break
+                    except asyncio.TimeoutError:
+                        if await request.is_disconnected():
+                            return
+                        yield ": keep-alive\n\n"
+                # Coalesce bursts (several frames per second) into one update
+                await asyncio.sleep(settings.DASHBOARD_STREAM_MIN_INTERVAL_SECONDS)
+        finally:
+            dashboard_broadcaster.unsubscribe(user_id, changed)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/api/admin/stats")
 def admin_get_stats(
@@ -2067,56 +2582,22 @@ def admin_get_stats(
     db: Session = Depends(get_db)
 ):
     """Admin: Get comprehensive statistics"""
-    
-    from sqlalchemy import func
-    
-    # Emotion distribution
-    emotion_dist = db.query(
-        EmotionLog.emotion,
-        func.count(EmotionLog.id).label('count')
-    ).group_by(EmotionLog.emotion).all()
-    
-    # Daily activity (last 7 days)
-    from datetime import date, timedelta
-    today = date.today()
-    daily_activity = []
-    
-    for i in range(7):
-        day = today - timedelta(days=i)
-        count = db.query(EmotionLog).filter(
-            func.date(EmotionLog.created_at) == day
-        ).count()
-        daily_activity.append({
-            "date": day.isoformat(),
-            "sessions": count
-        })
-    
-    return {
-        "emotion_distribution": {e: c for e, c in emotion_dist},
-        "daily_activity": daily_activity,
-        "top_users": [
-            {
-                "username": log.username,
-                "session_count": db.query(EmotionLog).filter(
-                    EmotionLog.username == log.username
-                ).count()
-            }
-            for log in db.query(EmotionLog.username).distinct().limit(10).all()
-        ]
-    }
+    return admin_stats_cache.get_or_set("emotion_stats", lambda: admin_stats.emotion_stats(db))
 
 
 @app.get("/api/admin/audit-logs")
 def admin_get_audit_logs(
+    response: Response,
     _: bool = Depends(verify_admin),
     db: Session = Depends(get_db),
     action: str = None,
     status: str = None,
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    cursor: str = None,
+    total: str = "approx"
 ):
     """Admin: Get detailed audit logs with filtering"""
-    from sqlalchemy import desc
     
     print(f"📋 Audit logs request - action: {action}, status: {status}, limit: {limit}")
     
@@ -2129,12 +2610,12 @@ def admin_get_audit_logs(
     if status:
         query = query.filter(AuditLog.status == status)
     
-    # Get total count
-    total_count = query.count()
+    # Get total count (approximate by default, "none" to skip)
+    total_count = _count_total(db, query, total)
     print(f"   Found {total_count} audit logs")
     
     # Get paginated results
-    logs = query.order_by(desc(AuditLog.created_at)).offset(offset).limit(limit).all()
+    logs = _paginate(response, db, query, AuditLog.created_at, AuditLog.id, limit, cursor, offset, None)
     
     def safe_parse_json(details_str):
         """Safely parse JSON details, handling empty strings and invalid JSON"""
@@ -2149,6 +2630,7 @@ def admin_get_audit_logs(
         "total": total_count,
         "limit": limit,
         "offset": offset,
+        "next_cursor": response.headers.get("X-Next-Cursor"),
         "logs": [
             {
                 "id": log.id,
@@ -2171,33 +2653,9 @@ def admin_get_audit_summary(
     db: Session = Depends(get_db)
 ):
     """Admin: Get audit log summary statistics"""
-    from sqlalchemy import func
-    from datetime import date, timedelta
-    
-    # Count by action type
-    action_counts = db.query(
-        AuditLog.action,
-        func.count(AuditLog.id).label('count')
-    ).group_by(AuditLog.action).all()
-    
-    # Count by status
-    status_counts = db.query(
-        AuditLog.status,
-        func.count(AuditLog.id).label('count')
-    ).group_by(AuditLog.status).all()
-    
-    # Activity by day (last 7 days)
-    today = date.today()
-    daily_activity = []
-    for i in range(7):
-        day = today - timedelta(days=i)
-        count = db.query(AuditLog).filter(
-            func.date(AuditLog.created_at) == day
-        ).count()
-        daily_activity.append({
-            "date": day.isoformat(),
-            "count": count
-        })
+    
+    # Totals, breakdowns and daily activity (set-based, cached briefly)
+    counts = admin_stats_cache.get_or_set("audit_counts", lambda: admin_stats.audit_counts(db))
     
     # Recent failed actions
     failed_actions = db.query(AuditLog).filter(
@@ -2214,10 +2672,10 @@ def admin_get_audit_summary(
             return details_str  # Return as plain string if not valid JSON
     
     return {
-        "total_events": db.query(AuditLog).count(),
-        "action_breakdown": {a: c for a, c in action_counts},
-        "status_breakdown": {s: c for s, c in status_counts},
-        "daily_activity": daily_activity,
+        "total_events": counts["total_events"],
+        "action_breakdown": counts["action_breakdown"],
+        "status_breakdown": counts["status_breakdown"],
+        "daily_activity": counts["daily_activity"],
         "recent_failures": [
             {
                 "id": log.id,
@@ -2378,6 +2836,15 @@ def get_recommendations(
     db: Session = Depends(get_db)
 ):
     """Get personalized recommendations based on emotional patterns"""
+    return user_response_cache.get_or_set(
+        (RECOMMENDATIONS_CACHE, current_user.id),
+        lambda: _build_recommendations(db, current_user),
+        ttl_seconds=settings.RECOMMENDATIONS_CACHE_TTL_SECONDS
+    )
+
+
+def _build_recommendations(db: Session, current_user: User) -> dict:
+    """Recommendations from the user's last 20 emotion logs within the past hour."""
     
     is_guest = getattr(current_user, 'is_guest', False)
     
@@ -2389,9 +2856,9 @@ def get_recommendations(
             "trigger_reason": "General wellness tips"
         }
     
-    # Get recent emotion logs (last hour)
+    # Most recent emotion logs (last hour); a LIMIT 20 range scan on (user_id, created_at)
     one_hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
-    recent_logs = db.query(EmotionLog).filter(
+    recent_logs = db.query(EmotionLog.emotion, EmotionLog.intensity).filter(
         EmotionLog.user_id == current_user.id,
         EmotionLog.created_at >= one_hour_ago
     ).order_by(EmotionLog.created_at.desc()).limit(20).all()
@@ -2474,8 +2941,13 @@ def trigger_recommendation(
         if is_guest or current_user.id == 0:
             emotion = 'neutral'
         else:
-            user = db.query(User).filter(User.id == current_user.id).first()
-            emotion = (user.current_emotion or 'neutral').lower()
+            state = live_state.get(current_user.id)
+            if state is not None and 'current_emotion' in state:
+                current_emotion = state['current_emotion']
+            else:
+                user = db.query(User).filter(User.id == current_user.id).first()
+                current_emotion = user.current_emotion if user else None
+            emotion = (current_emotion or 'neutral').lower()
     
     recommendations = WELLNESS_RECOMMENDATIONS.get(emotion, WELLNESS_RECOMMENDATIONS['neutral'])
     
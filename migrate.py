@@ -0,0 +1,213 @@
+"""
+Versioned schema migrations.
+
+Replaces the old one-off scripts (add_columns.py, add_login_lockout_columns.py,
+add_content_sessions_table.py). Applied versions are recorded in the
+schema_migrations table, so running this again only applies what is new. Every
+migration is also idempotent on its own, so databases that already ran the old
+scripts by hand are picked up without errors.
+
+Run:
+    python migrate.py            # apply pending migrations
+    python migrate.py --status   # list applied / pending versions
+
+Index migrations use CREATE INDEX CONCURRENTLY on Postgres, so they don't block
+writes to emotion_logs / content_sessions while they build.
+"""
+import argparse
+import sys
+from datetime import datetime, timezone
+from typing import Callable, List, Set, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+
+import rollups
+from database import engine
+from models import ContentSession, ContentSessionRollup, EmotionLog, EmotionRollup, RollupWatermark, User
+
+
+def _is_postgres(conn: Connection) -> bool:
+    return conn.dialect.name == "postgresql"
+
+
+def _add_missing_columns(conn: Connection, table: str, columns: List[Tuple[str, str]]) -> None:
+    """ALTER TABLE ... ADD COLUMN for each (name, ddl type) not present yet."""
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    for name, ddl in columns:
+        if name in existing:
+            print(f"   ℹ️ {table}.{name} already exists")
+            continue
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+        print(f"   ✅ Added {table}.{name}")
+
+
+def _create_model_indexes(conn: Connection, model, names: List[str]) -> None:
+    """
+    Create indexes declared on a model (by name) if they don't exist yet.
+    On Postgres this runs CREATE INDEX CONCURRENTLY, which must be outside a transaction.
+    """
+    indexes = {idx.name: idx for idx in model.__table__.indexes}
+    for name in names:
+        ddl = str(CreateIndex(indexes[name], if_not_exists=True).compile(dialect=conn.dialect))
+        if _is_postgres(conn):
+            # A failed concurrent build leaves an INVALID index behind; drop it and rebuild
+            invalid = conn.execute(text(
+                "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ), {"name": name}).first()
+            if invalid:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            ddl = ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+        conn.execute(text(ddl))
+        print(f"   ✅ Index {name}")
+
+
+# ==================== MIGRATIONS ====================
+
+def m0001_user_current_state(conn: Connection) -> None:
+    """Current state tracking columns on users (was add_columns.py)"""
+    _add_missing_columns(conn, "users", [
+        ("current_emotion", "VARCHAR(50)"),
+        ("current_emotion_intensity", "FLOAT"),
+        ("current_content", "VARCHAR(50)"),
+        ("last_activity", "TIMESTAMP WITH TIME ZONE"),
+        ("is_recording", "BOOLEAN DEFAULT FALSE NOT NULL"),
+    ])
+
+
+def m0002_login_lockout(conn: Connection) -> None:
+    """Login lockout columns on users (was add_login_lockout_columns.py)"""
+    _add_missing_columns(conn, "users", [
+        ("failed_login_attempts", "INTEGER DEFAULT 0 NOT NULL"),
+        ("account_locked_until", "TIMESTAMP WITH TIME ZONE NULL"),
+    ])
+
+
+def m0003_content_sessions(conn: Connection) -> None:
+    """content_sessions table for activity time tracking (was add_content_sessions_table.py)"""
+    if inspect(conn).has_table("content_sessions"):
+        print("   ℹ️ content_sessions already exists")
+        return
+    # New (empty) table, so its indexes can be built inline with it
+    ContentSession.__table__.create(conn)
+    print("   ✅ Created content_sessions")
+
+
+def m0004_hot_path_indexes(conn: Connection) -> None:
+    """Composite / covering indexes for the dashboard, history and summary queries"""
+    _create_model_indexes(conn, EmotionLog, [
+        "ix_emotion_logs_user_id_created_at",
+        "ix_emotion_logs_created_at",
+    ])
+    _create_model_indexes(conn, ContentSession, [
+        "ix_content_sessions_user_active",
+        "ix_content_sessions_user_started",
+    ])
+
+
+def m0005_content_session_rollups(conn: Connection) -> None:
+    """Hourly content session rollups + backfill from existing sessions"""
+    _add_missing_columns(conn, "content_sessions", [
+        ("rolled_up_seconds", "INTEGER DEFAULT 0 NOT NULL"),
+    ])
+    if not inspect(conn).has_table("content_session_rollups"):
+        ContentSessionRollup.__table__.create(conn)
+        print("   ✅ Created content_session_rollups")
+    with Session(bind=conn) as db:
+        count = rollups.rebuild(db)
+        db.flush()
+    print(f"   ✅ Backfilled rollups from {count} session(s)")
+
+
+def m0006_emotion_rollups(conn: Connection) -> None:
+    """Hourly emotion rollups + compaction watermark (filled by the background compactor)"""
+    for table in (EmotionRollup.__table__, RollupWatermark.__table__):
+        if inspect(conn).has_table(table.name):
+            print(f"   ℹ️ {table.name} already exists")
+            continue
+        table.create(conn)
+        print(f"   ✅ Created {table.name}")
+
+
+# (version, function, runs outside a transaction)
+MIGRATIONS: List[Tuple[str, Callable[[Connection], None], bool]] = [
+    ("0001_user_current_state", m0001_user_current_state, False),
+    ("0002_login_lockout", m0002_login_lockout, False),
+    ("0003_content_sessions", m0003_content_sessions, False),
+    ("0004_hot_path_indexes", m0004_hot_path_indexes, True),
+    ("0005_content_session_rollups", m0005_content_session_rollups, False),
+    ("0006_emotion_rollups", m0006_emotion_rollups, False),
+]
+
+
+# ==================== RUNNER ====================
+
+def ensure_migrations_table() -> None:
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version VARCHAR(100) PRIMARY KEY, "
+            "applied_at TIMESTAMP WITH TIME ZONE NOT NULL)"
+        ))
+
+
+def applied_versions() -> Set[str]:
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def record_version(conn: Connection, version: str) -> None:
+    conn.execute(
+        text("INSERT INTO schema_migrations (version, applied_at) VALUES (:version, :applied_at)"),
+        {"version": version, "applied_at": datetime.now(timezone.utc)}
+    )
+
+
+def migrate() -> int:
+    """Apply all pending migrations in order. Returns how many were applied."""
+    if not inspect(engine).has_table(User.__tablename__):
+        print("❌ users table not found - start the API once (create_all) before migrating")
+        sys.exit(1)
+
+    ensure_migrations_table()
+    done = applied_versions()
+    pending = [m for m in MIGRATIONS if m[0] not in done]
+    if not pending:
+        print("✅ Database is up to date")
+        return 0
+
+    for version, fn, non_transactional in pending:
+        print(f"▶️ Applying {version}: {fn.__doc__}")
+        if non_transactional:
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                fn(conn)
+                record_version(conn, version)
+        else:
+            with engine.begin() as conn:
+                fn(conn)
+                record_version(conn, version)
+
+    print(f"\n✅ Applied {len(pending)} migration(s)")
+    return len(pending)
+
+
+def status() -> None:
+    ensure_migrations_table()
+    done = applied_versions()
+    for version, fn, _ in MIGRATIONS:
+        mark = "✅" if version in done else "⏳"
+        print(f"{mark} {version}: {fn.__doc__}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply NeuroLens schema migrations")
+    parser.add_argument("--status", action="store_true", help="Show applied and pending migrations")
+    args = parser.parse_args()
+
+    if args.status:
+        status()
+    else:
+        migrate()
@@ -0,0 +1,69 @@
+"""
+Helpers for evaluating emotion model variants on a labelled folder of face crops.
+
+Expected layout (folder names are emotion labels, as in EmotionDetector.emotions):
+    samples/
+        happy/001.jpg
+        sad/002.png
+        ...
+"""
+import os
+import statistics
+import time
+from typing import Any, Dict, List, Tuple
+
+import cv2
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def list_images(folder: str) -> List[str]:
+    """All image paths directly inside folder, sorted."""
+    return [
+        os.path.join(folder, name)
+        for name in sorted(os.listdir(folder))
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+
+
+def load_face_crops(folder: str) -> List[Any]:
+    """Load every image in folder as a grayscale face crop (unlabelled, e.g. for calibration)."""
+    crops = []
+    for path in list_images(folder):
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is not None:
+            crops.append(image)
+    return crops
+
+
+def load_labelled_faces(folder: str, emotions: List[str]) -> List[Tuple[str, Any]]:
+    """Load (label, grayscale crop) pairs from one sub-folder per emotion."""
+    samples = []
+    for label in emotions:
+        label_dir = os.path.join(folder, label)
+        if not os.path.isdir(label_dir):
+            continue
+        samples.extend((label, crop) for crop in load_face_crops(label_dir))
+    return samples
+
+
+def evaluate_detector(detector: Any, samples: List[Tuple[str, Any]], warmup: int = 3) -> Dict[str, Any]:
+    """Top-1 accuracy and per-crop latency (batch size 1) of detector.predict_emotion."""
+    for _, crop in samples[:warmup]:
+        detector.predict_emotion(crop)
+
+    latencies_ms = []
+    correct = 0
+    for label, crop in samples:
+        start = time.perf_counter()
+        result = detector.predict_emotion(crop)
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+        correct += int(result['emotion'] == label)
+
+    ordered = sorted(latencies_ms)
+    return {
+        'samples': len(samples),
+        'accuracy': correct / len(samples) if samples else 0.0,
+        'mean_ms': statistics.mean(latencies_ms) if latencies_ms else 0.0,
+        'p95_ms': ordered[min(len(ordered) - 1, int(0.95 * (len(ordered) - 1)))] if ordered else 0.0,
+    }
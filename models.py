@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Text, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from database import Base
 
@@ -53,6 +53,13 @@ class EmotionLog(Base):
     is_guest = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # Dashboard "latest emotion" and history: user_id = ? ORDER BY created_at DESC
+        Index('ix_emotion_logs_user_id_created_at', 'user_id', 'created_at'),
+        # Admin time-range stats across all users
+        Index('ix_emotion_logs_created_at', 'created_at'),
+    )
+
 
 class AnalysisSession(Base):
     __tablename__ = "analysis_sessions"
@@ -97,11 +104,76 @@ class ContentSession(Base):
     started_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     ended_at = Column(DateTime(timezone=True), nullable=True)
     duration_seconds = Column(Integer, nullable=True)               # computed when session ends
+    rolled_up_seconds = Column(Integer, default=0, server_default='0', nullable=False)  # seconds already in content_session_rollups
     
     is_active = Column(Boolean, default=True)                       # is this session still ongoing?
     is_guest = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # Active session lookup: user_id = ? AND is_active ORDER BY started_at DESC
+        Index('ix_content_sessions_user_active', 'user_id', 'is_active', 'started_at'),
+        # Summary: user_id = ? AND started_at >= cutoff, grouped by content/activity/productivity.
+        # INCLUDE makes it covering on Postgres (index-only scan, no heap visits).
+        Index(
+            'ix_content_sessions_user_started', 'user_id', 'started_at',
+            postgresql_include=[
+                'content_type', 'activity', 'activity_emoji', 'productivity',
+                'productivity_emoji', 'duration_seconds', 'id'
+            ]
+        ),
+    )
+
+
+class ContentSessionRollup(Base):
+    """Per-user, per-hour time and session counts by content type / activity / productivity"""
+    __tablename__ = "content_session_rollups"
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    bucket_start = Column(DateTime(timezone=True), nullable=False)   # start of the UTC hour
+    dimension = Column(String(20), nullable=False)                   # content_type, activity or productivity
+    key = Column(String(50), nullable=False)                         # e.g. CODING ('' when unknown)
+    emoji = Column(String(10), nullable=False, default='')
+    total_seconds = Column(Integer, nullable=False, default=0)
+    session_count = Column(Integer, nullable=False, default=0)       # sessions that started in this hour
+
+    __table_args__ = (
+        # Upsert target, and serves user_id = ? AND bucket_start >= ? range reads
+        UniqueConstraint('user_id', 'bucket_start', 'dimension', 'key', 'emoji',
+                         name='uq_content_session_rollups_bucket'),
+    )
+
+
+class EmotionRollup(Base):
+    """Per-user emotion counts and intensity sums per hour"""
+    __tablename__ = "emotion_rollups"
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    username = Column(String(255), nullable=False)
+    is_guest = Column(Boolean, nullable=False, default=False)
+    bucket_start = Column(DateTime(timezone=True), nullable=False)   # start of the UTC hour
+    emotion = Column(String(50), nullable=False)
+    sample_count = Column(Integer, nullable=False, default=0)
+    intensity_sum = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        # Upsert target, and serves user_id = ? AND bucket_start >= ? reads
+        UniqueConstraint('user_id', 'bucket_start', 'emotion', name='uq_emotion_rollups_bucket'),
+        # Cross-user charts (admin stats)
+        Index('ix_emotion_rollups_bucket', 'bucket_start'),
+    )
+
+
+class RollupWatermark(Base):
+    """Highest source row id already folded into a rollup table"""
+    __tablename__ = "rollup_watermarks"
+    
+    name = Column(String(50), primary_key=True)
+    last_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 
 class AuditLog(Base):
     """Store all system audit events for admin review"""
@@ -0,0 +1,90 @@
+"""
+Keyset (cursor) pagination for the history and log listing endpoints.
+
+OFFSET pagination makes the database walk and discard every row before the page,
+so deep pages get linearly slower. Here pages are ordered by (timestamp, id)
+descending and the next page starts strictly after the last row returned, which
+the (…, created_at) indexes serve as a range scan at any depth. The position is
+handed to clients as an opaque cursor token (X-Next-Cursor / next_cursor).
+
+Totals are optional: "exact" runs COUNT(*), "approx" uses the planner's row
+estimate on Postgres (exact elsewhere), "none" skips counting.
+
+SQLite stores datetimes as text in two shapes: rows stamped by server_default=func.now()
+read "YYYY-MM-DD HH:MM:SS", rows written through SQLAlchemy "YYYY-MM-DD HH:MM:SS.ffffff".
+Those don't compare correctly as strings (against each other or the cursor), so on SQLite
+the sort column is ordered and compared through strftime in one format instead.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Query, Session
+
+TOTAL_MODES = ('exact', 'approx', 'none')
+SQLITE_TIME_FORMAT = '%Y-%m-%d %H:%M:%f'
+
+
+class InvalidCursorError(ValueError):
+    """Cursor token could not be decoded."""
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    payload = json.dumps({"t": sort_value.isoformat(), "i": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime, int]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["t"]), int(payload["i"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {token!r}") from e
+
+
+def paginate(query: Query, sort_column: Any, id_column: Any, limit: int,
+             cursor: Optional[str] = None, offset: int = 0) -> Tuple[List[Any], Optional[str]]:
+    """
+    One page of query, newest first. With a cursor the page starts after it (offset is
+    ignored); without one, offset still works for older clients. Returns
+    (rows, next cursor or None on the last page).
+    """
+    sqlite = query.session.get_bind().dialect.name == 'sqlite'
+    sort_key = func.strftime(SQLITE_TIME_FORMAT, sort_column) if sqlite else sort_column
+    query = query.order_by(sort_key.desc(), id_column.desc())
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        if sqlite:
+            sort_value = func.strftime(SQLITE_TIME_FORMAT, sort_value.strftime('%Y-%m-%d %H:%M:%S.%f'))
+        # Expanded form of (sort, id) < (sort_value, row_id) so the sort index is a range scan
+        query = query.filter(
+            sort_key <= sort_value,
+            or_(sort_key < sort_value, and_(sort_key == sort_value, id_column < row_id))
+        )
+    elif offset:
+        query = query.offset(offset)
+
+    limit = max(1, limit)
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+
+
+def count_total(db: Session, query: Query, mode: str = 'exact') -> Optional[int]:
+    """Total rows matching query per mode ('exact', 'approx' or 'none')."""
+    if mode == 'none':
+        return None
+    if mode == 'approx' and db.get_bind().dialect.name == 'postgresql':
+        compiled = query.statement.compile(dialect=db.get_bind().dialect)
+        plan = db.connection().exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+        ).scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        return int(plan[0]["Plan"]["Plan Rows"])
+    return query.count()
@@ -0,0 +1,195 @@
+"""
+Argon2 password hashing off the request workers.
+
+Argon2 is deliberately expensive (tens of milliseconds of CPU and a large memory
+block per call). Run inline in the login, signup, reset and change-password
+handlers, a burst of logins pinned every worker thread and stalled frame
+ingestion. PasswordHashPool runs the hashing in a small dedicated process pool
+with its own bounded queue, and ConcurrencyLimiter caps in-flight password
+checks per client IP and per account before any hashing starts.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(password: str) -> str:
+    from encryption import EncryptionService
+    return EncryptionService.hash_password(password)
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    from encryption import EncryptionService
+    return EncryptionService.verify_password(password, hashed_password)
+
+
+def _warm_up() -> None:
+    import encryption  # noqa: F401 - loads passlib/argon2 in the worker
+
+
+class PasswordHashBusyError(RuntimeError):
+    """Raised when the password hashing queue is full."""
+
+
+class PasswordHashPool:
+    """
+    Process pool for Argon2 hash/verify. At most max_workers + max_queue calls are
+    admitted at once; anything beyond that raises PasswordHashBusyError immediately
+    instead of queueing. With max_workers=0 hashing runs inline in the caller's
+    thread (the old behaviour), still behind the same admission limit.
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 16):
+        self.max_workers = max(0, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.capacity = max(1, self.max_workers + self.max_queue)
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+        # Stats
+        self._hashes = 0
+        self._verifies = 0
+        self._rejected = 0
+        self._restarts = 0
+
+    def start(self) -> None:
+        """Spawn the worker processes (no-op if running or running inline)."""
+        with self._lock:
+            if self.max_workers == 0 or self._executor is not None:
+                return
+            # spawn, not fork: the server process holds threads and the loaded model.
+            # Workers import only this module (plus whatever script launched the server,
+            # which is why the app is started with `uvicorn main:app`)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            executor = self._executor
+        for future in [executor.submit(_warm_up) for _ in range(self.max_workers)]:
+            future.result()
+        logger.info(f"✅ Password hash pool started (workers={self.max_workers}, max_queue={self.max_queue})")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def hash(self, password: str) -> str:
+        """Argon2 hash of password. Raises PasswordHashBusyError when saturated."""
+        result = self._run(_hash, password)
+        self._hashes += 1
+        return result
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        """Check password against an Argon2 hash. Raises PasswordHashBusyError when saturated."""
+        result = self._run(_verify, password, hashed_password)
+        self._verifies += 1
+        return result
+
+    def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise PasswordHashBusyError(f"Password hashing queue full ({self.capacity} in flight)")
+        with self._lock:
+            self._in_flight += 1
+        try:
+            if self.max_workers == 0:
+                return fn(*args)
+            if self._executor is None:
+                self.start()
+            try:
+                return self._executor.submit(fn, *args).result()
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed); replace the pool and retry once
+                logger.error("Password hash pool broken, restarting")
+                self._restart()
+                return self._executor.submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def _restart(self) -> None:
+        with self._lock:
+            broken, self._executor = self._executor, None
+            self._restarts += 1
+        if broken is not None:
+            broken.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def stats(self) -> Dict[str, Any]:
+        """Admission counters for monitoring."""
+        return {
+            "workers": self.max_workers,
+            "capacity": self.capacity,
+            "in_flight": self._in_flight,
+            "hashes": self._hashes,
+            "verifies": self._verifies,
+            "rejected": self._rejected,
+            "restarts": self._restarts,
+        }
+
+
+class ConcurrencyLimiter:
+    """
+    Caps concurrent operations per key (client IP, account). acquire() never
+    blocks: it returns False when the key is already at its limit. A limit of
+    0 disables the check.
+    """
+
+    def __init__(self, limit: int, name: str = "limiter"):
+        self.limit = max(0, int(limit))
+        self.name = name
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        # Stats
+        self._rejected = 0
+
+    def acquire(self, key: str) -> bool:
+        with self._lock:
+            count = self._counts.get(key, 0)
+            if self.limit and count >= self.limit:
+                self._rejected += 1
+                return False
+            self._counts[key] = count + 1
+            return True
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            count = self._counts.get(key, 0) - 1
+            if count > 0:
+                self._counts[key] = count
+            else:
+                self._counts.pop(key, None)
+
+    @contextmanager
+    def hold(self, key: str) -> Iterator[bool]:
+        """Context manager form; yields whether the slot was granted."""
+        granted = self.acquire(key)
+        try:
+            yield granted
+        finally:
+            if granted:
+                self.release(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            active_keys = len(self._counts)
+            in_flight = sum(self._counts.values())
+        return {
+            "limit": self.limit,
+            "active_keys": active_keys,
+            "in_flight": in_flight,
+            "rejected": self._rejected,
+        }
@@ -0,0 +1,137 @@
+"""
+Produce an INT8 variant of the exported ONNX emotion model for CPU serving, and
+report accuracy vs latency against the float model on a labelled sample set.
+
+Run:
+    python export_emotion_model.py --checkpoint models/74.pth --format onnx --output models/emotion.onnx
+    python quantize_emotion_model.py --model models/emotion.onnx --output models/emotion_int8.onnx \
+        --calibration data/face_crops --eval-set data/labelled_faces
+
+Static quantization (default) calibrates activation ranges on the face crops in
+--calibration; --method dynamic only quantizes weights and needs no calibration data.
+Serve the result with EMOTION_MODEL_RUNTIME=onnx and EMOTION_MODEL_ARTIFACT=<output>.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from onnxruntime.quantization import (
+    CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+from emotion_model import EmotionDetector
+from model_eval import evaluate_detector, load_face_crops, load_labelled_faces
+
+
+class FaceCropCalibrationReader(CalibrationDataReader):
+    """Feeds preprocessed face crops to the ONNX Runtime calibrator, one at a time."""
+
+    def __init__(self, detector, crops, input_name):
+        self._batches = iter([
+            {input_name: detector.preprocess_faces([crop])}
+            for crop in crops
+        ])
+
+    def get_next(self):
+        return next(self._batches, None)
+
+
+def load_onnx_detector(model_path):
+    """
+    EmotionDetector running model_path under ONNX Runtime; exits if it can't. The
+    detector falls back to the eager checkpoint (or mock predictions) when an
+    artifact fails to load, which would make the calibration or report meaningless.
+    """
+    try:
+        detector = EmotionDetector(runtime="onnx", artifact_path=model_path, face_tracking=False)
+    except RuntimeError as e:
+        print(f"❌ Could not load {model_path} with ONNX Runtime: {e}")
+        sys.exit(1)
+    if detector.model is None or detector.runtime != "onnx":
+        print(f"❌ Could not load {model_path} with ONNX Runtime (detector fell back to {detector.runtime})")
+        sys.exit(1)
+    return detector
+
+
+def quantize(model_path, output_path, method, calibration_dir, max_calibration):
+    if method == "dynamic":
+        quantize_dynamic(model_path, output_path, weight_type=QuantType.QInt8)
+        return
+
+    crops = load_face_crops(calibration_dir)[:max_calibration]
+    if not crops:
+        print(f"❌ No calibration images found in {calibration_dir}")
+        sys.exit(1)
+    print(f"📏 Calibrating on {len(crops)} face crops...")
+
+    # Float detector only used for preprocessing + the ONNX input name
+    detector = load_onnx_detector(model_path)
+    reader = FaceCropCalibrationReader(detector, crops, detector.model.get_inputs()[0].name)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        prepared = os.path.join(tmp, "prepared.onnx")
+        quant_pre_process(model_path, prepared)
+        quantize_static(
+            prepared, output_path, reader,
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8
+        )
+
+
+def report(float_path, int8_path, eval_dir):
+    float_detector = load_onnx_detector(float_path)
+    int8_detector = load_onnx_detector(int8_path)
+
+    samples = load_labelled_faces(eval_dir, float_detector.emotions)
+    if not samples:
+        print(f"⚠️ No labelled samples found in {eval_dir}, skipping report")
+        return
+
+    results = {
+        "float32": evaluate_detector(float_detector, samples),
+        "int8": evaluate_detector(int8_detector, samples),
+    }
+    size_mb = {
+        "float32": os.path.getsize(float_path) / 1e6,
+        "int8": os.path.getsize(int8_path) / 1e6,
+    }
+
+    print("=" * 70)
+    print(f"ACCURACY vs LATENCY — {len(samples)} labelled face crops (batch size 1)")
+    print("=" * 70)
+    print(f"  {'Model':<8} {'accuracy':>9} {'mean ms':>9} {'p95 ms':>9} {'size MB':>9}")
+    print(f"  {'-'*8} {'-'*9} {'-'*9} {'-'*9} {'-'*9}")
+    for name, r in results.items():
+        print(f"  {name:<8} {r['accuracy']:>8.1%} {r['mean_ms']:>9.2f} {r['p95_ms']:>9.2f} {size_mb[name]:>9.1f}")
+
+    speedup = results["float32"]["mean_ms"] / results["int8"]["mean_ms"] if results["int8"]["mean_ms"] else 0
+    drop = (results["float32"]["accuracy"] - results["int8"]["accuracy"]) * 100
+    print(f"\n  INT8 speedup: {speedup:.2f}x | accuracy change: {-drop:+.1f} pts")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8-quantize the ONNX emotion model")
+    parser.add_argument("--model", required=True, help="Float32 ONNX model (from export_emotion_model.py)")
+    parser.add_argument("--output", required=True, help="INT8 ONNX output path")
+    parser.add_argument("--method", choices=["static", "dynamic"], default="static")
+    parser.add_argument("--calibration", help="Folder of face crops for static calibration")
+    parser.add_argument("--max-calibration", type=int, default=500)
+    parser.add_argument("--eval-set", help="Labelled folder (one sub-folder per emotion) for the report")
+    args = parser.parse_args()
+
+    if args.method == "static" and not args.calibration:
+        parser.error("--calibration is required for static quantization")
+
+    quantize(args.model, args.output, args.method, args.calibration, args.max_calibration)
+    print(f"📦 INT8 model written to {args.output}")
+
+    if args.eval_set:
+        report(args.model, args.output, args.eval_set)
+
+
+if __name__ == "__main__":
+    main()
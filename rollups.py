@@ -0,0 +1,257 @@
+"""
+Hourly rollups of content session time.
+
+/api/content/sessions/summary used to run three GROUP BY scans over content_sessions
+on every call. Instead, session time is added to content_session_rollups as it
+accrues: each ContentSession remembers how many of its seconds are already rolled
+up (rolled_up_seconds), and every time its duration is extended or it closes, only
+the new seconds are sliced into the UTC hours they happened in. Session counts go to
+the hour the session started. The summary then reads a handful of rollup rows per
+hour in the window and adds the still-open session's unaccounted time.
+
+Run `python rollups.py` to rebuild every user's rollups from content_sessions.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, literal
+from sqlalchemy.orm import Session
+
+from models import ContentSession, ContentSessionRollup
+
+# dimension -> (ContentSession key column, emoji column)
+DIMENSIONS = {
+    'content_type': ('content_type', None),
+    'activity': ('activity', 'activity_emoji'),
+    'productivity': ('productivity', 'productivity_emoji'),
+}
+
+# (user_id, bucket_start, dimension, key, emoji) -> [seconds, sessions]
+_Deltas = Dict[Tuple[int, datetime, str, str, str], List[int]]
+
+
+def _as_utc(dt: datetime) -> datetime:
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+def hour_floor(dt: datetime) -> datetime:
+    return _as_utc(dt).replace(minute=0, second=0, microsecond=0)
+
+
+def _hour_slices(start: datetime, end: datetime) -> Iterator[Tuple[datetime, int]]:
+    """Split [start, end) into (hour bucket, whole seconds in that hour)."""
+    cursor = _as_utc(start)
+    end = _as_utc(end)
+    while cursor < end:
+        bucket = hour_floor(cursor)
+        slice_end = min(end, bucket + timedelta(hours=1))
+        seconds = int((slice_end - bucket).total_seconds()) - int((cursor - bucket).total_seconds())
+        if seconds > 0:
+            yield bucket, seconds
+        cursor = slice_end
+
+
+def _session_keys(session: Any) -> List[Tuple[str, str, str]]:
+    keys = []
+    for dimension, (key_attr, emoji_attr) in DIMENSIONS.items():
+        key = getattr(session, key_attr) or ''
+        emoji = (getattr(session, emoji_attr) or '') if emoji_attr else ''
+        keys.append((dimension, key[:50], emoji[:10]))
+    return keys
+
+
+def _add_session_deltas(deltas: _Deltas, session: Any, count_start: bool, target_seconds: int) -> int:
+    """
+    Accumulate the session's seconds between rolled_up_seconds and target_seconds (and
+    optionally its start) into deltas. Returns the new rolled-up total.
+    """
+    keys = _session_keys(session)
+    started_at = _as_utc(session.started_at)
+
+    if count_start:
+        bucket = hour_floor(started_at)
+        for dimension, key, emoji in keys:
+            deltas[(session.user_id, bucket, dimension, key, emoji)][1] += 1
+
+    accounted = session.rolled_up_seconds or 0
+    if target_seconds <= accounted:
+        return accounted
+    start = started_at + timedelta(seconds=accounted)
+    end = started_at + timedelta(seconds=target_seconds)
+    for bucket, seconds in _hour_slices(start, end):
+        for dimension, key, emoji in keys:
+            deltas[(session.user_id, bucket, dimension, key, emoji)][0] += seconds
+    return target_seconds
+
+
+def upsert_increment(db: Session, table: Any, rows: List[Dict[str, Any]],
+                     key_columns: List[str], increment_columns: List[str]) -> None:
+    """
+    Insert rows, or add their increment_columns onto the existing row with the same
+    key_columns (INSERT ... ON CONFLICT DO UPDATE on Postgres / SQLite). key_columns
+    must match a unique constraint on table.
+    """
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        _upsert_portable(db, table, rows, key_columns, increment_columns)
+        return
+
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={c: table.c[c] + stmt.excluded[c] for c in increment_columns}
+    )
+    db.execute(stmt, rows)
+
+
+def _upsert_portable(db: Session, table: Any, rows: List[Dict[str, Any]],
+                     key_columns: List[str], increment_columns: List[str]) -> None:
+    for row in rows:
+        match = [table.c[c] == row[c] for c in key_columns]
+        updated = db.execute(
+            table.update().where(*match).values({c: table.c[c] + row[c] for c in increment_columns})
+        ).rowcount
+        if not updated:
+            db.execute(table.insert().values(row))
+
+
+def _apply(db: Session, deltas: _Deltas) -> None:
+    rows = [
+        {
+            'user_id': user_id, 'bucket_start': bucket, 'dimension': dimension,
+            'key': key, 'emoji': emoji, 'total_seconds': seconds, 'session_count': sessions,
+        }
+        for (user_id, bucket, dimension, key, emoji), (seconds, sessions) in deltas.items()
+    ]
+    upsert_increment(
+        db, ContentSessionRollup.__table__, rows,
+        key_columns=['user_id', 'bucket_start', 'dimension', 'key', 'emoji'],
+        increment_columns=['total_seconds', 'session_count']
+    )
+
+
+def record_session_start(db: Session, session: ContentSession) -> None:
+    """Count a newly opened session in the hour it started."""
+    deltas: _Deltas = defaultdict(lambda: [0, 0])
+    _add_session_deltas(deltas, session, count_start=True, target_seconds=0)
+    _apply(db, deltas)
+
+
+def roll_forward(db: Session, session: ContentSession) -> int:
+    """
+    Add the session's seconds beyond rolled_up_seconds (up to duration_seconds) to the
+    rollups. Call after extending or closing a session. Returns the seconds added.
+    """
+    before = session.rolled_up_seconds or 0
+    deltas: _Deltas = defaultdict(lambda: [0, 0])
+    session.rolled_up_seconds = _add_session_deltas(
+        deltas, session, count_start=False, target_seconds=session.duration_seconds or 0
+    )
+    _apply(db, deltas)
+    return session.rolled_up_seconds - before
+
+
+def summarize(db: Session, user_id: int, since: datetime,
+              now: Optional[datetime] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Totals per dimension since the start of the hour containing `since`, including the
+    open session's time that has not been rolled up yet.
+    Returns {dimension: [{'key', 'emoji', 'total_seconds', 'session_count'}, ...]}.
+    """
+    now = _as_utc(now or datetime.now(timezone.utc))
+    totals: Dict[Tuple[str, str, str], List[int]] = defaultdict(lambda: [0, 0])
+
+    rows = db.query(
+        ContentSessionRollup.dimension,
+        ContentSessionRollup.key,
+        ContentSessionRollup.emoji,
+        func.sum(ContentSessionRollup.total_seconds),
+        func.sum(ContentSessionRollup.session_count)
+    ).filter(
+        ContentSessionRollup.user_id == user_id,
+        ContentSessionRollup.bucket_start >= hour_floor(since)
+    ).group_by(
+        ContentSessionRollup.dimension, ContentSessionRollup.key, ContentSessionRollup.emoji
+    ).all()
+    for dimension, key, emoji, seconds, sessions in rows:
+        totals[(dimension, key, emoji)][0] += int(seconds or 0)
+        totals[(dimension, key, emoji)][1] += int(sessions or 0)
+
+    # Live open session: time since it was last rolled up
+    open_session = db.query(ContentSession).filter(
+        ContentSession.user_id == user_id,
+        ContentSession.is_active == True
+    ).order_by(ContentSession.started_at.desc()).first()
+    if open_session is not None and open_session.started_at is not None:
+        elapsed = int((now - _as_utc(open_session.started_at)).total_seconds())
+        unaccounted = elapsed - (open_session.rolled_up_seconds or 0)
+        if unaccounted > 0:
+            for key in _session_keys(open_session):
+                totals[key][0] += unaccounted
+
+    summary: Dict[str, List[Dict[str, Any]]] = {dimension: [] for dimension in DIMENSIONS}
+    for (dimension, key, emoji), (seconds, sessions) in totals.items():
+        summary[dimension].append({
+            'key': key or None,
+            'emoji': emoji or None,
+            'total_seconds': seconds,
+            'session_count': sessions,
+        })
+    for items in summary.values():
+        items.sort(key=lambda item: item['total_seconds'], reverse=True)
+    return summary
+
+
+def rebuild(db: Session, user_id: Optional[int] = None, batch_size: int = 1000) -> int:
+    """
+    Recompute rollups from content_sessions (all users, or one). Used for the initial
+    backfill and to repair drift. Returns the number of sessions processed.
+    """
+    rollups = db.query(ContentSessionRollup)
+    sessions = db.query(
+        ContentSession.user_id, ContentSession.started_at, ContentSession.duration_seconds,
+        ContentSession.content_type, ContentSession.activity, ContentSession.activity_emoji,
+        ContentSession.productivity, ContentSession.productivity_emoji,
+        literal(0).label('rolled_up_seconds')
+    ).filter(ContentSession.started_at.isnot(None)).order_by(ContentSession.id)
+    marked = db.query(ContentSession)
+    if user_id is not None:
+        rollups = rollups.filter(ContentSessionRollup.user_id == user_id)
+        sessions = sessions.filter(ContentSession.user_id == user_id)
+        marked = marked.filter(ContentSession.user_id == user_id)
+    rollups.delete(synchronize_session=False)
+
+    processed = 0
+    deltas: _Deltas = defaultdict(lambda: [0, 0])
+    for session in sessions.yield_per(batch_size):
+        _add_session_deltas(deltas, session, count_start=True, target_seconds=session.duration_seconds or 0)
+        processed += 1
+        if processed % batch_size == 0:
+            _apply(db, deltas)
+            deltas.clear()
+    _apply(db, deltas)
+
+    marked.update(
+        {ContentSession.rolled_up_seconds: func.coalesce(ContentSession.duration_seconds, 0)},
+        synchronize_session=False
+    )
+    return processed
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        count = rebuild(db)
+        db.commit()
+        print(f"✅ Rebuilt content session rollups from {count} session(s)")
+    finally:
+        db.close()
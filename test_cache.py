@@ -0,0 +1,52 @@
+"""
+Tests for the in-process TTL cache.
+
+Run: python -m pytest -q test_cache.py
+"""
+import threading
+
+from cache import TTLCache
+
+
+def test_get_or_set_caches_until_invalidated():
+    cache = TTLCache(maxsize=4, ttl_seconds=60)
+    calls = []
+    compute = lambda: calls.append(1) or len(calls)
+    assert cache.get_or_set("k", compute) == 1
+    assert cache.get_or_set("k", compute) == 1
+    cache.invalidate("k")
+    assert cache.get_or_set("k", compute) == 2
+
+
+def test_value_computed_across_an_invalidation_is_not_cached():
+    cache = TTLCache(maxsize=4, ttl_seconds=60)
+    reading, written = threading.Event(), threading.Event()
+
+    def slow_read():
+        # Reads the old state, then a writer commits and invalidates before we store
+        reading.set()
+        written.wait(5)
+        return "stale"
+
+    reader = threading.Thread(target=lambda: cache.get_or_set(("dashboard", 1), slow_read))
+    reader.start()
+    reading.wait(5)
+    cache.invalidate(("dashboard", 1))
+    written.set()
+    reader.join()
+
+    assert cache.get(("dashboard", 1)) is None
+    assert cache.stats()["stale_fills"] == 1
+    assert cache.get_or_set(("dashboard", 1), lambda: "fresh") == "fresh"
+    assert cache.get(("dashboard", 1)) == "fresh"
+
+
+def test_invalidate_where_drops_fills_in_progress():
+    cache = TTLCache(maxsize=4, ttl_seconds=60)
+
+    def compute():
+        cache.invalidate_where(lambda key: key[1] == 7)
+        return "stale"
+
+    assert cache.get_or_set(("recommendations", 7), compute) == "stale"
+    assert cache.get(("recommendations", 7)) is None
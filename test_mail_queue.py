@@ -0,0 +1,163 @@
+"""
+Tests for the spooled outbound mail queue, against the local SMTP stand-in from
+benchmark_mail_queue.py (no real mail leaves the machine).
+
+Run: python -m pytest -q test_mail_queue.py
+"""
+import os
+import threading
+import time
+
+import pytest
+
+from benchmark_mail_queue import SENDER, StandInSMTPServer
+from mail_queue import CLAIM_SUFFIX, MailQueue, SMTPConnectionPool
+
+
+@pytest.fixture
+def smtp():
+    server = StandInSMTPServer(0, handshake_ms=0, message_ms=5)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_queue(smtp, spool, **kwargs):
+    pool = SMTPConnectionPool("127.0.0.1", smtp.server_address[1], starttls=False, size=2)
+    return MailQueue(pool, spool_dir=str(spool), sender=SENDER, workers=2,
+                     retry_base_seconds=0.1, retry_max_seconds=0.5, **kwargs)
+
+
+def spool_files(spool):
+    return sorted(name for name in os.listdir(spool) if name != "failed")
+
+
+def test_delivers_and_encrypts_spool(smtp, tmp_path):
+    queue = make_queue(smtp, tmp_path)
+    message_id = queue.enqueue("reset@example.com", "Reset", "<p>code 482913</p>")
+    with open(tmp_path / f"{message_id}.json", encoding="utf-8") as f:
+        raw = f.read()
+    assert "reset@example.com" not in raw and "482913" not in raw
+    assert os.stat(tmp_path / f"{message_id}.json").st_mode & 0o077 == 0
+    queue.start()
+    try:
+        assert queue.wait_until_empty(timeout=10)
+    finally:
+        queue.stop()
+    assert smtp.received == 1
+    assert queue.stats()["sent"] == 1
+    assert spool_files(tmp_path) == []
+
+
+def test_two_queues_on_one_spool_deliver_each_message_once(smtp, tmp_path):
+    writer = make_queue(smtp, tmp_path)
+    for i in range(30):
+        writer.enqueue(f"user{i}@example.com", "Verify", "<p>hi</p>")
+
+    # Both load all 30 messages on start, like two uvicorn workers restarting together
+    first, second = make_queue(smtp, tmp_path), make_queue(smtp, tmp_path)
+    first.start()
+    second.start()
+    try:
+        assert first.wait_until_empty(timeout=20)
+        assert second.wait_until_empty(timeout=20)
+        assert all(thread.is_alive() for thread in first._threads + second._threads)
+    finally:
+        first.stop()
+        second.stop()
+    assert smtp.received == 30
+    assert first.stats()["sent"] + second.stats()["sent"] == 30
+    assert first.stats()["errors"] == second.stats()["errors"] == 0
+    assert spool_files(tmp_path) == []
+
+
+def test_sender_survives_spool_io_error(smtp, tmp_path, monkeypatch):
+    queue = make_queue(smtp, tmp_path)
+    original = queue._send
+    calls = []
+
+    def flaky_send(record, claimed):
+        calls.append(record["id"])
+        if len(calls) == 1:
+            raise OSError(28, "No space left on device")
+        return original(record, claimed)
+
+    monkeypatch.setattr(queue, "_send", flaky_send)
+    queue.start()
+    try:
+        queue.enqueue("user@example.com", "Verify", "<p>hi</p>")
+        assert queue.wait_until_empty(timeout=10)
+        assert all(thread.is_alive() for thread in queue._threads)
+    finally:
+        queue.stop()
+    assert len(calls) == 2
+    assert queue.stats()["errors"] == 1
+    assert smtp.received == 1
+    assert spool_files(tmp_path) == []
+
+
+def test_abandoned_claim_is_recovered(smtp, tmp_path):
+    writer = make_queue(smtp, tmp_path)
+    message_id = writer.enqueue("user@example.com", "Verify", "<p>hi</p>")
+    # A sender that died mid-delivery an hour ago
+    stale = int(time.time()) - 3600
+    os.rename(tmp_path / f"{message_id}.json", tmp_path / f"{message_id}.{stale}{CLAIM_SUFFIX}")
+
+    queue = make_queue(smtp, tmp_path, claim_timeout_seconds=600)
+    queue.start()
+    try:
+        assert queue.wait_until_empty(timeout=10)
+    finally:
+        queue.stop()
+    assert queue.stats()["recovered"] == 1
+    assert smtp.received == 1
+    assert spool_files(tmp_path) == []
+
+
+def test_live_claim_is_left_alone(smtp, tmp_path):
+    writer = make_queue(smtp, tmp_path)
+    message_id = writer.enqueue("user@example.com", "Verify", "<p>hi</p>")
+    claimed = tmp_path / f"{message_id}.{int(time.time())}{CLAIM_SUFFIX}"
+    os.rename(tmp_path / f"{message_id}.json", claimed)
+
+    queue = make_queue(smtp, tmp_path)
+    queue.start()
+    try:
+        assert queue.wait_until_empty(timeout=5)
+    finally:
+        queue.stop()
+    assert smtp.received == 0
+    assert claimed.exists()
+
+
+def test_old_failed_mail_is_purged(smtp, tmp_path):
+    failed = tmp_path / "failed"
+    failed.mkdir()
+    old, fresh = failed / "old.json", failed / "fresh.json"
+    old.write_text("x")
+    fresh.write_text("x")
+    two_days_ago = time.time() - 48 * 3600
+    os.utime(old, (two_days_ago, two_days_ago))
+
+    queue = make_queue(smtp, tmp_path, failed_retention_hours=24)
+    queue.start()
+    queue.stop()
+    assert not old.exists() and fresh.exists()
+    assert queue.stats()["purged"] == 1
+
+
+def test_rescan_picks_up_mail_spooled_by_another_worker(smtp, tmp_path):
+    queue = make_queue(smtp, tmp_path, scan_interval_seconds=1)
+    queue.start()
+    try:
+        # Another process's queue: spools the message but never starts its senders
+        make_queue(smtp, tmp_path).enqueue("user@example.com", "Verify", "<p>hi</p>")
+        deadline = time.monotonic() + 10
+        while smtp.received == 0 and time.monotonic() < deadline:
+            time.sleep(0.1)
+        assert queue.wait_until_empty(timeout=5)
+    finally:
+        queue.stop()
+    assert smtp.received == 1
+    assert spool_files(tmp_path) == []
@@ -0,0 +1,54 @@
+"""
+Tests for keyset pagination on SQLite, where server-stamped and ORM-written
+timestamps are stored as text in different formats.
+
+Run: python -m pytest -q test_pagination.py
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import pagination
+from database import Base
+from models import AuditLog
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def walk(db, limit):
+    """Follow next cursors from the first page; returns the ids of every page."""
+    pages, cursor = [], None
+    for _ in range(50):
+        rows, cursor = pagination.paginate(db.query(AuditLog), AuditLog.created_at, AuditLog.id, limit, cursor)
+        pages.append([row.id for row in rows])
+        if cursor is None:
+            return pages
+    raise AssertionError(f"pagination did not terminate: {pages[:5]}")
+
+
+def test_tied_server_default_timestamps(db):
+    # Every row gets the same CURRENT_TIMESTAMP ("YYYY-MM-DD HH:MM:SS")
+    db.add_all([AuditLog(action="LOGIN") for _ in range(10)])
+    db.commit()
+    assert walk(db, 3) == [[10, 9, 8], [7, 6, 5], [4, 3, 2], [1]]
+
+
+def test_mixed_timestamp_formats(db):
+    base = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+    # Server-stamped (now, no fraction) and ORM-written (an hour ago, with fractional seconds)
+    db.add_all([AuditLog(action="LOGIN") for _ in range(4)])
+    db.add_all([AuditLog(action="LOGIN", created_at=base + timedelta(milliseconds=i + 1)) for i in range(5)])
+    db.add(AuditLog(action="LOGIN", created_at=base))
+    db.commit()
+    ids = [row_id for page in walk(db, 3) for row_id in page]
+    assert ids == [4, 3, 2, 1, 9, 8, 7, 6, 5, 10]
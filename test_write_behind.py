@@ -0,0 +1,169 @@
+"""
+Tests for the write-behind writers' NDJSON fallback: rows that can't reach the
+database are spilled to the fallback file and replayed once it's back.
+
+Run: python -m pytest -q test_write_behind.py
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import write_behind
+from database import Base
+from models import EmotionLog
+from write_behind import EmotionLogWriter
+
+
+class FlakyDatabase:
+    """sessionmaker stand-in whose sessions fail to commit while down is set."""
+
+    def __init__(self, engine):
+        self.sessions = sessionmaker(bind=engine)
+        self.down = False
+
+    def __call__(self):
+        session = self.sessions()
+        if self.down:
+            def fail():
+                raise OSError("database unavailable")
+            session.commit = fail
+        return session
+
+
+@pytest.fixture
+def database(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    flaky = FlakyDatabase(engine)
+    monkeypatch.setattr(write_behind, "SessionLocal", flaky)
+    yield flaky
+    engine.dispose()
+
+
+def emotion_rows(database):
+    session = database.sessions()
+    try:
+        return session.query(EmotionLog).count()
+    finally:
+        session.close()
+
+
+def log_frames(writer, count):
+    for i in range(count):
+        writer.log(user_id=1, username="smoke", emotion="happy", intensity=0.5 + i / 100,
+                   content_type="coding", content_confidence=0.9, probabilities="{}", is_guest=False)
+
+
+def spilled_rows(count):
+    return [{
+        "user_id": 1, "username": "smoke", "emotion": "happy", "intensity": 0.5,
+        "content_type": None, "content_confidence": None, "probabilities": "{}",
+        "is_guest": False, "created_at": datetime.now(timezone.utc),
+    } for _ in range(count)]
+
+
+def test_emotion_logs_spill_while_database_is_down_and_replay(database, tmp_path):
+    fallback = tmp_path / "emotion_log_fallback.ndjson"
+    writer = EmotionLogWriter(str(fallback), max_batch_rows=5, flush_interval_ms=10)
+    writer.buffer.max_retries = 0
+
+    database.down = True
+    log_frames(writer, 12)
+    writer.buffer.flush()
+    writer.stop()
+    assert emotion_rows(database) == 0
+    assert writer.stats()["dropped"] == 0
+    assert len(fallback.read_text().splitlines()) == 12
+
+    database.down = False
+    assert writer.replay_fallback() == 12
+    assert emotion_rows(database) == 12
+    assert not fallback.exists()
+
+
+def test_emotion_log_overflow_spills_instead_of_dropping(database, tmp_path):
+    fallback = tmp_path / "emotion_log_fallback.ndjson"
+    writer = EmotionLogWriter(str(fallback), max_batch_rows=5, max_pending=5)
+    log_frames(writer, 8)
+    assert writer.stats()["spilled"] == 3
+    writer.stop()
+    writer.replay_fallback()
+    assert emotion_rows(database) == 8
+
+
+def test_flusher_replays_spilled_rows_once_database_is_back(database, tmp_path):
+    fallback = tmp_path / "emotion_log_fallback.ndjson"
+    writer = EmotionLogWriter(str(fallback), max_batch_rows=5, flush_interval_ms=10,
+                              replay_interval_seconds=1)
+    writer.buffer.max_retries = 0
+    database.down = True
+    writer.start()
+    try:
+        log_frames(writer, 4)
+        deadline = time.monotonic() + 5
+        while not fallback.exists() and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert fallback.exists()
+
+        # No restart: the next successful flush replays the outage's rows
+        database.down = False
+        time.sleep(1.1)
+        log_frames(writer, 1)
+        deadline = time.monotonic() + 5
+        while emotion_rows(database) < 5 and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        writer.stop()
+    assert emotion_rows(database) == 5
+    assert writer.stats()["replayed"] == 4
+    assert not fallback.exists()
+
+
+def test_concurrent_replays_insert_each_row_once(database, tmp_path):
+    fallback = tmp_path / "emotion_log_fallback.ndjson"
+    # Two API workers sharing one fallback file
+    writers = [EmotionLogWriter(str(fallback), max_batch_rows=5) for _ in range(2)]
+    writers[0]._spill(spilled_rows(40))
+    threads = [threading.Thread(target=writer.replay_fallback) for writer in writers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert emotion_rows(database) == 40
+    assert sum(writer.stats()["replayed"] for writer in writers) == 40
+
+
+def test_abandoned_replay_claim_is_picked_up(database, tmp_path):
+    fallback = tmp_path / "emotion_log_fallback.ndjson"
+    writer = EmotionLogWriter(str(fallback))
+    writer._spill(spilled_rows(3))
+    # Claimed by a worker that crashed mid-replay an hour ago
+    os.rename(fallback, f"{fallback}.{int(time.time()) - 3600}.4242.deadbeef.replaying")
+    writer._spill(spilled_rows(2))
+    assert writer.replay_fallback() == 5
+    assert emotion_rows(database) == 5
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".replaying")] == []
+
+
+def test_on_written_sees_committed_rows_only(database, tmp_path):
+    fallback = tmp_path / "emotion_log_fallback.ndjson"
+    written = []
+    writer = EmotionLogWriter(str(fallback), max_batch_rows=5,
+                              on_written=lambda rows: written.extend(rows))
+    writer.buffer.max_retries = 0
+    database.down = True
+    log_frames(writer, 3)
+    writer.buffer.flush()
+    assert written == []
+
+    database.down = False
+    writer.replay_fallback()
+    log_frames(writer, 2)
+    writer.stop()
+    assert len(written) == 5 and {row["user_id"] for row in written} == {1}
@@ -0,0 +1,442 @@
+"""
+Write-behind buffering for high-volume inserts.
+
+WriteBehindBuffer collects items in memory and hands them to a flush function from
+a background thread every flush_interval_ms, or sooner once max_batch_rows are
+waiting. Request handlers only append to a list, so frame ingestion is no longer
+bound by a commit (and fsync) per row. Memory is bounded by max_pending; items
+arriving while the buffer is full are dropped and counted, or handed to spill_fn
+when one is given (as are batches that still fail after max_retries, and whatever
+is left unwritten on stop). on_flush, if given, runs on the flusher thread after
+each round that wrote something.
+
+EmotionLogWriter uses it for /api/analyze/frame: EmotionLog rows go out as one
+multi-row INSERT per flush. (Per-user "current emotion" columns are handled by
+live_state.LiveStateStore.) AuditLogWriter does the same for audit events. Both
+spill to an append-only NDJSON file while the database is unavailable and replay
+it once it's back (FallbackWriter).
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from database import SessionLocal
+from models import AuditLog, EmotionLog
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Bounded in-memory buffer flushed in batches by a background thread."""
+
+    def __init__(self, flush_fn: Callable[[List[Any]], None], name: str = "write-behind",
+                 max_batch_rows: int = 500, flush_interval_ms: float = 250.0,
+                 max_pending: int = 10000, max_retries: int = 3,
+                 spill_fn: Optional[Callable[[List[Any]], None]] = None,
+                 on_flush: Optional[Callable[[], None]] = None):
+        self.flush_fn = flush_fn
+        self.spill_fn = spill_fn
+        self.on_flush = on_flush
+        self.name = name
+        self.max_batch_rows = max(1, int(max_batch_rows))
+        self.flush_interval = max(1.0, float(flush_interval_ms)) / 1000.0
+        self.max_pending = max(self.max_batch_rows, int(max_pending))
+        self.max_retries = max(0, int(max_retries))
+
+        self._pending: List[Any] = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._consecutive_failures = 0
+
+        # Stats
+        self._enqueued = 0
+        self._written = 0
+        self._dropped = 0
+        self._spilled = 0
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def start(self) -> None:
+        """Start the flusher thread (no-op if already running)."""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        logger.info(
+            f"✅ {self.name} started "
+            f"(max_batch_rows={self.max_batch_rows}, flush_interval_ms={self.flush_interval * 1000:.0f})"
+        )
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the flusher thread and write out everything still buffered."""
+        with self._cond:
+            thread = self._thread
+            self._thread = None
+            self._stopping = True
+            self._cond.notify()
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+        # Anything the final flush couldn't write goes to the spill target
+        with self._cond:
+            leftover = self._pending
+            self._pending = []
+        if leftover:
+            self._discard(leftover)
+
+    def put(self, item: Any) -> bool:
+        """Buffer one item for the next flush. Returns False if the buffer was full (item spilled or dropped)."""
+        with self._cond:
+            full = len(self._pending) >= self.max_pending
+            if not full:
+                self._pending.append(item)
+                self._enqueued += 1
+                if len(self._pending) >= self.max_batch_rows:
+                    self._cond.notify()
+        if full:
+            self._discard([item])
+            return False
+        return True
+
+    def flush(self) -> int:
+        """Write out the buffered items now (called by the flusher thread and on stop)."""
+        with self._flush_lock:
+            flushed = 0
+            while True:
+                with self._cond:
+                    batch = self._pending[:self.max_batch_rows]
+                    del self._pending[:self.max_batch_rows]
+                if not batch:
+                    return flushed
+                if not self._write(batch):
+                    return flushed
+                flushed += len(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, throughput and flush latency for monitoring."""
+        return {
+            "queue_depth": len(self._pending),
+            "max_pending": self.max_pending,
+            "enqueued": self._enqueued,
+            "written": self._written,
+            "dropped": self._dropped,
+            "spilled": self._spilled,
+            "flushes": self._flushes,
+            "failed_flushes": self._failed_flushes,
+            "last_flush_ms": round(self._last_flush_ms, 2),
+            "max_flush_ms": round(self._max_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / self._flushes, 2) if self._flushes else 0.0,
+        }
+
+    def _discard(self, items: List[Any]) -> None:
+        """Items that won't reach flush_fn: spill them if possible, otherwise drop."""
+        if self.spill_fn is not None:
+            try:
+                self.spill_fn(items)
+                self._spilled += len(items)
+                return
+            except Exception as e:
+                logger.error(f"{self.name} spill of {len(items)} item(s) failed: {e}")
+        self._dropped += len(items)
+
+    def _write(self, batch: List[Any]) -> bool:
+        start = time.perf_counter()
+        try:
+            self.flush_fn(batch)
+        except Exception as e:
+            self._failed_flushes += 1
+            self._consecutive_failures += 1
+            logger.error(f"{self.name} flush of {len(batch)} item(s) failed: {e}")
+            if self._consecutive_failures > self.max_retries:
+                # Don't let one bad batch block everything queued behind it
+                logger.error(f"{self.name} giving up on {len(batch)} item(s) after {self.max_retries} retries")
+                self._discard(batch)
+                self._consecutive_failures = 0
+                return False
+            # Put the batch back in front for the next attempt, as far as capacity allows
+            with self._cond:
+                room = max(0, self.max_pending - len(self._pending))
+                self._pending[:0] = batch[:room]
+            if room < len(batch):
+                self._discard(batch[room:])
+            return False
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._consecutive_failures = 0
+        self._flushes += 1
+        self._written += len(batch)
+        self._last_flush_ms = elapsed_ms
+        self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+        return True
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                # After a failed flush, wait a full interval before retrying
+                if not self._stopping and (len(self._pending) < self.max_batch_rows or self._consecutive_failures):
+                    self._cond.wait(self.flush_interval)
+                stopping = self._stopping
+            flushed = self.flush()
+            if stopping:
+                break
+            if flushed and self.on_flush is not None:
+                try:
+                    self.on_flush()
+                except Exception as e:
+                    logger.error(f"{self.name} post-flush hook failed: {e}")
+
+
+class FallbackWriter:
+    """
+    Write-behind inserts into model's table. Batches that can't be written (and
+    overflow) are appended to fallback_path as NDJSON; replay_fallback() loads them
+    back into the table once the database is reachable again: on start, and from
+    the flusher thread after a successful batch (at most every replay_interval_seconds).
+    on_written, if given, is called with each batch once it is committed.
+    """
+
+    model: Any = None
+    label = "row"
+    replay_claim_timeout = 600.0
+
+    def __init__(self, fallback_path: str, name: str, max_batch_rows: int,
+                 flush_interval_ms: float, max_pending: int, replay_interval_seconds: float,
+                 on_written: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        self.fallback_path = fallback_path
+        self.on_written = on_written
+        self.replay_interval = max(1.0, float(replay_interval_seconds))
+        self._next_replay = 0.0
+        self._file_lock = threading.Lock()
+        self._replayed = 0
+        self._malformed = 0
+        self.buffer = WriteBehindBuffer(
+            self._flush,
+            name=name,
+            max_batch_rows=max_batch_rows,
+            flush_interval_ms=flush_interval_ms,
+            max_pending=max_pending,
+            spill_fn=self._spill,
+            on_flush=self._after_flush
+        )
+
+    def start(self) -> None:
+        self.buffer.start()
+        self.replay_fallback()
+        self._next_replay = time.monotonic() + self.replay_interval
+
+    def stop(self) -> None:
+        self.buffer.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.buffer.stats()
+        stats["replayed"] = self._replayed
+        stats["replay_malformed"] = self._malformed
+        stats["fallback_pending"] = os.path.exists(self.fallback_path)
+        stats["fallback_path"] = self.fallback_path
+        return stats
+
+    def replay_fallback(self) -> int:
+        """
+        Insert rows spilled to the fallback file. The file is claimed first (renamed to
+        <fallback>.<time>.<pid>.<tag>.replaying), so API workers sharing it never replay
+        the same rows twice; claims abandoned by a crash are picked up after
+        replay_claim_timeout seconds. Malformed lines (e.g. one torn by a crash mid-write)
+        are set aside in <fallback>.malformed; if a batch fails, only the rows not yet
+        committed are spilled back for the next attempt. Returns rows replayed.
+        """
+        replayed = 0
+        for claimed in self._claim_fallback():
+            replayed += self._replay_file(claimed)
+        return replayed
+
+    def _claim_fallback(self) -> List[str]:
+        directory, base = os.path.split(os.path.abspath(self.fallback_path))
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+        now = time.time()
+        claims = []
+        with self._file_lock:
+            for name in names:
+                if not (name.startswith(f"{base}.") and name.endswith(".replaying")):
+                    continue
+                claimed_at = name[len(base) + 1:-len(".replaying")].split(".")[0]
+                try:
+                    # "<base>.replaying" (no claim time) is left over from an older version
+                    if claimed_at and now - int(claimed_at) < self.replay_claim_timeout:
+                        continue
+                except ValueError:
+                    continue
+                claims.append(self._claim(os.path.join(directory, name)))
+            claims.append(self._claim(self.fallback_path))
+        return [claimed for claimed in claims if claimed is not None]
+
+    def _claim(self, path: str) -> Optional[str]:
+        claimed = f"{self.fallback_path}.{int(time.time())}.{os.getpid()}.{uuid.uuid4().hex[:8]}.replaying"
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            return None
+        return claimed
+
+    def _replay_file(self, claimed: str) -> int:
+        rows: List[Dict[str, Any]] = []
+        malformed: List[str] = []
+        with open(claimed, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                    row["created_at"] = datetime.fromisoformat(row["created_at"])
+                except (ValueError, KeyError, TypeError):
+                    malformed.append(line if line.endswith("\n") else line + "\n")
+                    continue
+                rows.append(row)
+        if malformed:
+            self._malformed += len(malformed)
+            logger.warning(f"⚠️ Skipped {len(malformed)} malformed line(s) in {self.fallback_path}")
+            with open(f"{self.fallback_path}.malformed", "a", encoding="utf-8") as f:
+                f.write("".join(malformed))
+
+        replayed = 0
+        try:
+            for i in range(0, len(rows), self.buffer.max_batch_rows):
+                batch = rows[i:i + self.buffer.max_batch_rows]
+                self._flush(batch)
+                replayed += len(batch)
+        except Exception as e:
+            # Hand back only the rows that weren't committed
+            logger.error(f"{self.label.capitalize()} fallback replay failed after {replayed} row(s), "
+                         f"keeping {len(rows) - replayed} in {self.fallback_path}: {e}")
+            self._spill(rows[replayed:])
+        else:
+            if replayed:
+                logger.info(f"✅ Replayed {replayed} {self.label}(s) from {self.fallback_path}")
+        os.remove(claimed)
+        self._replayed += replayed
+        return replayed
+
+    def _after_flush(self) -> None:
+        """Flusher hook: a batch just reached the database, so replay anything spilled earlier."""
+        now = time.monotonic()
+        if now < self._next_replay:
+            return
+        self._next_replay = now + self.replay_interval
+        self.replay_fallback()
+
+    @staticmethod
+    def _serialize(row: Dict[str, Any]) -> str:
+        return json.dumps({**row, "created_at": row["created_at"].isoformat()}) + "\n"
+
+    def _spill(self, rows: List[Dict[str, Any]]) -> None:
+        lines = "".join(self._serialize(row) for row in rows)
+        with self._file_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.fallback_path)), exist_ok=True)
+            with open(self.fallback_path, "a+b") as f:
+                # Don't glue onto a line torn by an earlier crash
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        lines = "\n" + lines
+                f.write(lines.encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+        logger.warning(f"⚠️ Spilled {len(rows)} {self.label}(s) to {self.fallback_path}")
+
+    def _flush(self, rows: List[Dict[str, Any]]) -> None:
+        db = SessionLocal()
+        try:
+            db.execute(insert(self.model), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        logger.debug(f"💾 Flushed {len(rows)} {self.label}(s)")
+        if self.on_written is not None:
+            # The rows are committed; a failing hook must not get them spilled and re-inserted
+            try:
+                self.on_written(rows)
+            except Exception as e:
+                logger.error(f"{self.buffer.name} on_written hook failed: {e}")
+
+
+class EmotionLogWriter(FallbackWriter):
+    """Write-behind persistence for per-frame emotion results."""
+
+    model = EmotionLog
+    label = "emotion log"
+
+    def __init__(self, fallback_path: str, max_batch_rows: int = 500,
+                 flush_interval_ms: float = 250.0, max_pending: int = 10000,
+                 replay_interval_seconds: float = 30.0,
+                 on_written: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        super().__init__(fallback_path, "emotion-log-writer", max_batch_rows, flush_interval_ms,
+                         max_pending, replay_interval_seconds, on_written)
+
+    def log(self, user_id: int, username: str, emotion: str, intensity: float,
+            content_type: Optional[str], content_confidence: Optional[float],
+            probabilities: str, is_guest: bool) -> bool:
+        """
+        Queue one EmotionLog row. created_at is stamped here so rows keep their
+        frame time, not their flush time.
+        """
+        row = {
+            "user_id": user_id,
+            "username": username,
+            "emotion": emotion,
+            "intensity": intensity,
+            "content_type": content_type,
+            "content_confidence": content_confidence,
+            "probabilities": probabilities,
+            "is_guest": is_guest,
+            "created_at": datetime.now(timezone.utc),
+        }
+        return self.buffer.put(row)
+
+
+class AuditLogWriter(FallbackWriter):
+    """Write-behind persistence for audit events."""
+
+    model = AuditLog
+    label = "audit event"
+
+    def __init__(self, fallback_path: str, max_batch_rows: int = 200,
+                 flush_interval_ms: float = 500.0, max_pending: int = 10000,
+                 replay_interval_seconds: float = 30.0):
+        super().__init__(fallback_path, "audit-log-writer", max_batch_rows, flush_interval_ms,
+                         max_pending, replay_interval_seconds)
+
+    def log(self, action: str, user_id: Optional[int] = None, username: Optional[str] = None,
+            details: Optional[str] = None, ip_address: Optional[str] = None,
+            user_agent: Optional[str] = None, status: str = "success") -> bool:
+        """Queue one AuditLog row, stamped with the event time."""
+        row = {
+            "user_id": user_id,
+            "username": username,
+            "action": action,
+            "details": details,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "status": status,
+            "created_at": datetime.now(timezone.utc),
+        }
+        return self.buffer.put(row)